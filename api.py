@@ -1,38 +1,162 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify, make_response, send_file
+from functools import wraps
+import click
+from flask import (
+  Flask, Response, copy_current_request_context, g, request, jsonify, make_response, send_file, stream_with_context,
+)
 from flask_cors import CORS
 from werkzeug.security import check_password_hash, generate_password_hash
-from sqlalchemy import func
+from sqlalchemy import and_, case, func, or_, select, true, tuple_, update, DateTime
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.dialects import postgresql, sqlite
 from database import (
   SessionLocal,
   init_db,
+  rebuild_owner_balances,
   Owner,
+  OwnerBalance,
   Rent,
   Payment,
   Settings,
   Category,
   Account,
+  AccountLedger,
+  AccountMonthlyTotal,
+  CategoryMonthlyTotal,
+  OwnerMonthlyTotal,
   Transaction,
   Expense,
+  DeletedRecord,
+  get_table_versions,
+  is_retryable_error,
+  pool_stats,
+  take_conflict_flag,
+  upsert_increment_many,
+)
+from events import RESET, broadcaster
+from ledger import LEDGER_FOLD_BATCH, fold_ledger, folder as ledger_folder, live_balances
+from serializers import (
+  FastJSONProvider,
+  dumps,
+  serialize_account,
+  serialize_category,
+  serialize_expense,
+  serialize_owner,
+  serialize_payment,
+  serialize_payment_detail,
+  serialize_rent,
+  serialize_rent_detail,
+  serialize_transaction,
+  serialize_unpaid_rent,
 )
+from write_queue import WriteQueue
+import bank_import
+import idempotency
+import partitioning
+import reconcile
+import rollups
+import yearend
+import base64
+import hashlib
+import io
+import json
 import shutil
 import os
-from datetime import datetime
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal, InvalidOperation
 
 init_db()
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 
 # CORS: tüm kaynaktan gelen istekleri kabul et
 CORS(app, 
      resources={r"/*": {"origins": "*"}},
-     allow_headers=["Content-Type", "Authorization"],
+     allow_headers=["Content-Type", "Authorization", "If-None-Match", "Last-Event-ID", "Idempotency-Key"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+     expose_headers=["X-Cache", "ETag", "Idempotent-Replayed"],
      supports_credentials=True)
 
 ALLOW_NEGATIVE_BALANCE = os.environ.get("ALLOW_NEGATIVE_BALANCE", "false").lower() == "true"
 
+# Defter modu: bakiye değişiklikleri account_ledger'a eklenir, hesap satırı
+# yalnızca borç hareketlerinde kilitlenir; bkz. ledger.py
+LEDGER_MODE = os.environ.get("LEDGER_MODE", "false").lower() == "true"
+if not LEDGER_MODE:
+  # Defter modundan çıkan kurulum: katlanmamış hareketler bakiyeye eklenmeden kaybolmasın
+  try:
+    while fold_ledger() == LEDGER_FOLD_BATCH:
+      pass
+  except Exception as e:
+    print(f"Defter katlanamadı: {e}")
+
+# Tek yazıcı kuyruğu (SQLite kurulumları için): yazan istekler sırayla ve
+# gruplar halinde tek işlemde commit edilir; bkz. write_queue.py
+WRITE_QUEUE = os.environ.get("WRITE_QUEUE", "false").lower() == "true"
+WRITE_QUEUE_MAX_BATCH = int(os.environ.get("WRITE_QUEUE_MAX_BATCH", "32"))
+# Yazmayan veya uzun süren POST uçları kuyruğa ve yeniden deneme döngüsüne girmez
+WRITE_DISPATCH_EXEMPT_ENDPOINTS = {'login', 'test', 'create_backup', 'match_bank_statement', 'run_reconciliation'}
+# Deadlock/serialization/kilit hatalarında yazan istek bu kadar kez denenir
+DB_RETRY_ATTEMPTS = max(int(os.environ.get("DB_RETRY_ATTEMPTS", "5")), 1)
+DB_RETRY_BASE_DELAY = float(os.environ.get("DB_RETRY_BASE_DELAY", "0.02"))
+write_queue = WriteQueue(
+  max_batch=WRITE_QUEUE_MAX_BATCH,
+  accept=lambda response: response.status_code < 400,
+) if WRITE_QUEUE else None
+
+# Dashboard istatistikleri için süreç içi önbellek; yazma istekleri geçersiz kılar,
+# diğer worker'ların yazmaları için TTL (saniye) üst sınırdır
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "30"))
+DASHBOARD_CACHE_INVALIDATING_PATHS = ('/api/rents', '/api/payments', '/api/owners')
+_dashboard_cache = {}
+_dashboard_cache_lock = threading.Lock()
+# Her geçersiz kılmada artar; hesaplama sürerken artmışsa sonuç önbelleğe yazılmaz
+_dashboard_cache_generation = 0
+
+# /api/dashboard/chart-data: varsayılan ay sayısı ve en fazla nokta; daha uzun
+# aralıklarda ardışık aylar toplanarak nokta sayısı bu sınıra indirilir
+DASHBOARD_CHART_MONTHS = 12
+DASHBOARD_CHART_MAX_POINTS = 24
+# /api/dashboard/unpaid-rents limit verilmese de bu boyutta sayfalanır
+DASHBOARD_UNPAID_PAGE_SIZE = 50
+
+# Yanıt biçimi değiştiğinde artırılır; eski ETag'ler geçersiz olur
+RESPONSE_FORMAT_VERSION = 1
+
+# Gider/ödemenin kasa hareketi aranırken kaydın created_at'inden bu kadar öncesine
+# bakılır (aynı istekte yazılan satırların zaman damgası farkı için pay)
+RELATED_TRANSACTION_SLACK = timedelta(hours=1)
+
+# Liste uçlarında limit/cursor verildiğinde sayfa boyutu
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# ?stream=1 / Accept: application/x-ndjson: sorgu bu kadar satırlık partilerle
+# okunur ve yazılır; worker belleği sonuç boyutundan bağımsız kalır
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", "1000"))
+
+# /api/sync: commit'i watermark'tan sonra görünen satırları kaçırmamak için
+# since değerinden bu kadar saniye geriye bakılır (istemci upsert eder)
+SYNC_OVERLAP_SECONDS = float(os.environ.get("SYNC_OVERLAP_SECONDS", "5"))
+
+# /api/events (SSE): boşta bağlantıya yorum satırı gönderme aralığı, bağlantı
+# ömrü ve istemcinin yeniden bağlanma gecikmesi
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", "15"))
+EVENTS_MAX_STREAM_SECONDS = float(os.environ.get("EVENTS_MAX_STREAM_SECONDS", "300"))
+EVENTS_RETRY_MS = 3000
+
+# Her akış bir gthread worker thread'ini bağlantı boyunca tutar; abone sayısı
+# thread sayısının (render.yaml: --threads 16) altında kalmalı ki diğer
+# istekler için thread kalsın. Sınır doluyken 503 ve daha uzun retry döner.
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("EVENTS_MAX_SUBSCRIBERS", "8"))
+EVENTS_BUSY_RETRY_MS = 30000
+
 
 def _to_decimal(value):
   if value is None:
@@ -43,53 +167,209 @@ def _to_decimal(value):
     return None
 
 
-def _json_account(acc: Account):
-  return {
-    'id': acc.id,
-    'name': acc.name,
-    'type': acc.type,
-    'balance': float(acc.balance or 0),
-    'is_active': acc.is_active,
-    'created_at': acc.created_at.isoformat() if acc.created_at else None,
-    'updated_at': acc.updated_at.isoformat() if acc.updated_at else None,
-  }
+def _upsert_increment(session, model, keys: dict, deltas: dict):
+  """keys ile belirlenen satırdaki sayaçları deltas kadar artır, satır yoksa oluştur"""
+  upsert_increment_many(session, model, list(keys.keys()), [dict(keys, **deltas)])
 
 
-def _json_transaction(tx: Transaction):
-  return {
-    'id': tx.id,
-    'account_id': tx.account_id,
-    'related_account': tx.related_account,
-    'type': tx.type,
-    'source': tx.source,
-    'related_id': tx.related_id,
-    'amount': float(tx.amount or 0),
-    'description': tx.description,
-    'is_canceled': tx.is_canceled,
-    'created_by': tx.created_by,
-    'created_at': tx.created_at.isoformat() if tx.created_at else None,
+def _adjust_owner_balance(session, owner_id, charged=0, paid=0, late_fees=0):
+  deltas = {
+    name: _to_decimal(value)
+    for name, value in (('charged', charged), ('paid', paid), ('late_fees', late_fees))
+    if value
   }
+  if deltas:
+    _upsert_increment(session, OwnerBalance, {'owner_id': owner_id}, deltas)
 
 
-def _json_expense(exp: Expense, category: Category = None, account: Account = None):
-  cat = category if category is not None else getattr(exp, 'category', None)
-  acc = account if account is not None else getattr(exp, 'account', None)
-  return {
-    'id': exp.id,
-    'name': exp.name,
-    'category_id': exp.category_id,
-    'category_name': cat.name if cat else None,
-    'account_id': exp.account_id,
-    'account_name': acc.name if acc else None,
-    'account_type': acc.type if acc else None,
-    'amount': float(exp.amount or 0),
-    'payee': exp.payee,
-    'receipt_no': exp.receipt_no,
-    'maintenance_agreement_id': exp.maintenance_agreement_id,
-    'date': exp.expense_date.isoformat() if exp.expense_date else None,
-    'created_at': exp.created_at.isoformat() if exp.created_at else None,
-    'updated_at': exp.updated_at.isoformat() if exp.updated_at else None,
-  }
+def _int_arg(name):
+  value = request.args.get(name)
+  if value in (None, ''):
+    return None
+  try:
+    return int(value)
+  except ValueError:
+    return None
+
+
+def _date_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+  except ValueError:
+    raise ValueError(f'Geçersiz {name} tarihi')
+
+
+def _filter_date_range(q, column, by_period=True):
+  """date_from/date_to (ve by_period ise year/month) parametrelerini tarih kolonuna uygula"""
+  start = _date_arg('date_from')
+  if start:
+    q = q.filter(column >= start)
+  end = _date_arg('date_to')
+  if end:
+    # Sadece tarih verildiyse o günün tamamı dahil
+    q = q.filter(column < end + timedelta(days=1) if len(request.args['date_to']) == 10 else column <= end)
+  year = _int_arg('year') if by_period else None
+  if year:
+    month = _int_arg('month')
+    if month and 1 <= month <= 12:
+      period_start = datetime(year, month, 1)
+      period_end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    else:
+      period_start, period_end = datetime(year, 1, 1), datetime(year + 1, 1, 1)
+    q = q.filter(column >= period_start, column < period_end)
+  return q
+
+
+def _encode_cursor(values):
+  raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, keys):
+  try:
+    values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    if not isinstance(values, list) or len(values) != len(keys):
+      raise ValueError
+    return [
+      datetime.fromisoformat(v) if v is not None and isinstance(key.type, DateTime) else v
+      for key, v in zip(keys, values)
+    ]
+  except (ValueError, TypeError):
+    raise ValueError('Geçersiz cursor')
+
+
+def _keyset_queries(q, keys, descending=True, nullable_first=False):
+  """Tüm sonucu _paginate ile aynı sırada okuyan sorgular (nullable_first ise NULL'lar ayrı sorguda sonda)"""
+  def ordered(query, columns):
+    return query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+
+  if not nullable_first:
+    return [ordered(q, keys)]
+  first, rest = keys[0], keys[1:]
+  return [ordered(q.filter(first.isnot(None)), keys), ordered(q.filter(first.is_(None)), rest)]
+
+
+def _negotiated_mimetype():
+  """Accept başlığına göre liste yanıtının biçimi (JSON ya da NDJSON)"""
+  return request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson']) or 'application/json'
+
+
+def _stream_requested():
+  return (
+    request.args.get('stream', '').lower() in ('1', 'true')
+    or _negotiated_mimetype() == 'application/x-ndjson'
+  )
+
+
+def _stream_response(name, queries, serializer):
+  """Sorguları yield_per ile okuyup satır satır kodlayarak akıt.
+
+  Accept: application/x-ndjson ise her satır bir JSON nesnesi; aksi halde
+  normal liste yanıtıyla aynı baytlar ({"next_cursor":null,"<name>":[...]})
+  parça parça gönderilir. limit/cursor yok sayılır, tüm sonuç döner.
+  Sorgular kendi oturumunda çalışır; oturum akış bitince (veya istemci
+  bağlantıyı kesince) kapanır.
+  """
+  ndjson = _negotiated_mimetype() == 'application/x-ndjson'
+
+  def generate():
+    # İstek oturumu yanıt gövdesi okunmadan kapanır; akışın kendi oturumu olur
+    session = SessionLocal()
+    try:
+      if not ndjson:
+        yield b'{"next_cursor":null,"' + name.encode() + b'":['
+      separator = b''
+      for query in queries:
+        batch = []
+        for row in query.with_session(session).yield_per(STREAM_BATCH_SIZE):
+          batch.append(dumps(serializer(row)))
+          if len(batch) >= STREAM_BATCH_SIZE:
+            yield (b'\n'.join(batch) + b'\n') if ndjson else separator + b','.join(batch)
+            separator = b','
+            batch = []
+        if batch:
+          yield (b'\n'.join(batch) + b'\n') if ndjson else separator + b','.join(batch)
+          separator = b','
+      if not ndjson:
+        yield b']}\n'
+    finally:
+      session.close()
+
+  return Response(generate(), mimetype='application/x-ndjson' if ndjson else 'application/json')
+
+
+def _paginate(q, keys, row_key, descending=True, nullable_first=False, default_limit=None):
+  """Keyset sayfalama: keys sırasına göre (son kolon id) limit/cursor uygula.
+
+  limit veya cursor verilmezse tüm sonuç döner (default_limit verilmişse o
+  boyutta ilk sayfa). nullable_first ise ilk anahtarı NULL olan satırlar her
+  iki yönde de en sona gelir; böylece her sayfa index üzerinde bir aralık
+  taramasıyla okunur.
+  Dönüş: (satırlar, next_cursor)
+  """
+  cursor = request.args.get('cursor')
+  limit = _int_arg('limit')
+  if cursor is None and limit is None and default_limit is None:
+    return [row for part in _keyset_queries(q, keys, descending, nullable_first) for row in part.all()], None
+  limit = min(max(limit, 1), MAX_PAGE_SIZE) if limit is not None else default_limit or DEFAULT_PAGE_SIZE
+
+  def ordered(query, columns):
+    return query.order_by(*[c.desc() if descending else c.asc() for c in columns])
+
+  def after(columns, values):
+    left, right = tuple_(*columns), tuple_(*values)
+    return left < right if descending else left > right
+
+  first, rest = keys[0], keys[1:]
+  null_q = None
+  if cursor is not None:
+    values = _decode_cursor(cursor, keys)
+    if nullable_first and values[0] is None:
+      null_q = q.filter(first.is_(None), after(rest, values[1:]))
+      q = None
+    else:
+      if nullable_first:
+        null_q = q.filter(first.is_(None))
+      q = q.filter(after(keys, values))
+  elif nullable_first:
+    null_q = q.filter(first.is_(None))
+    q = q.filter(first.isnot(None))
+
+  rows = ordered(q, keys).limit(limit + 1).all() if q is not None else []
+  if null_q is not None and len(rows) <= limit:
+    rows += ordered(null_q, rest).limit(limit + 1 - len(rows)).all()
+  next_cursor = _encode_cursor(row_key(rows[limit - 1])) if len(rows) > limit else None
+  return rows[:limit], next_cursor
+
+
+def conditional(*tables):
+  """GET yanıtına tablo sürümlerinden ETag ekle; If-None-Match eşleşirse 304 dön"""
+  def decorator(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+      versions = get_table_versions(tables)
+      # Aynı URL Accept'e göre JSON ya da NDJSON döner: biçim ETag'e girer
+      fingerprint = '|'.join(
+        [str(RESPONSE_FORMAT_VERSION), request.full_path, _negotiated_mimetype()]
+        + [f'{name}:{versions.get(name, 0)}' for name in tables]
+      )
+      etag = hashlib.sha1(fingerprint.encode()).hexdigest()
+      if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+        response.set_etag(etag)
+        response.vary.add('Accept')
+        return response
+      response = make_response(view(*args, **kwargs))
+      if response.status_code == 200:
+        response.set_etag(etag)
+        response.vary.add('Accept')
+      return response
+    return wrapper
+  return decorator
+
 
 @app.before_request
 def handle_preflight():
@@ -97,7 +377,7 @@ def handle_preflight():
   if request.method == "OPTIONS":
     response = make_response()
     response.headers.add("Access-Control-Allow-Origin", "*")
-    response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization")
+    response.headers.add("Access-Control-Allow-Headers", "Content-Type,Authorization,If-None-Match,Last-Event-ID,Idempotency-Key")
     response.headers.add("Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS")
     response.headers.add("Access-Control-Max-Age", "3600")
     return response, 200
@@ -114,7 +394,7 @@ def login():
   print(f"[LOGIN] Email: {email}, Password: {password[:3] if password else 'None'}...")  # Debug
   if not email or not password:
     return jsonify({'success': False, 'message': 'E-posta ve şifre gerekli'}), 400
-  session = SessionLocal()
+  session = get_session()
   owner = session.query(Owner).filter_by(email=email, is_active=True).first()
   print(f"[LOGIN] Owner found: {owner is not None}")  # Debug
   if owner:
@@ -132,45 +412,31 @@ def login():
       'is_active': owner.is_active,
     }
     print(f"[LOGIN] [OK] Login success for {email}")  # Debug
-    session.close()
     return jsonify({'success': True, 'user': user_data})
   print(f"[LOGIN] [ERROR] Login failed for {email}")  # Debug
-  session.close()
   return jsonify({'success': False, 'message': 'E-posta veya şifre hatalı'}), 401
 
+def _owner_totals_query(session):
+  """Malik ile owner_balances satırını tek sorguda döndür"""
+  return session.query(
+    Owner,
+    func.coalesce(OwnerBalance.charged, 0),
+    func.coalesce(OwnerBalance.paid, 0),
+  ).outerjoin(OwnerBalance, OwnerBalance.owner_id == Owner.id)
+
+
 @app.route('/api/owners', methods=['GET'])
+@conditional('owners', 'owner_balances')
 def get_owners():
-  session = SessionLocal()
-  owners = session.query(Owner).filter(Owner.is_active == True).all()
-  result = []
-  for o in owners:
-    total_rent = sum(r.amount for r in o.rents)
-    total_paid = sum(p.amount for p in o.payments)
-    result.append({
-      'id': o.id,
-      'full_name': o.full_name,
-      'email': o.email,
-      'phone': o.phone,
-      'identity_number': o.identity_number,
-      'unit_name': o.unit_name,
-      'unit_type': o.unit_type,
-      'share_ratio': o.share_ratio * 100 if o.share_ratio else 0,  # 0-1 aralığını yüzdeye dönüştür
-      'owner_type': o.owner_type,
-      'role': o.role,
-      'tenant_name': o.tenant_name,
-      'tenant_email': o.tenant_email,
-      'is_active': o.is_active,
-      'total_rent': total_rent,
-      'total_paid': total_paid,
-      'remaining_debt': max(total_rent - total_paid, 0),
-    })
-  session.close()
+  session = get_session()
+  rows = _owner_totals_query(session).filter(Owner.is_active == True).all()
+  result = [serialize_owner(o, total_rent, total_paid) for o, total_rent, total_paid in rows]
   return jsonify({'owners': result})
 
 @app.route('/api/owners', methods=['POST'])
 def create_owner():
   data = request.json or {}
-  session = SessionLocal()
+  session = get_session()
   
   # Password: Flutter'dan geliyorsa kullan, yoksa geçici şifre oluştur
   password = data.get('password') or 'Temp123'
@@ -200,40 +466,22 @@ def create_owner():
     is_active=True,
   )
   session.add(owner)
-  session.commit()
-  session.refresh(owner)
+  session.flush()
   
-  owner_data = {
-    'id': owner.id,
-    'full_name': owner.full_name,
-    'email': owner.email,
-    'phone': owner.phone,
-    'identity_number': owner.identity_number,
-    'unit_name': owner.unit_name,
-    'unit_type': owner.unit_type,
-    'share_ratio': owner.share_ratio * 100 if owner.share_ratio else 0,
-    'owner_type': owner.owner_type,
-    'role': owner.role,
-    'tenant_name': owner.tenant_name,
-    'tenant_email': owner.tenant_email,
-    'is_active': owner.is_active,
-    'total_rent': 0,
-    'total_paid': 0,
-    'remaining_debt': 0,
-  }
+  owner_data = serialize_owner(owner, 0, 0)
   
-  session.close()
   return jsonify({'success': True, 'owner': owner_data}), 201
 
 @app.route('/api/owners/<int:owner_id>', methods=['GET'])
+@conditional('owners', 'owner_balances')
 def owner_detail(owner_id):
-  session = SessionLocal()
-  o = session.query(Owner).filter_by(id=owner_id).first()
-  if not o:
-    session.close()
+  session = get_session()
+  row = _owner_totals_query(session).filter(Owner.id == owner_id).first()
+  if not row:
     return jsonify({'success': False, 'message': 'Malik bulunamadı'}), 404
-  total_rent = sum(r.amount for r in o.rents)
-  total_paid = sum(p.amount for p in o.payments)
+  o, total_rent, total_paid = row
+  total_rent = float(total_rent)
+  total_paid = float(total_paid)
   result = {
     'id': o.id,
     'full_name': o.full_name,
@@ -248,48 +496,43 @@ def owner_detail(owner_id):
     'total_paid': total_paid,
     'remaining_debt': max(total_rent - total_paid, 0),
   }
-  session.close()
   return jsonify({'owner': result})
 
 @app.route('/api/owners/<int:owner_id>', methods=['PUT'])
 def update_owner(owner_id):
   data = request.json or {}
-  session = SessionLocal()
+  session = get_session()
   o = session.query(Owner).filter_by(id=owner_id).first()
   if not o:
-    session.close()
     return jsonify({'success': False, 'message': 'Malik bulunamadı'}), 404
   for field in ['full_name', 'email', 'phone', 'identity_number', 'unit_name', 'share_ratio', 'owner_type']:
     if field in data and data[field] is not None:
       setattr(o, field, data[field])
   if 'is_active' in data:
     o.is_active = bool(data['is_active'])
-  session.commit()
-  session.close()
+  session.flush()
   return jsonify({'success': True, 'message': 'Güncellendi'})
 
 @app.route('/api/owners/<int:owner_id>', methods=['DELETE'])
 def delete_owner(owner_id):
-  session = SessionLocal()
+  session = get_session()
   o = session.query(Owner).filter_by(id=owner_id).first()
   if not o:
-    session.close()
     return jsonify({'success': False, 'message': 'Malik bulunamadı'}), 404
   o.is_active = False
-  session.commit()
-  session.close()
+  session.flush()
   return jsonify({'success': True, 'message': 'Pasif edildi'})
 
 @app.route('/api/owners/<int:owner_id>/financial-summary', methods=['GET'])
+@conditional('owners', 'owner_balances')
 def owner_financial_summary(owner_id):
-  session = SessionLocal()
-  o = session.query(Owner).filter_by(id=owner_id).first()
-  if not o:
-    session.close()
+  session = get_session()
+  row = _owner_totals_query(session).filter(Owner.id == owner_id).first()
+  if not row:
     return jsonify({'success': False, 'message': 'Malik bulunamadı'}), 404
-  total_rent = sum(r.amount for r in o.rents)
-  total_paid = sum(p.amount for p in o.payments)
-  session.close()
+  _, total_rent, total_paid = row
+  total_rent = float(total_rent)
+  total_paid = float(total_paid)
   return jsonify({
     'owner_id': owner_id,
     'total_rent': total_rent,
@@ -298,69 +541,363 @@ def owner_financial_summary(owner_id):
     'currency': 'TRY'
   })
 
+def _invalidate_dashboard_cache():
+  global _dashboard_cache_generation
+  with _dashboard_cache_lock:
+    _dashboard_cache_generation += 1
+    _dashboard_cache.clear()
+
+
+@app.after_request
+def invalidate_dashboard_cache_on_write(response):
+  """Aidat, ödeme veya malik yazan başarılı istekler dashboard önbelleğini düşürür"""
+  if (
+    request.method in ('POST', 'PUT', 'DELETE')
+    and response.status_code < 400
+    and request.path.startswith(DASHBOARD_CACHE_INVALIDATING_PATHS)
+  ):
+    _invalidate_dashboard_cache()
+  return response
+
+
+def _compute_dashboard_stats(session, month_start):
+  stmt = select(
+    select(func.count(Owner.id)).where(Owner.is_active == True).scalar_subquery(),
+    select(func.count(Rent.id)).where(Rent.status == 'UNPAID').scalar_subquery(),
+    select(func.coalesce(func.sum(Rent.amount), 0)).where(Rent.status == 'UNPAID').scalar_subquery(),
+    select(func.coalesce(func.sum(Payment.amount), 0)).where(
+      Payment.is_cancelled == False, Payment.payment_date >= month_start
+    ).scalar_subquery(),
+  )
+  owners_count, unpaid_rents_count, total_debt, monthly_collection = session.execute(stmt).one()
+  return {
+    'totalUnits': owners_count,
+    'unpaidRents': unpaid_rents_count,
+    'totalDebt': float(total_debt),
+    'monthlyCollection': float(monthly_collection),
+  }
+
+
 @app.route('/api/dashboard/stats', methods=['GET'])
 def dashboard_stats():
+  this_month = datetime.utcnow()
+  month_start = datetime(this_month.year, this_month.month, 1)
+  now = time.monotonic()
+  with _dashboard_cache_lock:
+    cached = _dashboard_cache.get('stats')
+    generation = _dashboard_cache_generation
+  if cached and cached['month_start'] == month_start and cached['expires_at'] > now:
+    response = jsonify(cached['value'])
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
   try:
-    session = SessionLocal()
-    try:
-      # Malik sayısı
-      owners_count = session.query(Owner).filter(Owner.is_active == True).count()
-      
-      # Ödenmemiş aidat sayısı
-      unpaid_rents_count = session.query(Rent).filter(Rent.status == 'UNPAID').count()
-      
-      # Toplam borç (ödenmemiş aidatlar)
-      unpaid_rents = session.query(Rent).filter(Rent.status == 'UNPAID').all()
-      total_debt = sum(r.amount for r in unpaid_rents) if unpaid_rents else 0
-      
-      # Bu ay tahsilat (ödenmemiş/iptal olmayan ödemeler)
-      this_month = datetime.utcnow()
-      monthly_payments = session.query(Payment).filter(
-        Payment.is_cancelled == False,
-        Payment.payment_date >= datetime(this_month.year, this_month.month, 1)
-      ).all()
-      monthly_collection = sum(p.amount for p in monthly_payments) if monthly_payments else 0
-      
-      session.close()
-      return jsonify({
-        'totalUnits': owners_count,
-        'unpaidRents': unpaid_rents_count,
-        'totalDebt': float(total_debt),
-        'monthlyCollection': float(monthly_collection),
-      })
-    finally:
-      session.close()
+    stats = _compute_dashboard_stats(get_session(), month_start)
   except Exception as e:
     print(f"Dashboard error: {e}")
     return jsonify({'totalUnits': 0, 'unpaidRents': 0, 'totalDebt': 0.0, 'monthlyCollection': 0.0})
 
+  with _dashboard_cache_lock:
+    # Hesaplama sürerken commit edilen bir yazma önbelleği düşürdüyse bu
+    # sonuç yazmadan önceki veriyi gösterebilir: saklanmaz
+    if generation == _dashboard_cache_generation:
+      _dashboard_cache['stats'] = {
+        'value': stats,
+        'month_start': month_start,
+        'expires_at': now + DASHBOARD_CACHE_TTL,
+      }
+  response = jsonify(stats)
+  response.headers['X-Cache'] = 'MISS'
+  return response
+
+
+@app.route('/api/dashboard/chart-data', methods=['GET'])
+@conditional('account_monthly_totals', 'accounts')
+def dashboard_chart_data():
+  """Hesap başına aylık gelir/gider serisi (son months ay, en fazla max_points nokta).
+
+  Aylık özet tablosundan (rollups.py) iki sorguyla okunur: hesaplar ve
+  aralıktaki hesap × ay satırları. Nokta sayısını aşan aralıklarda ardışık
+  aylar toplanır (her nokta bucket_months aylık toplam); aralık son aydan
+  geriye doğru tam bucket'lara genişletilir.
+  """
+  months = min(max(_int_arg('months') or DASHBOARD_CHART_MONTHS, 1), MAX_CHART_MONTHS)
+  max_points = min(max(_int_arg('max_points') or DASHBOARD_CHART_MAX_POINTS, 1), MAX_CHART_MONTHS)
+  bucket_months = -(-months // max_points)
+  points = -(-months // bucket_months)
+  now = datetime.utcnow()
+  end = now.year * 100 + now.month
+  start = _shift_month(end, 1 - points * bucket_months)
+  buckets = {}
+  for index in range(points * bucket_months):
+    buckets[_shift_month(start, index)] = index // bucket_months
+
+  session = get_session()
+  accounts = session.query(Account.id, Account.name, Account.type, Account.is_active).order_by(Account.id).all()
+  income = {account_id: [0.0] * points for account_id, *_ in accounts}
+  expense = {account_id: [0.0] * points for account_id, *_ in accounts}
+  has_data = set()
+  for account_id, year, month, month_income, month_expense in session.query(
+    AccountMonthlyTotal.account_id, AccountMonthlyTotal.year, AccountMonthlyTotal.month,
+    AccountMonthlyTotal.income, AccountMonthlyTotal.expense,
+  ).filter(_in_period(AccountMonthlyTotal, start, end)):
+    point = buckets.get(year * 100 + month)
+    if point is None or account_id not in income:
+      continue
+    income[account_id][point] += float(month_income or 0)
+    expense[account_id][point] += float(month_expense or 0)
+    has_data.add(account_id)
+
+  series = [
+    {
+      'account_id': account_id,
+      'name': name,
+      'type': account_type,
+      'income': [round(value, 2) for value in income[account_id]],
+      'expense': [round(value, 2) for value in expense[account_id]],
+    }
+    for account_id, name, account_type, is_active in accounts
+    if is_active or account_id in has_data
+  ]
+  return jsonify({
+    'period': _period_json(start, end),
+    'bucket_months': bucket_months,
+    'labels': [_month_label(_shift_month(start, point * bucket_months)) for point in range(points)],
+    'accounts': series,
+    'income': [round(sum(values), 2) for values in zip(*(row['income'] for row in series))] or [0.0] * points,
+    'expense': [round(sum(values), 2) for values in zip(*(row['expense'] for row in series))] or [0.0] * points,
+  })
+
+
+@app.route('/api/dashboard/unpaid-rents', methods=['GET'])
+@conditional('rents', 'owners')
+def dashboard_unpaid_rents():
+  """Ödenmemiş aidatlar vade sırasıyla (vadesiz olanlar sonda), malik adı ve dairesiyle.
+
+  Tek sorgu: rents ⋈ owners, ix_rents_unpaid_due üzerinde keyset sayfa;
+  limit verilmezse DASHBOARD_UNPAID_PAGE_SIZE satır döner, devamı next_cursor ile.
+  """
+  session = get_session()
+  q = (
+    session.query(Rent, Owner.full_name, Owner.unit_name)
+    .join(Owner, Owner.id == Rent.owner_id)
+    .filter(Rent.status == 'UNPAID')
+  )
+  try:
+    rows, next_cursor = _paginate(
+      q, [Rent.due_date, Rent.id], lambda row: (row[0].due_date, row[0].id),
+      descending=False, nullable_first=True, default_limit=DASHBOARD_UNPAID_PAGE_SIZE,
+    )
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+  return jsonify({
+    'rents': [serialize_unpaid_rent(rent, owner_name, unit_name) for rent, owner_name, unit_name in rows],
+    'next_cursor': next_cursor,
+  })
+
+
+# ==================== İSTEK OTURUMU ====================
+def get_session():
+  """İstek boyunca tek oturum: ilk çağrıda açılır, app context kapanırken kapanır.
+
+  View'lar commit etmez, yalnızca flush eder; commit/rollback
+  finish_session_transaction'da tek yerde yapılır.
+  """
+  session = g.get('db_session')
+  if session is None:
+    session = g.db_session = SessionLocal()
+  return session
+
+
+class WriteConflict(Exception):
+  """Kilit beklerken okunan veri değişti ya da view bir kilit hatasını yuttu; istek yeniden denenir"""
+
+
+def _is_retryable(exc):
+  return isinstance(exc, WriteConflict) or is_retryable_error(exc)
+
+
+def _run_with_retry(attempt_fn):
+  """attempt_fn'i deadlock/serialization/kilit hatalarında yeniden dene.
+
+  Denemeler arasında üstel, tam jitter'lı bekleme yapılır; DB_RETRY_ATTEMPTS
+  denemeden sonra son hata (ya da son yanıt) olduğu gibi döner.
+  """
+  for attempt in range(1, DB_RETRY_ATTEMPTS + 1):
+    take_conflict_flag()
+    try:
+      result = attempt_fn()
+      if not take_conflict_flag():
+        return result
+      if attempt == DB_RETRY_ATTEMPTS:
+        return result
+    except Exception as e:
+      if not _is_retryable(e) or attempt == DB_RETRY_ATTEMPTS:
+        raise
+    session = g.get('db_session')
+    if session is not None:
+      session.rollback()
+    time.sleep(random.uniform(0, DB_RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+
+@app.before_request
+def dispatch_write():
+  """Yazan istekleri kilit çakışmalarında yeniden deneyerek çalıştır.
+
+  WRITE_QUEUE modunda view süreçteki tek yazıcı thread'inde, kuyruğun açtığı
+  oturumla çalışır; commit kuyrukta (grup commit) yapılır, 4xx/5xx yanıtların
+  yazmaları savepoint ile geri alınır. Aksi halde view bu thread'de çalışır
+  ve commit finish_session_transaction'da yapılır; her deneme geri alınmış
+  temiz bir işlemle başlar. Okuma istekleri buraya girmez.
+
+  Idempotency-Key başlığı varsa istek anahtar başına bir kez çalışır;
+  tekrarlar saklanan yanıtı Idempotent-Replayed başlığıyla alır (idempotency.py).
+  """
+  if (
+    request.method not in ('POST', 'PUT', 'DELETE')
+    or request.endpoint not in app.view_functions
+    or request.endpoint in WRITE_DISPATCH_EXEMPT_ENDPOINTS
+  ):
+    return None
+  view = app.ensure_sync(app.view_functions[request.endpoint])
+  view_args = request.view_args or {}
+
+  key = request.headers.get('Idempotency-Key')
+  if key:
+    if len(key) > idempotency.MAX_KEY_LENGTH:
+      return jsonify({'success': False, 'message': 'Idempotency-Key en fazla 128 karakter olabilir'}), 400
+    fingerprint = idempotency.request_fingerprint(request.method, request.path, request.get_data())
+    try:
+      stored = idempotency.claim(key, fingerprint)
+    except idempotency.KeyReused:
+      return jsonify({'success': False, 'message': 'Idempotency-Key farklı bir istekte kullanılmış'}), 422
+    except idempotency.StillRunning:
+      # İstemci 409'da aynı anahtarla yeniden dener
+      response = jsonify({'success': False, 'message': 'Aynı anahtarlı istek hâlâ işleniyor'})
+      response.headers['Retry-After'] = '1'
+      return response, 409
+    if stored is not None:
+      response = Response(stored.response_body, status=stored.response_status, mimetype='application/json')
+      response.headers['Idempotent-Replayed'] = 'true'
+      return response
+    g.idempotency_key = key
+    idempotency.cleaner.start()
+
+  def execute(session):
+    response = app.make_response(view(**view_args))
+    if key and response.status_code < 400:
+      # Yanıt yazmalarla aynı işlemde saklanır: ikisi birlikte commit edilir
+      idempotency.complete(session, key, response.status_code, response.get_data(as_text=True))
+    return response
+
+  if write_queue is None:
+    def attempt():
+      session = get_session()
+      if session.get_bind().dialect.name == 'sqlite':
+        # SQLite'ta kilit sırası = yazma kilidini işlem başında almak; okuma→yazma
+        # yükseltmesindeki anında BUSY busy_timeout ile beklenemez
+        session.connection(execution_options={'sqlite_immediate': True})
+      response = execute(session)
+      if response.status_code >= 400:
+        return response  # finish_session_transaction geri alır
+      if take_conflict_flag():
+        raise WriteConflict('Kilit çakışması')
+      # Commit de denemenin parçası: PostgreSQL serialization hataları ve
+      # SQLite BUSY commit anında gelebilir, yeniden denenmeleri gerekir
+      try:
+        session.commit()
+      except Exception as e:
+        if _is_retryable(e):
+          raise
+        session.rollback()
+        print(f"Commit hatası ({request.method} {request.path}): {e}")
+        return make_response(jsonify({'success': False, 'message': 'İşlem kaydedilemedi'}), 500)
+      return response
+    return _run_with_retry(attempt)
+
+  @copy_current_request_context
+  def run(session):
+    g.db_session = session
+    try:
+      response = execute(session)
+      if take_conflict_flag():
+        raise WriteConflict('Kilit çakışması')
+      return response
+    finally:
+      g.pop('db_session', None)  # oturumu kuyruk kapatır, teardown değil
+
+  response = _run_with_retry(lambda: write_queue.submit(run))
+  if response.status_code < 400:
+    g.pop('idempotency_key', None)  # yanıt kuyrukta commit edildi
+  return response
+
+
+# Dashboard önbellek kancasından sonra kaydedilir: after_request kancaları ters
+# sırada çalıştığından önbellek commit'ten sonra düşürülür
+@app.after_request
+def finish_session_transaction(response):
+  """Başarılı (<400) yanıtlarda commit, diğerlerinde rollback.
+
+  dispatch_write'tan geçen yazmalar denemenin içinde commit edilmiştir;
+  buradaki commit onlar için boş işlemdir.
+  """
+  session = g.get('db_session')
+  if session is None:
+    return response
+  if response.status_code >= 400:
+    session.rollback()
+    return response
+  try:
+    session.commit()
+  except Exception as e:
+    session.rollback()
+    print(f"Commit hatası ({request.method} {request.path}): {e}")
+    return make_response(jsonify({'success': False, 'message': 'İşlem kaydedilemedi'}), 500)
+  g.pop('idempotency_key', None)  # saklanan yanıt commit edildi, bırakılacak sahiplik yok
+  return response
+
+
+@app.teardown_appcontext
+def close_session(exc):
+  """Her durumda (işlenmemiş hata dahil) oturumu kapat; bağlantı havuza döner"""
+  session = g.pop('db_session', None)
+  if session is not None:
+    session.close()
+  key = g.pop('idempotency_key', None)
+  if key is not None:
+    # Yanıt commit edildiyse satır DONE'dır ve kalır; aksi halde sahiplik bırakılır
+    try:
+      idempotency.release(key)
+    except Exception as e:
+      print(f"Idempotency anahtarı bırakılamadı: {e}")
+
 
 # EXPENSES API
 @app.route('/api/expenses', methods=['GET'])
+@conditional('expenses', 'accounts', 'categories')
 def list_expenses():
-  session = SessionLocal()
+  session = get_session()
   try:
     q = session.query(Expense, Account, Category)
     q = q.join(Account, Expense.account_id == Account.id)
     q = q.join(Category, Expense.category_id == Category.id)
 
-    if request.args.get('account_id'):
-      try:
-        q = q.filter(Expense.account_id == int(request.args.get('account_id')))
-      except ValueError:
-        pass
+    account_id = _int_arg('account_id')
+    if account_id is not None:
+      q = q.filter(Expense.account_id == account_id)
 
-    if request.args.get('category_id'):
-      try:
-        q = q.filter(Expense.category_id == int(request.args.get('category_id')))
-      except ValueError:
-        pass
+    category_id = _int_arg('category_id')
+    if category_id is not None:
+      q = q.filter(Expense.category_id == category_id)
 
-    expenses = q.order_by(Expense.expense_date.desc(), Expense.id.desc()).all()
-    result = [_json_expense(exp, cat, acc) for exp, acc, cat in expenses]
-    return jsonify({'expenses': result})
-  finally:
-    session.close()
+    q = _filter_date_range(q, Expense.expense_date)
+    expenses, next_cursor = _paginate(
+      q, [Expense.expense_date, Expense.id], lambda row: (row[0].expense_date, row[0].id), nullable_first=True
+    )
+    result = [serialize_expense(exp, cat, acc) for exp, acc, cat in expenses]
+    return jsonify({'expenses': result, 'next_cursor': next_cursor})
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
 
 
 @app.route('/api/expenses', methods=['POST'])
@@ -391,18 +928,16 @@ def create_expense_record():
     except ValueError:
       return jsonify({'success': False, 'message': 'Geçersiz tarih formatı'}), 400
 
-  session = SessionLocal()
+  session = get_session()
   try:
-    acc = session.query(Account).filter(Account.id == account_id, Account.is_active == True).with_for_update().first()
+    acc = session.query(Account).filter(Account.id == account_id, Account.is_active == True).first()
     cat = session.query(Category).filter(Category.id == category_id, Category.is_active == True).first()
     if not acc:
-      session.close()
       return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
     if not cat:
-      session.close()
       return jsonify({'success': False, 'message': 'Kategori bulunamadı'}), 404
 
-    _apply_balance(acc, -amount)
+    _apply_balance(session, acc, -amount)
 
     exp = Expense(
       name=name,
@@ -427,37 +962,55 @@ def create_expense_record():
       created_by=data.get('created_by'),
     )
     session.add(tx)
-    session.commit()
-    session.refresh(exp)
-    session.refresh(acc)
-    return jsonify({'success': True, 'expense': _json_expense(exp, cat, acc), 'account': _json_account(acc)}), 201
+    session.flush()
+    rollups.record_expense(session, exp)
+    rollups.record_transaction(session, tx)
+    return jsonify({'success': True, 'expense': serialize_expense(exp, cat, acc), 'account': serialize_account(acc)}), 201
   except Exception as e:
-    session.rollback()
     return jsonify({'success': False, 'message': str(e)}), 400
-  finally:
-    session.close()
+
+
+def _created_since(record):
+  """Kayda bağlı kasa hareketleri kayıtla aynı istekte ya da sonra yazılır: created_at alt sınırı.
+
+  (source, related_id) aramasında PostgreSQL partition'lı transactions'ın eski
+  yılları taranmaz (partitioning.py); SQLite'ta index aramasına ek bir filtredir.
+  """
+  if record.created_at is None:
+    return true()
+  return Transaction.created_at >= record.created_at - RELATED_TRANSACTION_SLACK
+
+
+def _expense_transaction(session, exp):
+  """Giderin iptal edilmemiş kasa hareketini kilitle (gider satırından sonra, hesaplardan önce)"""
+  return session.query(Transaction).filter(
+    Transaction.source == 'EXPENSE', Transaction.related_id == exp.id, Transaction.is_canceled == False,
+    _created_since(exp),
+  ).order_by(Transaction.id).populate_existing().with_for_update().first()
 
 
 @app.route('/api/expenses/<int:expense_id>', methods=['PUT'])
 def update_expense_record(expense_id):
   data = request.json or {}
-  session = SessionLocal()
+  session = get_session()
   try:
-    exp = session.query(Expense).filter(Expense.id == expense_id).with_for_update().first()
+    exp = _lock_rows(session, Expense, expense_id).get(expense_id)
     if not exp:
-      session.close()
       return jsonify({'success': False, 'message': 'Gider bulunamadı'}), 404
+    tx = _expense_transaction(session, exp)
+    # Rapor özetleri: eski hal şimdi çıkarılır, yeni hal flush'tan sonra eklenir
+    rollups.record_expense(session, exp, sign=-1)
+    if tx:
+      rollups.record_transaction(session, tx, sign=-1)
 
     new_name = (data.get('name') or exp.name).strip()
     try:
       new_category_id = int(data.get('category_id', exp.category_id))
       new_account_id = int(data.get('account_id', exp.account_id))
     except (TypeError, ValueError):
-      session.close()
       return jsonify({'success': False, 'message': 'category_id ve account_id sayısal olmalı'}), 400
     new_amount = _to_decimal(data.get('amount', exp.amount))
     if not new_name or not new_category_id or not new_account_id or new_amount is None or new_amount <= 0:
-      session.close()
       return jsonify({'success': False, 'message': 'Geçerli name, category_id, account_id ve amount gerekli'}), 400
 
     date_str = data.get('date')
@@ -465,32 +1018,27 @@ def update_expense_record(expense_id):
       try:
         exp.expense_date = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
       except ValueError:
-        session.close()
         return jsonify({'success': False, 'message': 'Geçersiz tarih formatı'}), 400
 
-    old_account = session.query(Account).filter(Account.id == exp.account_id, Account.is_active == True).with_for_update().first()
+    old_account = session.query(Account).filter(Account.id == exp.account_id, Account.is_active == True).first()
     if not old_account:
-      session.close()
       return jsonify({'success': False, 'message': 'Mevcut hesap bulunamadı'}), 404
 
     cat = session.query(Category).filter(Category.id == new_category_id, Category.is_active == True).first()
     if not cat:
-      session.close()
       return jsonify({'success': False, 'message': 'Kategori bulunamadı'}), 404
 
     if new_account_id == exp.account_id:
-      delta = new_amount - exp.amount
-      _apply_balance(old_account, -delta)
       target_account = old_account
     else:
-      new_account = session.query(Account).filter(Account.id == new_account_id, Account.is_active == True).with_for_update().first()
-      if not new_account:
-        session.close()
+      target_account = session.query(Account).filter(Account.id == new_account_id, Account.is_active == True).first()
+      if not target_account:
         return jsonify({'success': False, 'message': 'Yeni hesap bulunamadı'}), 404
-      _apply_balance(old_account, exp.amount)
-      _apply_balance(new_account, -new_amount)
-      target_account = new_account
-      exp.account_id = new_account_id
+    # Aynı hesapta deltalar toplanır: yalnızca tutar farkı uygulanır. Kasa hareketi
+    # iptal edilmişse (DELETE /api/transactions) eski tutar zaten iade edildi
+    refund = [(old_account, exp.amount)] if tx else []
+    _apply_balances(session, refund + [(target_account, -new_amount)])
+    exp.account_id = new_account_id
 
     exp.name = new_name
     exp.category_id = new_category_id
@@ -500,9 +1048,6 @@ def update_expense_record(expense_id):
     exp.maintenance_agreement_id = data.get('maintenance_agreement_id', exp.maintenance_agreement_id)
 
     # İlişkili transaction güncelle
-    tx = session.query(Transaction).filter(
-      Transaction.source == 'EXPENSE', Transaction.related_id == exp.id, Transaction.is_canceled == False
-    ).with_for_update().first()
     if tx:
       tx.account_id = exp.account_id
       tx.amount = new_amount
@@ -519,60 +1064,57 @@ def update_expense_record(expense_id):
       )
       session.add(tx)
 
-    session.commit()
-    session.refresh(exp)
-    session.refresh(target_account)
-    return jsonify({'success': True, 'expense': _json_expense(exp, cat, target_account), 'account': _json_account(target_account)})
+    session.flush()
+    rollups.record_expense(session, exp)
+    rollups.record_transaction(session, tx)
+    return jsonify({'success': True, 'expense': serialize_expense(exp, cat, target_account), 'account': serialize_account(target_account)})
   except Exception as e:
-    session.rollback()
     return jsonify({'success': False, 'message': str(e)}), 400
-  finally:
-    session.close()
 
 
 @app.route('/api/expenses/<int:expense_id>', methods=['DELETE'])
 def delete_expense_record(expense_id):
-  session = SessionLocal()
+  session = get_session()
   try:
-    exp = session.query(Expense).filter(Expense.id == expense_id).with_for_update().first()
+    exp = _lock_rows(session, Expense, expense_id).get(expense_id)
     if not exp:
-      session.close()
       return jsonify({'success': False, 'message': 'Gider bulunamadı'}), 404
+    tx = _expense_transaction(session, exp)
 
-    acc = session.query(Account).filter(Account.id == exp.account_id, Account.is_active == True).with_for_update().first()
-    if acc:
-      _apply_balance(acc, exp.amount)
+    # Hesap pasif olsa da gider tutarı iade edilir; aksi halde iptal edilen kasa
+    # hareketiyle bakiye ayrılır (reconcile.py). Hareket zaten iptal edildiyse
+    # (DELETE /api/transactions) tutar o sırada iade edildi.
+    acc = session.query(Account).filter(Account.id == exp.account_id).first()
+    if acc and tx:
+      _apply_balance(session, acc, exp.amount)
 
-    tx = session.query(Transaction).filter(
-      Transaction.source == 'EXPENSE', Transaction.related_id == exp.id, Transaction.is_canceled == False
-    ).with_for_update().first()
     if tx:
       tx.is_canceled = True
+      rollups.record_transaction(session, tx, sign=-1)
+    rollups.record_expense(session, exp, sign=-1)
 
+    session.add(DeletedRecord(entity='expenses', entity_id=exp.id))
     session.delete(exp)
-    session.commit()
+    session.flush()
     response = {'success': True, 'message': 'Gider silindi'}
     if acc:
-      response['account'] = _json_account(acc)
+      response['account'] = serialize_account(acc)
     return jsonify(response)
   except Exception as e:
-    session.rollback()
     return jsonify({'success': False, 'message': str(e)}), 400
-  finally:
-    session.close()
 
 
 # ACCOUNTS API
 @app.route('/api/accounts', methods=['GET'])
+@conditional('accounts')
 def list_accounts():
-  session = SessionLocal()
+  session = get_session()
   is_active = request.args.get('is_active')
   q = session.query(Account)
   if is_active is not None:
     q = q.filter(Account.is_active == (is_active.lower() == 'true'))
-  accounts = q.order_by(Account.id.desc()).all()
-  result = [_json_account(a) for a in accounts]
-  session.close()
+  accounts = _with_live_balances(session, q.order_by(Account.id.desc()).all())
+  result = [serialize_account(a) for a in accounts]
   return jsonify({'accounts': result})
 
 
@@ -586,45 +1128,39 @@ def create_account():
   if not name or acc_type not in ('CASH', 'BANK'):
     return jsonify({'success': False, 'message': 'Geçerli isim ve tip (CASH/BANK) gerekli'}), 400
 
-  session = SessionLocal()
+  session = get_session()
   try:
     existing = session.query(Account).filter(Account.name == name, Account.is_active == True).first()
     if existing:
-      session.close()
       return jsonify({'success': False, 'message': 'Bu adla aktif hesap zaten var'}), 409
 
-    acc = Account(name=name, type=acc_type, balance=initial_balance)
+    acc = Account(name=name, type=acc_type, balance=initial_balance, opening_balance=initial_balance)
     session.add(acc)
-    session.commit()
-    session.refresh(acc)
-    result = _json_account(acc)
-    session.close()
+    session.flush()
+    result = serialize_account(acc)
     return jsonify({'success': True, 'account': result}), 201
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 500
 
 
 @app.route('/api/accounts/<int:account_id>', methods=['GET'])
+@conditional('accounts')
 def get_account(account_id):
-  session = SessionLocal()
+  session = get_session()
   acc = session.query(Account).filter(Account.id == account_id).first()
   if not acc:
-    session.close()
     return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
-  result = _json_account(acc)
-  session.close()
+  _with_live_balances(session, [acc])
+  result = serialize_account(acc)
   return jsonify({'success': True, 'account': result})
 
 
 @app.route('/api/accounts/<int:account_id>', methods=['PUT'])
 def update_account(account_id):
   data = request.json or {}
-  session = SessionLocal()
+  session = get_session()
   acc = session.query(Account).filter(Account.id == account_id).first()
   if not acc:
-    session.close()
     return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
 
   new_name = data.get('name')
@@ -633,14 +1169,12 @@ def update_account(account_id):
   if new_name:
     existing = session.query(Account).filter(Account.name == new_name, Account.id != account_id, Account.is_active == True).first()
     if existing:
-      session.close()
       return jsonify({'success': False, 'message': 'Bu adla başka aktif hesap var'}), 409
     acc.name = new_name
 
   if new_type:
     t = new_type.upper()
     if t not in ('CASH', 'BANK'):
-      session.close()
       return jsonify({'success': False, 'message': 'Tip CASH veya BANK olmalı'}), 400
     acc.type = t
 
@@ -648,56 +1182,159 @@ def update_account(account_id):
     acc.is_active = bool(data.get('is_active'))
 
   acc.updated_at = datetime.utcnow()
-  session.commit()
-  result = _json_account(acc)
-  session.close()
+  session.flush()
+  _with_live_balances(session, [acc])
+  result = serialize_account(acc)
   return jsonify({'success': True, 'account': result})
 
 
 @app.route('/api/accounts/<int:account_id>', methods=['DELETE'])
 def deactivate_account(account_id):
-  session = SessionLocal()
+  session = get_session()
   acc = session.query(Account).filter(Account.id == account_id).first()
   if not acc:
-    session.close()
     return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
   acc.is_active = False
   acc.updated_at = datetime.utcnow()
-  session.commit()
-  result = _json_account(acc)
-  session.close()
+  session.flush()
+  _with_live_balances(session, [acc])
+  result = serialize_account(acc)
   return jsonify({'success': True, 'account': result, 'message': 'Hesap pasif edildi'})
 
 
 # TRANSACTIONS API
 @app.route('/api/transactions', methods=['GET'])
+@conditional('transactions')
 def list_transactions():
-  session = SessionLocal()
-  q = session.query(Transaction)
-  if request.args.get('account_id'):
-    try:
-      aid = int(request.args.get('account_id'))
-      q = q.filter(Transaction.account_id == aid)
-    except ValueError:
-      pass
-  if request.args.get('type'):
-    q = q.filter(Transaction.type == request.args.get('type').upper())
-  if request.args.get('source'):
-    q = q.filter(Transaction.source == request.args.get('source').upper())
-  if request.args.get('is_canceled'):
-    q = q.filter(Transaction.is_canceled == (request.args.get('is_canceled').lower() == 'true'))
-
-  txs = q.order_by(Transaction.created_at.desc()).all()
-  result = [_json_transaction(t) for t in txs]
-  session.close()
-  return jsonify({'transactions': result})
-
-
-def _apply_balance(acc: Account, delta: Decimal):
-  new_balance = (acc.balance or Decimal('0')) + delta
-  if not ALLOW_NEGATIVE_BALANCE and new_balance < 0:
+  session = get_session()
+  try:
+    q = session.query(Transaction)
+    account_id = _int_arg('account_id')
+    if account_id is not None:
+      q = q.filter(Transaction.account_id == account_id)
+    if request.args.get('type'):
+      q = q.filter(Transaction.type == request.args.get('type').upper())
+    if request.args.get('source'):
+      q = q.filter(Transaction.source == request.args.get('source').upper())
+    if request.args.get('is_canceled'):
+      q = q.filter(Transaction.is_canceled == (request.args.get('is_canceled').lower() == 'true'))
+    q = _filter_date_range(q, Transaction.created_at)
+
+    keys = [Transaction.created_at, Transaction.id]
+    if _stream_requested():
+      return _stream_response('transactions', _keyset_queries(q, keys), serialize_transaction)
+    txs, next_cursor = _paginate(q, keys, lambda t: (t.created_at, t.id))
+    result = [serialize_transaction(t) for t in txs]
+    return jsonify({'transactions': result, 'next_cursor': next_cursor})
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+
+
+# Çok satırlı yazmalarda kilitler her zaman bu sırayla alınır; aynı tablodaki
+# satırlar artan id sırasıyla. Ters sırada kilitleyen iki istek (ör. A→B ve
+# B→A transferi) böylece birbirini beklemez, en fazla sıraya girer:
+#   rents → payments → expenses → transactions → accounts → owner_balances
+# Varlık satırları _lock_rows ile, bakiyeler en sonda _apply_balances ile kilitlenir.
+# İstenen "önce artan id ile hesaplar, sonra aidat, sonra ödeme" sırasından
+# bilinçli sapma: hangi hesapların etkileneceği ancak aidat/ödeme/gider satırı
+# okunduktan sonra bilinir (iptalde ödemenin hesabı, güncellemede eski hesap)
+# ve en çekişmeli satırlar olan hesap kilitleri böylece en kısa süre tutulur.
+# Deadlock'u önleyen, sıranın tüm handler'larda aynı olmasıdır.
+# Aylık rapor özetleri (rollups.py) bunlardan da sonra, commit anında yazılır.
+def _lock_rows(session, model, *ids):
+  """model satırlarını artan id sırasıyla kilitle ve tazele; {id: nesne} döner.
+
+  populate_existing kilit beklerken değişmiş satırların oturumdaki eski
+  kopyasını günceller; çağıran durumu (iptal edilmiş mi vb.) kilitten sonra
+  yeniden kontrol etmelidir.
+  """
+  ids = sorted({int(i) for i in ids if i is not None})
+  if not ids:
+    return {}
+  rows = (
+    session.query(model)
+    .filter(model.id.in_(ids))
+    .order_by(model.id)
+    .populate_existing()
+    .with_for_update()
+    .all()
+  )
+  return {row.id: row for row in rows}
+
+
+def _apply_balances(session, changes):
+  """(hesap, delta) çiftlerini hesap id sırasıyla uygula; aynı hesabın deltaları toplanır"""
+  merged = {}
+  for acc, delta in changes:
+    merged[acc.id] = (acc, merged.get(acc.id, (acc, Decimal('0')))[1] + _to_decimal(delta))
+  for _, (acc, delta) in sorted(merged.items()):
+    _apply_balance(session, acc, delta)
+
+
+def _apply_balance(session, acc: Account, delta: Decimal):
+  """Bakiyeyi tek koşullu UPDATE ile veritabanında değiştir.
+
+  Kontrol ve yazma aynı ifadede yapılır; satır kilidi yalnızca UPDATE'ten
+  commit'e kadar tutulur. Etkilenen satır yoksa bakiye negatife düşecek
+  demektir. Yeni bakiye ORM nesnesine commit edilmiş değer olarak yazılır.
+  """
+  if LEDGER_MODE:
+    _append_ledger(session, acc, delta)
+    return
+  balance = func.coalesce(Account.balance, 0)
+  stmt = (
+    update(Account)
+    .where(Account.id == acc.id)
+    .values(balance=balance + delta)
+    .execution_options(synchronize_session=False, entity_id=acc.id)
+  )
+  if not ALLOW_NEGATIVE_BALANCE:
+    stmt = stmt.where(balance + delta >= 0)
+
+  if session.get_bind().dialect.update_returning:
+    row = session.execute(stmt.returning(Account.balance, Account.updated_at)).first()
+  else:
+    # RETURNING desteklemeyen eski SQLite sürümleri
+    if session.execute(stmt).rowcount == 0:
+      row = None
+    else:
+      row = session.execute(select(Account.balance, Account.updated_at).where(Account.id == acc.id)).first()
+  if row is None:
     raise ValueError('Bakiye negatif olamaz')
-  acc.balance = new_balance
+  set_committed_value(acc, 'balance', row.balance)
+  set_committed_value(acc, 'updated_at', row.updated_at)
+
+
+def _append_ledger(session, acc: Account, delta: Decimal):
+  """Bakiye değişikliğini deftere ekle (LEDGER_MODE).
+
+  Alacak hareketleri hesap satırını kilitlemez. Borç hareketleri satırı
+  kilitler; kilit altında okunan canlı bakiye, eşzamanlı borçların ikisinin
+  birden negatif kuralını geçmesini önler (alacaklar bakiyeyi yalnızca artırır).
+  """
+  delta = _to_decimal(delta)
+  if delta < 0:
+    session.execute(select(Account.id).where(Account.id == acc.id).with_for_update())
+  live = live_balances(session, [acc.id]).get(acc.id, Decimal('0'))
+  if delta < 0 and not ALLOW_NEGATIVE_BALANCE and live + delta < 0:
+    raise ValueError('Bakiye negatif olamaz')
+  session.execute(
+    AccountLedger.__table__.insert()
+    .values(account_id=acc.id, delta=delta, folded=False, created_at=datetime.utcnow())
+    .execution_options(entity_id=acc.id)
+  )
+  set_committed_value(acc, 'balance', live + delta)
+  ledger_folder.start()
+
+
+def _with_live_balances(session, accounts):
+  """Defter modunda hesapların balance alanını canlı bakiyeyle değiştir"""
+  if LEDGER_MODE and accounts:
+    balances = live_balances(session, {acc.id for acc in accounts})
+    for acc in accounts:
+      if acc.id in balances:
+        set_committed_value(acc, 'balance', balances[acc.id])
+  return accounts
 
 
 @app.route('/api/transactions/income', methods=['POST'])
@@ -708,14 +1345,13 @@ def create_income():
   if not account_id or amount is None or amount <= 0:
     return jsonify({'success': False, 'message': 'account_id ve pozitif amount gerekli'}), 400
 
-  session = SessionLocal()
+  session = get_session()
   try:
-    acc = session.query(Account).filter(Account.id == account_id, Account.is_active == True).with_for_update().first()
+    acc = session.query(Account).filter(Account.id == account_id, Account.is_active == True).first()
     if not acc:
-      session.close()
       return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
 
-    _apply_balance(acc, amount)
+    _apply_balance(session, acc, amount)
     tx = Transaction(
       account_id=acc.id,
       type='INCOME',
@@ -725,14 +1361,11 @@ def create_income():
       created_by=data.get('created_by'),
     )
     session.add(tx)
-    session.commit()
-    session.refresh(tx)
-    result = _json_transaction(tx)
-    session.close()
-    return jsonify({'success': True, 'transaction': result, 'account': _json_account(acc)}), 201
+    session.flush()
+    rollups.record_transaction(session, tx)
+    result = serialize_transaction(tx)
+    return jsonify({'success': True, 'transaction': result, 'account': serialize_account(acc)}), 201
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
@@ -744,14 +1377,13 @@ def create_expense():
   if not account_id or amount is None or amount <= 0:
     return jsonify({'success': False, 'message': 'account_id ve pozitif amount gerekli'}), 400
 
-  session = SessionLocal()
+  session = get_session()
   try:
-    acc = session.query(Account).filter(Account.id == account_id, Account.is_active == True).with_for_update().first()
+    acc = session.query(Account).filter(Account.id == account_id, Account.is_active == True).first()
     if not acc:
-      session.close()
       return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
 
-    _apply_balance(acc, -amount)
+    _apply_balance(session, acc, -amount)
     tx = Transaction(
       account_id=acc.id,
       type='EXPENSE',
@@ -761,14 +1393,11 @@ def create_expense():
       created_by=data.get('created_by'),
     )
     session.add(tx)
-    session.commit()
-    session.refresh(tx)
-    result = _json_transaction(tx)
-    session.close()
-    return jsonify({'success': True, 'transaction': result, 'account': _json_account(acc)}), 201
+    session.flush()
+    rollups.record_transaction(session, tx)
+    result = serialize_transaction(tx)
+    return jsonify({'success': True, 'transaction': result, 'account': serialize_account(acc)}), 201
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
@@ -779,21 +1408,24 @@ def create_transfer():
   dst_id = data.get('target_account_id')
   amount = _to_decimal(data.get('amount'))
 
+  try:
+    src_id = int(src_id) if src_id else None
+    dst_id = int(dst_id) if dst_id else None
+  except (TypeError, ValueError):
+    return jsonify({'success': False, 'message': 'Hesap id\'leri sayısal olmalı'}), 400
   if not src_id or not dst_id or src_id == dst_id:
     return jsonify({'success': False, 'message': 'Farklı kaynak ve hedef hesap gerekli'}), 400
   if amount is None or amount <= 0:
     return jsonify({'success': False, 'message': 'Pozitif amount gerekli'}), 400
 
-  session = SessionLocal()
+  session = get_session()
   try:
-    src = session.query(Account).filter(Account.id == src_id, Account.is_active == True).with_for_update().first()
-    dst = session.query(Account).filter(Account.id == dst_id, Account.is_active == True).with_for_update().first()
+    src = session.query(Account).filter(Account.id == src_id, Account.is_active == True).first()
+    dst = session.query(Account).filter(Account.id == dst_id, Account.is_active == True).first()
     if not src or not dst:
-      session.close()
       return jsonify({'success': False, 'message': 'Kaynak veya hedef hesap bulunamadı'}), 404
 
-    _apply_balance(src, -amount)
-    _apply_balance(dst, amount)
+    _apply_balances(session, [(src, -amount), (dst, amount)])
 
     tx = Transaction(
       account_id=src.id,
@@ -805,94 +1437,84 @@ def create_transfer():
       created_by=data.get('created_by'),
     )
     session.add(tx)
-    session.commit()
-    session.refresh(tx)
-    result = _json_transaction(tx)
-    session.close()
+    session.flush()
+    rollups.record_transaction(session, tx)
+    result = serialize_transaction(tx)
     return jsonify({
       'success': True,
       'transaction': result,
-      'source_account': _json_account(src),
-      'target_account': _json_account(dst)
+      'source_account': serialize_account(src),
+      'target_account': serialize_account(dst)
     }), 201
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
 @app.route('/api/transactions/<int:tx_id>', methods=['DELETE'])
 def cancel_transaction(tx_id):
-  session = SessionLocal()
+  session = get_session()
   try:
-    tx = session.query(Transaction).filter(Transaction.id == tx_id).with_for_update().first()
+    tx = _lock_rows(session, Transaction, tx_id).get(tx_id)
     if not tx:
-      session.close()
       return jsonify({'success': False, 'message': 'İşlem bulunamadı'}), 404
     if tx.is_canceled:
-      session.close()
       return jsonify({'success': False, 'message': 'İşlem zaten iptal'}), 400
 
-    acc = session.query(Account).filter(Account.id == tx.account_id).with_for_update().first()
+    acc = session.query(Account).filter(Account.id == tx.account_id).first()
     if not acc:
-      session.close()
       return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
 
     if tx.type == 'INCOME':
-      _apply_balance(acc, -tx.amount)
+      _apply_balance(session, acc, -tx.amount)
     elif tx.type == 'EXPENSE':
-      _apply_balance(acc, tx.amount)
+      _apply_balance(session, acc, tx.amount)
     elif tx.type == 'TRANSFER':
       src = acc
-      dst = session.query(Account).filter(Account.id == tx.related_account).with_for_update().first()
+      dst = session.query(Account).filter(Account.id == tx.related_account).first()
       if not dst:
-        session.close()
         return jsonify({'success': False, 'message': 'Transfer hedef hesabı bulunamadı'}), 404
-      _apply_balance(src, tx.amount)
-      _apply_balance(dst, -tx.amount)
+      _apply_balances(session, [(src, tx.amount), (dst, -tx.amount)])
     else:
-      session.close()
       return jsonify({'success': False, 'message': 'Bilinmeyen işlem tipi'}), 400
 
     tx.is_canceled = True
-    session.commit()
-    result = _json_transaction(tx)
-    session.close()
+    rollups.record_transaction(session, tx, sign=-1)
+    session.flush()
+    result = serialize_transaction(tx)
     return jsonify({'success': True, 'transaction': result})
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 # RENTS API
 @app.route('/api/rents', methods=['GET'])
+@conditional('rents', 'owners')
 def list_rents():
-  session = SessionLocal()
+  session = get_session()
   try:
-    rents = session.query(Rent).all()
-    result = []
-    for rent in rents:
-      result.append({
-        'id': rent.id,
-        'owner_id': rent.owner_id,
-        'owner_name': rent.owner.full_name if rent.owner else None,
-        'month': rent.month,
-        'year': rent.year,
-        'amount': float(rent.amount) if rent.amount else 0,
-        'due_date': rent.due_date.isoformat() if rent.due_date else None,
-        'status': rent.status,
-        'late_fee': float(rent.late_fee) if rent.late_fee else 0,
-        'category_id': rent.category_id,
-        'description': rent.description,
-        'created_at': rent.created_at.isoformat() if rent.created_at else None,
-        'updated_at': rent.updated_at.isoformat() if rent.updated_at else None,
-      })
-    return jsonify({'rents': result})
+    q = session.query(Rent, Owner.full_name).outerjoin(Owner, Owner.id == Rent.owner_id)
+    owner_id = _int_arg('owner_id')
+    if owner_id is not None:
+      q = q.filter(Rent.owner_id == owner_id)
+    if request.args.get('status'):
+      q = q.filter(Rent.status == request.args.get('status').upper())
+    year = _int_arg('year')
+    if year is not None:
+      q = q.filter(Rent.year == year)
+    month = _int_arg('month')
+    if month is not None:
+      q = q.filter(Rent.month == month)
+    q = _filter_date_range(q, Rent.due_date, by_period=False)
+
+    rents, next_cursor = _paginate(
+      q, [Rent.year, Rent.month, Rent.id], lambda row: (row[0].year, row[0].month, row[0].id)
+    )
+    result = [serialize_rent(rent, owner_name) for rent, owner_name in rents]
+    return jsonify({'rents': result, 'next_cursor': next_cursor})
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
   except Exception as e:
     print(f"Rents error: {e}")
     return jsonify({'rents': []}), 500
-  finally:
-    session.close()
 
 
 @app.route('/api/rents', methods=['POST'])
@@ -906,18 +1528,16 @@ def create_rent():
   if not owner_id or not month or not year or amount is None or amount <= 0:
     return jsonify({'success': False, 'message': 'user_id, month, year ve pozitif amount gerekli'}), 400
   
-  session = SessionLocal()
+  session = get_session()
   try:
     owner = session.query(Owner).filter(Owner.id == owner_id, Owner.is_active == True).first()
     if not owner:
-      session.close()
       return jsonify({'success': False, 'message': 'Malik bulunamadı'}), 404
     
     existing = session.query(Rent).filter(
       Rent.owner_id == owner_id, Rent.month == month, Rent.year == year
     ).first()
     if existing:
-      session.close()
       return jsonify({'success': False, 'message': 'Bu dönem için aidat zaten var'}), 409
     
     due_date = None
@@ -938,29 +1558,13 @@ def create_rent():
       description=data.get('description'),
     )
     session.add(rent)
-    session.commit()
-    session.refresh(rent)
+    _adjust_owner_balance(session, owner.id, charged=amount)
+    rollups.record_charge(session, owner.id, year, month, amount)
+    session.flush()
     
-    result = {
-      'id': rent.id,
-      'owner_id': rent.owner_id,
-      'owner_name': owner.full_name,
-      'month': rent.month,
-      'year': rent.year,
-      'amount': float(rent.amount or 0),
-      'due_date': rent.due_date.isoformat() if rent.due_date else None,
-      'status': rent.status or 'UNPAID',
-      'late_fee': float(rent.late_fee or 0) if rent.late_fee else None,
-      'category_id': rent.category_id,
-      'description': rent.description,
-      'created_at': rent.created_at.isoformat() if rent.created_at else None,
-      'updated_at': rent.updated_at.isoformat() if rent.updated_at else None,
-    }
-    session.close()
+    result = serialize_rent_detail(rent, owner.full_name)
     return jsonify({'success': True, 'rent': result}), 201
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
@@ -970,16 +1574,15 @@ def bulk_create_rent():
   month = data.get('month')
   year = data.get('year')
   amount = _to_decimal(data.get('amount'))
+  dry_run = bool(data.get('dry_run'))
   
   if not month or not year or amount is None or amount <= 0:
     return jsonify({'success': False, 'message': 'month, year ve pozitif amount gerekli'}), 400
   
-  session = SessionLocal()
+  session = get_session()
   try:
-    owners = session.query(Owner).filter(Owner.is_active == True).all()
-    created_count = 0
-    skipped_count = 0
-    
+    # Core ile eklenir; kapalı yıl kontrolü flush kancasına düşmez
+    yearend.ensure_open(session, year)
     due_date = None
     if data.get('due_date'):
       try:
@@ -987,28 +1590,51 @@ def bulk_create_rent():
       except ValueError:
         pass
     
-    for owner in owners:
-      existing = session.query(Rent).filter(
-        Rent.owner_id == owner.id, Rent.month == month, Rent.year == year
-      ).first()
-      if existing:
-        skipped_count += 1
-        continue
-      
-      rent = Rent(
-        owner_id=owner.id,
-        month=month,
-        year=year,
-        amount=amount,
-        due_date=due_date,
-        status='UNPAID',
-        late_fee=Decimal('0'),
-      )
-      session.add(rent)
-      created_count += 1
+    # Tek anti-join: aktif malikler ve bu dönem için mevcut aidatları
+    rows = session.query(Owner.id, Rent.id).outerjoin(
+      Rent, (Rent.owner_id == Owner.id) & (Rent.month == month) & (Rent.year == year)
+    ).filter(Owner.is_active == True).all()
+    owner_ids = [owner_id for owner_id, rent_id in rows if rent_id is None]
     
-    session.commit()
-    session.close()
+    if dry_run:
+      return jsonify({
+        'success': True,
+        'dry_run': True,
+        'message': f'{len(owner_ids)} aidat oluşturulacak, {len(rows) - len(owner_ids)} atlanacak',
+        'created': len(owner_ids),
+        'skipped': len(rows) - len(owner_ids),
+      }), 200
+    
+    created_ids = []
+    if owner_ids:
+      now = datetime.utcnow()
+      values = [{
+        'owner_id': owner_id,
+        'month': month,
+        'year': year,
+        'amount': amount,
+        'due_date': due_date,
+        'status': 'UNPAID',
+        'late_fee': Decimal('0'),
+        'created_at': now,
+        'updated_at': now,
+      } for owner_id in owner_ids]
+      # Eşzamanlı bir istek aynı dönemi eklediyse unique index çakışması atlanır
+      dialect = session.get_bind().dialect.name
+      insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+      stmt = insert(Rent.__table__).on_conflict_do_nothing(
+        index_elements=['owner_id', 'year', 'month']
+      ).returning(Rent.__table__.c.owner_id)
+      created_ids = session.execute(stmt, values).scalars().all()
+      upsert_increment_many(session, OwnerBalance, ['owner_id'], [
+        {'owner_id': owner_id, 'charged': amount} for owner_id in created_ids
+      ])
+      for owner_id in created_ids:
+        rollups.record_charge(session, owner_id, year, month, amount)
+    
+    created_count = len(created_ids)
+    skipped_count = len(rows) - created_count
+    session.flush()
     return jsonify({
       'success': True,
       'message': f'{created_count} aidat oluşturuldu, {skipped_count} atlandı',
@@ -1016,27 +1642,26 @@ def bulk_create_rent():
       'skipped': skipped_count,
     }), 201
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
 @app.route('/api/rents/<int:rent_id>', methods=['PUT'])
 def update_rent(rent_id):
   data = request.json or {}
-  session = SessionLocal()
+  session = get_session()
   try:
     rent = session.query(Rent).filter(Rent.id == rent_id).with_for_update().first()
     if not rent:
-      session.close()
       return jsonify({'success': False, 'message': 'Aidat bulunamadı'}), 404
     
     if rent.status == 'PAID':
-      session.close()
       return jsonify({'success': False, 'message': 'Ödenmiş aidat düzenlenemez'}), 400
     
     if data.get('amount') is not None:
-      rent.amount = _to_decimal(data.get('amount'))
+      new_amount = _to_decimal(data.get('amount'))
+      _adjust_owner_balance(session, rent.owner_id, charged=new_amount - _to_decimal(rent.amount or 0))
+      rollups.record_charge(session, rent.owner_id, rent.year, rent.month, new_amount - _to_decimal(rent.amount or 0))
+      rent.amount = new_amount
     if data.get('due_date') is not None:
       try:
         rent.due_date = datetime.fromisoformat(data.get('due_date').replace('Z', '+00:00'))
@@ -1046,85 +1671,63 @@ def update_rent(rent_id):
       rent.description = data.get('description')
     
     rent.updated_at = datetime.utcnow()
-    session.commit()
-    session.refresh(rent)
+    session.flush()
     
     owner = session.query(Owner).filter(Owner.id == rent.owner_id).first()
-    result = {
-      'id': rent.id,
-      'owner_id': rent.owner_id,
-      'owner_name': owner.full_name if owner else None,
-      'month': rent.month,
-      'year': rent.year,
-      'amount': float(rent.amount or 0),
-      'due_date': rent.due_date.isoformat() if rent.due_date else None,
-      'status': rent.status or 'UNPAID',
-      'late_fee': float(rent.late_fee or 0) if rent.late_fee else None,
-      'category_id': rent.category_id,
-      'description': rent.description,
-      'created_at': rent.created_at.isoformat() if rent.created_at else None,
-      'updated_at': rent.updated_at.isoformat() if rent.updated_at else None,
-    }
-    session.close()
+    result = serialize_rent_detail(rent, owner.full_name if owner else None)
     return jsonify({'success': True, 'rent': result})
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
 @app.route('/api/rents/<int:rent_id>', methods=['DELETE'])
 def delete_rent(rent_id):
-  session = SessionLocal()
+  session = get_session()
   try:
     rent = session.query(Rent).filter(Rent.id == rent_id).first()
     if not rent:
-      session.close()
       return jsonify({'success': False, 'message': 'Aidat bulunamadı'}), 404
     
     if rent.status == 'PAID':
-      session.close()
       return jsonify({'success': False, 'message': 'Ödenmiş aidat silinemez'}), 400
     
+    _adjust_owner_balance(session, rent.owner_id, charged=-_to_decimal(rent.amount or 0))
+    rollups.record_charge(session, rent.owner_id, rent.year, rent.month, -_to_decimal(rent.amount or 0))
+    session.add(DeletedRecord(entity='rents', entity_id=rent.id))
     session.delete(rent)
-    session.commit()
-    session.close()
+    session.flush()
     return jsonify({'success': True, 'message': 'Aidat silindi'})
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
 # PAYMENTS API
 @app.route('/api/payments', methods=['GET'])
+@conditional('payments')
 def list_payments():
-  session = SessionLocal()
+  session = get_session()
   try:
-    payments = session.query(Payment).all()
-    result = []
-    for payment in payments:
-      result.append({
-        'id': payment.id,
-        'rent_id': payment.rent_id,
-        'owner_id': payment.owner_id,
-        'account_id': payment.account_id,
-        'amount': float(payment.amount) if payment.amount else 0,
-        'late_fee_amount': float(payment.late_fee_amount) if payment.late_fee_amount else 0,
-        'payment_date': payment.payment_date.isoformat() if payment.payment_date else None,
-        'reference_number': payment.reference_number,
-        'is_cancelled': payment.is_cancelled,
-        'cancellation_date': payment.cancellation_date.isoformat() if payment.cancellation_date else None,
-        'cancellation_reason': payment.cancellation_reason,
-        'created_at': payment.created_at.isoformat() if payment.created_at else None,
-        'updated_at': payment.updated_at.isoformat() if payment.updated_at else None,
-      })
-    return jsonify({'payments': result})
+    q = session.query(Payment)
+    for name, column in (('owner_id', Payment.owner_id), ('account_id', Payment.account_id), ('rent_id', Payment.rent_id)):
+      value = _int_arg(name)
+      if value is not None:
+        q = q.filter(column == value)
+    status = (request.args.get('status') or '').upper()
+    if status in ('ACTIVE', 'CANCELLED'):
+      q = q.filter(Payment.is_cancelled == (status == 'CANCELLED'))
+    q = _filter_date_range(q, Payment.payment_date)
+
+    keys = [Payment.payment_date, Payment.id]
+    if _stream_requested():
+      return _stream_response('payments', _keyset_queries(q, keys, nullable_first=True), serialize_payment)
+    payments, next_cursor = _paginate(q, keys, lambda p: (p.payment_date, p.id), nullable_first=True)
+    result = [serialize_payment(payment) for payment in payments]
+    return jsonify({'payments': result, 'next_cursor': next_cursor})
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
   except Exception as e:
     print(f"Payments error: {e}")
     return jsonify({'payments': []}), 500
-  finally:
-    session.close()
 
 
 @app.route('/api/payments', methods=['POST'])
@@ -1138,20 +1741,18 @@ def create_payment():
   if not rent_id or not account_id or amount is None or amount <= 0:
     return jsonify({'success': False, 'message': 'rent_id, account_id ve pozitif amount gerekli'}), 400
   
-  session = SessionLocal()
+  session = get_session()
   try:
-    rent = session.query(Rent).filter(Rent.id == rent_id).with_for_update().first()
-    account = session.query(Account).filter(Account.id == account_id, Account.is_active == True).with_for_update().first()
+    rent = _lock_rows(session, Rent, rent_id).get(int(rent_id))
+    account = session.query(Account).filter(Account.id == account_id, Account.is_active == True).first()
     
     if not rent:
-      session.close()
       return jsonify({'success': False, 'message': 'Aidat bulunamadı'}), 404
     if not account:
-      session.close()
       return jsonify({'success': False, 'message': 'Hesap bulunamadı'}), 404
     
     total = amount + (late_fee_amount or Decimal('0'))
-    _apply_balance(account, total)
+    _apply_balance(session, account, total)
     
     payment_date = None
     if data.get('payment_date'):
@@ -1177,6 +1778,7 @@ def create_payment():
     
     rent.status = 'PAID'
     rent.updated_at = datetime.utcnow()
+    _adjust_owner_balance(session, rent.owner_id, paid=amount, late_fees=late_fee_amount)
     
     tx = Transaction(
       account_id=account_id,
@@ -1187,31 +1789,14 @@ def create_payment():
       description=f'Aidat - {rent.month}/{rent.year}',
     )
     session.add(tx)
-    session.commit()
-    session.refresh(payment)
-    session.refresh(account)
+    session.flush()
+    rollups.record_payment(session, payment)
+    rollups.record_transaction(session, tx)
     
     owner = session.query(Owner).filter(Owner.id == rent.owner_id).first()
-    result = {
-      'id': payment.id,
-      'rent_id': payment.rent_id,
-      'owner_id': payment.owner_id,
-      'owner_name': owner.full_name if owner else None,
-      'account_id': payment.account_id,
-      'account_name': account.name,
-      'amount': float(payment.amount or 0),
-      'late_fee_amount': float(payment.late_fee_amount or 0) if payment.late_fee_amount else None,
-      'total_amount': float(total),
-      'payment_date': payment.payment_date.isoformat() if payment.payment_date else None,
-      'reference_number': payment.reference_number,
-      'is_cancelled': payment.is_cancelled,
-      'created_at': payment.created_at.isoformat() if payment.created_at else None,
-    }
-    session.close()
-    return jsonify({'success': True, 'payment': result, 'account': _json_account(account)}), 201
+    result = serialize_payment_detail(payment, owner.full_name if owner else None, account.name)
+    return jsonify({'success': True, 'payment': result, 'account': serialize_account(account)}), 201
   except Exception as e:
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
@@ -1219,27 +1804,32 @@ def create_payment():
 def cancel_payment(payment_id):
   data = request.json or {}
   print(f'[CANCEL_PAYMENT] Payment ID: {payment_id}, Data: {data}')
-  session = SessionLocal()
+  session = get_session()
   try:
-    payment = session.query(Payment).filter(Payment.id == payment_id).with_for_update().first()
+    # Kilit sırası aidat → ödeme: önce kilitsiz okuyup aidatı bul, sonra ikisini kilitle
+    payment = session.query(Payment).filter(Payment.id == payment_id).first()
     print(f'[CANCEL_PAYMENT] Found payment: {payment}')
     if not payment:
-      session.close()
       return jsonify({'success': False, 'message': 'Ödeme bulunamadı'}), 404
+    rent = _lock_rows(session, Rent, payment.rent_id).get(payment.rent_id)
+    _lock_rows(session, Payment, payment_id)
     
     if payment.is_cancelled:
-      session.close()
       return jsonify({'success': False, 'message': 'Ödeme zaten iptal'}), 400
     
-    account = session.query(Account).filter(Account.id == payment.account_id).with_for_update().first()
-    rent = session.query(Rent).filter(Rent.id == payment.rent_id).with_for_update().first()
+    tx = session.query(Transaction).filter(
+      Transaction.source == 'RENT', Transaction.related_id == payment.rent_id, Transaction.is_canceled == False,
+      _created_since(payment),
+    ).order_by(Transaction.id).populate_existing().with_for_update().first()
+    account = session.query(Account).filter(Account.id == payment.account_id).first()
     
     if not account or not rent:
-      session.close()
       return jsonify({'success': False, 'message': 'İlişkili veri bulunamadı'}), 404
     
-    total = _to_decimal(payment.amount or 0) + _to_decimal(payment.late_fee_amount or 0)
-    _apply_balance(account, -total)
+    # Kasa hareketi önceden iptal edildiyse (DELETE /api/transactions) tutar o sırada düşüldü
+    if tx:
+      total = _to_decimal(payment.amount or 0) + _to_decimal(payment.late_fee_amount or 0)
+      _apply_balance(session, account, -total)
     
     payment.is_cancelled = True
     payment.cancellation_date = datetime.utcnow()
@@ -1247,54 +1837,742 @@ def cancel_payment(payment_id):
     
     rent.status = 'UNPAID'
     rent.updated_at = datetime.utcnow()
+    _adjust_owner_balance(
+      session, payment.owner_id,
+      paid=-_to_decimal(payment.amount or 0), late_fees=-_to_decimal(payment.late_fee_amount or 0),
+    )
     
-    tx = session.query(Transaction).filter(
-      Transaction.source == 'RENT', Transaction.related_id == rent.id, Transaction.is_canceled == False
-    ).with_for_update().first()
+    rollups.record_payment(session, payment, sign=-1)
     if tx:
       tx.is_canceled = True
+      rollups.record_transaction(session, tx, sign=-1)
     
-    session.commit()
-    session.refresh(payment)
-    session.refresh(account)
+    session.flush()
     
     owner = session.query(Owner).filter(Owner.id == payment.owner_id).first()
-    result = {
-      'id': payment.id,
-      'rent_id': payment.rent_id,
-      'owner_id': payment.owner_id,
-      'owner_name': owner.full_name if owner else None,
-      'account_id': payment.account_id,
-      'account_name': account.name,
-      'amount': float(payment.amount or 0),
-      'late_fee_amount': float(payment.late_fee_amount or 0) if payment.late_fee_amount else None,
-      'total_amount': float(total),
-      'payment_date': payment.payment_date.isoformat() if payment.payment_date else None,
-      'reference_number': payment.reference_number,
-      'is_cancelled': payment.is_cancelled,
-      'cancellation_date': payment.cancellation_date.isoformat() if payment.cancellation_date else None,
-      'cancellation_reason': payment.cancellation_reason,
-      'created_at': payment.created_at.isoformat() if payment.created_at else None,
-    }
-    session.close()
-    return jsonify({'success': True, 'payment': result, 'account': _json_account(account)})
+    result = serialize_payment_detail(payment, owner.full_name if owner else None, account.name)
+    return jsonify({'success': True, 'payment': result, 'account': serialize_account(account)})
   except Exception as e:
     print(f'[CANCEL_PAYMENT] ERROR: {str(e)}')
-    session.rollback()
-    session.close()
     return jsonify({'success': False, 'message': str(e)}), 400
 
 
+# Banka ekstresi günlerinde tek istekte kaydedilebilecek en fazla ödeme
+MAX_BATCH_PAYMENTS = int(os.environ.get("MAX_BATCH_PAYMENTS", "500"))
+
+
+def _parse_batch_payment(item):
+  """Toplu ödeme kalemini doğrula; (değerler, hata mesajı) döner"""
+  if not isinstance(item, dict):
+    return None, 'Kalem bir nesne olmalı'
+  try:
+    rent_id = int(item.get('rent_id'))
+    account_id = int(item.get('account_id'))
+  except (TypeError, ValueError):
+    return None, 'rent_id ve account_id sayısal olmalı'
+  amount = _to_decimal(item.get('amount'))
+  late_fee_amount = _to_decimal(item.get('late_fee_amount') or 0)
+  if amount is None or amount <= 0:
+    return None, 'Pozitif amount gerekli'
+  if late_fee_amount is None or late_fee_amount < 0:
+    return None, 'late_fee_amount negatif olamaz'
+  payment_date = datetime.utcnow()
+  if item.get('payment_date'):
+    try:
+      payment_date = datetime.fromisoformat(str(item.get('payment_date')).replace('Z', '+00:00'))
+    except ValueError:
+      return None, 'Geçersiz payment_date'
+  return {
+    'rent_id': rent_id,
+    'account_id': account_id,
+    'amount': amount,
+    'late_fee_amount': late_fee_amount,
+    'payment_date': payment_date,
+    'reference_number': item.get('reference_number'),
+  }, None
+
+
+@app.route('/api/payments/batch', methods=['POST'])
+def create_payments_batch():
+  """Birden çok aidat ödemesini tek işlemde kaydet.
+
+  Gövde: {"payments": [{rent_id, account_id, amount, ...}], "mode": "all_or_nothing" | "best_effort"}.
+  Tüm kalemler önce doğrulanır; aidatlar, malikler ve hesaplar birer sorguyla
+  yüklenir. Her hesabın bakiyesi bir kez, toplam tutar kadar değiştirilir.
+  all_or_nothing (varsayılan) modunda tek hatalı kalem hiçbir şeyin
+  yazılmamasına yol açar; best_effort modunda hatalı kalemler atlanır.
+  Yanıttaki results listesi kalem sırasıyla her kalemin sonucunu verir.
+  """
+  data = request.json or {}
+  items = data.get('payments')
+  mode = data.get('mode') or 'all_or_nothing'
+  if mode not in ('all_or_nothing', 'best_effort'):
+    return jsonify({'success': False, 'message': 'mode all_or_nothing veya best_effort olmalı'}), 400
+  if not isinstance(items, list) or not items:
+    return jsonify({'success': False, 'message': 'payments listesi gerekli'}), 400
+  if len(items) > MAX_BATCH_PAYMENTS:
+    return jsonify({'success': False, 'message': f'En fazla {MAX_BATCH_PAYMENTS} ödeme gönderilebilir'}), 400
+
+  parsed = [_parse_batch_payment(item) for item in items]
+  errors = {index: message for index, (_, message) in enumerate(parsed) if message}
+
+  session = get_session()
+  try:
+    valid = [(index, values) for index, (values, _) in enumerate(parsed) if values]
+    # Kilit sırası: aidatlar (artan id), en sonda hesap bakiyeleri (_apply_balances)
+    rents = _lock_rows(session, Rent, *[values['rent_id'] for _, values in valid])
+    accounts = {
+      acc.id: acc for acc in session.query(Account).filter(
+        Account.id.in_({values['account_id'] for _, values in valid}), Account.is_active == True
+      )
+    }
+    owners = dict(session.query(Owner.id, Owner.full_name).filter(
+      Owner.id.in_({rent.owner_id for rent in rents.values()})
+    ).all())
+
+    seen_rents = set()
+    for index, values in valid:
+      if values['rent_id'] not in rents:
+        errors[index] = 'Aidat bulunamadı'
+      elif rents[values['rent_id']].status != 'UNPAID':
+        # Satır kilitli okundu: eşzamanlı bir ödeme burada görünür
+        errors[index] = 'Aidat zaten ödenmiş'
+      elif values['account_id'] not in accounts:
+        errors[index] = 'Hesap bulunamadı'
+      elif values['rent_id'] in seen_rents:
+        errors[index] = 'Aynı aidat bu istekte birden çok kez var'
+      seen_rents.add(values['rent_id'])
+
+    if errors and mode == 'all_or_nothing':
+      return jsonify({
+        'success': False,
+        'mode': mode,
+        'message': f'{len(errors)} kalem geçersiz, hiçbir ödeme kaydedilmedi',
+        'created': 0,
+        'failed': len(errors),
+        'results': [
+          {'index': index, 'success': False, 'message': errors[index]} if index in errors
+          else {'index': index, 'success': False, 'message': 'Diğer kalemler nedeniyle kaydedilmedi'}
+          for index in range(len(items))
+        ],
+      }), 400
+
+    accepted = [(index, values) for index, values in valid if index not in errors]
+    _apply_balances(session, [
+      (accounts[values['account_id']], values['amount'] + values['late_fee_amount'])
+      for _, values in accepted
+    ])
+
+    now = datetime.utcnow()
+    payments = {}
+    transactions = []
+    owner_deltas = {}
+    for index, values in accepted:
+      rent = rents[values['rent_id']]
+      payment = Payment(owner_id=rent.owner_id, is_cancelled=False, **values)
+      session.add(payment)
+      tx = Transaction(
+        account_id=values['account_id'],
+        type='INCOME',
+        source='RENT',
+        related_id=rent.id,
+        amount=values['amount'] + values['late_fee_amount'],
+        description=f'Aidat - {rent.month}/{rent.year}',
+      )
+      session.add(tx)
+      transactions.append(tx)
+      rent.status = 'PAID'
+      rent.updated_at = now
+      paid, late_fees = owner_deltas.get(rent.owner_id, (Decimal('0'), Decimal('0')))
+      owner_deltas[rent.owner_id] = (paid + values['amount'], late_fees + values['late_fee_amount'])
+      payments[index] = payment
+    upsert_increment_many(session, OwnerBalance, ['owner_id'], [
+      {'owner_id': owner_id, 'paid': paid, 'late_fees': late_fees}
+      for owner_id, (paid, late_fees) in sorted(owner_deltas.items())
+    ])
+    session.flush()
+    for payment in payments.values():
+      rollups.record_payment(session, payment)
+    for tx in transactions:
+      rollups.record_transaction(session, tx)
+
+    results = []
+    for index in range(len(items)):
+      if index in payments:
+        payment = payments[index]
+        results.append({
+          'index': index,
+          'success': True,
+          'payment': serialize_payment_detail(
+            payment, owners.get(payment.owner_id), accounts[payment.account_id].name
+          ),
+        })
+      else:
+        results.append({'index': index, 'success': False, 'message': errors[index]})
+    return jsonify({
+      'success': bool(payments),
+      'mode': mode,
+      'created': len(payments),
+      'failed': len(errors),
+      'results': results,
+      'accounts': [
+        serialize_account(accounts[account_id])
+        for account_id in sorted({values['account_id'] for _, values in accepted})
+      ],
+    }), 201 if payments else 400
+  except Exception as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+
+
+@app.route('/api/bank-import/match', methods=['POST'])
+def match_bank_statement():
+  """Banka ekstresini (CSV) ödenmemiş aidatlarla eşleştir; sonuç NDJSON olarak akar.
+
+  Dosya multipart 'file' alanında ya da ham gövde (text/csv) olarak gönderilir.
+  ?encoding= (varsayılan utf-8-sig; Türk bankaları için cp1254),
+  ?account_id= verilirse önerilen ödemelere eklenir. Her satır bir sonuçtur
+  (status: MATCHED / REVIEW / UNMATCHED / DUPLICATE / SKIPPED; eşleşenlerde
+  payment önerisi), son satır {"summary": ...}. Hiçbir şey yazılmaz; onaylanan
+  payment nesneleri POST /api/payments/batch ile kaydedilir.
+  """
+  encoding = request.args.get('encoding') or 'utf-8-sig'
+  try:
+    ''.encode(encoding)
+  except LookupError:
+    return jsonify({'success': False, 'message': 'Geçersiz encoding'}), 400
+  account_id = _int_arg('account_id')
+  upload = request.files.get('file')
+  raw = upload.stream if upload is not None else request.stream
+
+  def generate():
+    # Yanıt akarken istek oturumu kapanmış olur; eşleştirme kendi oturumunu kullanır
+    session = SessionLocal()
+    try:
+      index = bank_import.OpenRentIndex.load(session)
+      lines = io.TextIOWrapper(raw, encoding=encoding, errors='replace', newline='')
+      try:
+        for result in bank_import.match_statement(lines, index, session, account_id=account_id):
+          yield dumps(result) + b'\n'
+      except ValueError as e:
+        yield dumps({'error': str(e)}) + b'\n'
+    finally:
+      session.close()
+
+  return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# REPORTS API
+# Raporlar aylık özet tablolarını okur (rollups.py); ham hareket tabloları taranmaz.
+# Dönem: period_from / period_to ("YYYY-MM") ya da year (ve month) parametresi.
+MAX_CHART_MONTHS = 120
+
+
+def _month_label(key):
+  return f'{key // 100:04d}-{key % 100:02d}' if key else None
+
+
+def _month_arg(name):
+  value = request.args.get(name)
+  if not value:
+    return None
+  try:
+    year, month = (int(part) for part in value.split('-'))
+  except ValueError:
+    raise ValueError(f'Geçersiz {name} (YYYY-AA bekleniyor)')
+  if not 1 <= month <= 12:
+    raise ValueError(f'Geçersiz {name} (YYYY-AA bekleniyor)')
+  return year * 100 + month
+
+
+def _report_period():
+  """(başlangıç, bitiş) ay anahtarları (yıl * 100 + ay); verilmeyen uç None"""
+  start, end = _month_arg('period_from'), _month_arg('period_to')
+  year = _int_arg('year')
+  if year:
+    month = _int_arg('month')
+    if month and 1 <= month <= 12:
+      start = end = year * 100 + month
+    else:
+      start, end = year * 100 + 1, year * 100 + 12
+  return start, end
+
+
+def _month_key(model):
+  return model.year * 100 + model.month
+
+
+def _shift_month(key, months):
+  year, month = divmod(key // 100 * 12 + key % 100 - 1 + months, 12)
+  return year * 100 + month + 1
+
+
+def _period_json(start, end):
+  return {'from': _month_label(start), 'to': _month_label(end)}
+
+
+def _in_period(model, start, end):
+  # (yıl, ay) satır karşılaştırması dönem index'iyle aralık taraması olarak okunur
+  period = tuple_(model.year, model.month)
+  return and_(
+    period >= tuple_(start // 100, start % 100) if start else true(),
+    period <= tuple_(end // 100, end % 100) if end else true(),
+  )
+
+
+def _sum_if(condition, column):
+  return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def _owner_report_rows(session, start, end):
+  """Malik başına dönem içi tahakkuk/tahsilat ve dönem sonundaki toplam borç"""
+  in_period = _in_period(OwnerMonthlyTotal, start, end)
+  totals = (
+    session.query(
+      OwnerMonthlyTotal.owner_id,
+      _sum_if(in_period, OwnerMonthlyTotal.charged).label('charged'),
+      _sum_if(in_period, OwnerMonthlyTotal.paid).label('paid'),
+      _sum_if(in_period, OwnerMonthlyTotal.late_fees).label('late_fees'),
+      func.coalesce(func.sum(OwnerMonthlyTotal.charged - OwnerMonthlyTotal.paid), 0).label('debt'),
+    )
+    .filter(_in_period(OwnerMonthlyTotal, None, end))
+    .group_by(OwnerMonthlyTotal.owner_id)
+    .subquery()
+  )
+  return (
+    session.query(Owner, totals.c.charged, totals.c.paid, totals.c.late_fees, totals.c.debt)
+    .outerjoin(totals, totals.c.owner_id == Owner.id)
+    .filter(Owner.is_active == True)
+  )
+
+
+@app.route('/api/reports/balance', methods=['GET'])
+@conditional('account_monthly_totals', 'accounts')
+def report_balance():
+  """Hesap başına dönem açılış/kapanış bakiyesi ve dönem hareketleri.
+
+  Kapanış bakiyesi = güncel bakiye - dönemden sonraki net hareket; açılış =
+  kapanış - dönem içi net hareket. Hesap açılırken girilen bakiye böylece
+  hareket olmadan da doğru sayılır.
+  """
+  session = get_session()
+  try:
+    start, end = _report_period()
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+
+  fields = ('income', 'expense', 'transfer_in', 'transfer_out')
+  rows = session.query(AccountMonthlyTotal).filter(_in_period(AccountMonthlyTotal, start, None)).all()
+  period = defaultdict(lambda: dict.fromkeys(fields, Decimal('0')))
+  net_after = defaultdict(Decimal)
+  for row in rows:
+    net = _to_decimal(row.income) - _to_decimal(row.expense) + _to_decimal(row.transfer_in) - _to_decimal(row.transfer_out)
+    if end and row.year * 100 + row.month > end:
+      net_after[row.account_id] += net
+      continue
+    for field in fields:
+      period[row.account_id][field] += _to_decimal(getattr(row, field))
+
+  accounts = _with_live_balances(session, session.query(Account).order_by(Account.id).all())
+  result = []
+  totals = defaultdict(Decimal)
+  for acc in accounts:
+    flows = period[acc.id]
+    if not acc.is_active and not any(flows.values()):
+      continue
+    current = _to_decimal(acc.balance or 0)
+    net = flows['income'] - flows['expense'] + flows['transfer_in'] - flows['transfer_out']
+    closing = current - net_after[acc.id]
+    values = dict(flows, net=net, opening_balance=closing - net, closing_balance=closing, current_balance=current)
+    for name, value in values.items():
+      totals[name] += value
+    result.append({
+      'account_id': acc.id,
+      'name': acc.name,
+      'type': acc.type,
+      'is_active': acc.is_active,
+      **{name: float(value) for name, value in values.items()},
+    })
+  return jsonify({
+    'period': _period_json(start, end),
+    'accounts': result,
+    'totals': {name: float(value) for name, value in totals.items()},
+  })
+
+
+@app.route('/api/reports/debt', methods=['GET'])
+@conditional('owner_monthly_totals', 'owners')
+def report_debt():
+  """Dönem sonunda borcu olan malikler (tahakkuk - tahsilat), borca göre azalan"""
+  session = get_session()
+  try:
+    start, end = _report_period()
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+
+  owners = []
+  total_debt = Decimal('0')
+  for owner, charged, paid, late_fees, debt in _owner_report_rows(session, start, end):
+    debt = _to_decimal(debt or 0)
+    if debt <= 0:
+      continue
+    total_debt += debt
+    owners.append({
+      'owner_id': owner.id,
+      'full_name': owner.full_name,
+      'unit_name': owner.unit_name,
+      'tenant_name': owner.tenant_name,
+      'phone': owner.phone,
+      'period_charged': float(charged or 0),
+      'period_paid': float(paid or 0),
+      'debt': float(debt),
+    })
+  owners.sort(key=lambda row: row['debt'], reverse=True)
+  return jsonify({
+    'period': _period_json(start, end),
+    'owners': owners,
+    'total_debt': float(total_debt),
+    'debtor_count': len(owners),
+  })
+
+
+@app.route('/api/reports/apartment-list', methods=['GET'])
+@conditional('owner_monthly_totals', 'owners')
+def report_apartment_list():
+  """Aktif daireler: malik/kiracı bilgisi, dönem tahakkuk/tahsilatı ve dönem sonu borcu"""
+  session = get_session()
+  try:
+    start, end = _report_period()
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+
+  apartments = [{
+    'owner_id': owner.id,
+    'unit_name': owner.unit_name,
+    'unit_type': owner.unit_type,
+    'share_ratio': owner.share_ratio,
+    'full_name': owner.full_name,
+    'phone': owner.phone,
+    'tenant_name': owner.tenant_name,
+    'charged': float(charged or 0),
+    'paid': float(paid or 0),
+    'late_fees': float(late_fees or 0),
+    'debt': float(debt or 0),
+  } for owner, charged, paid, late_fees, debt in _owner_report_rows(session, start, end)]
+  apartments.sort(key=lambda row: (row['unit_name'] or '', row['owner_id']))
+  return jsonify({'period': _period_json(start, end), 'apartments': apartments})
+
+
+@app.route('/api/reports/summary', methods=['GET'])
+@conditional('account_monthly_totals', 'category_monthly_totals', 'owner_monthly_totals', 'accounts', 'categories')
+def report_summary():
+  """Dönem özeti: gelir/gider, tahakkuk/tahsilat, toplam borç ve bakiye, en büyük gider kategorileri"""
+  session = get_session()
+  try:
+    start, end = _report_period()
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+
+  income, expense, tx_count = session.query(
+    func.coalesce(func.sum(AccountMonthlyTotal.income), 0),
+    func.coalesce(func.sum(AccountMonthlyTotal.expense), 0),
+    func.coalesce(func.sum(AccountMonthlyTotal.tx_count), 0),
+  ).filter(_in_period(AccountMonthlyTotal, start, end)).one()
+  in_period = _in_period(OwnerMonthlyTotal, start, end)
+  charged, collected, late_fees, debt = session.query(
+    _sum_if(in_period, OwnerMonthlyTotal.charged),
+    _sum_if(in_period, OwnerMonthlyTotal.paid),
+    _sum_if(in_period, OwnerMonthlyTotal.late_fees),
+    func.coalesce(func.sum(OwnerMonthlyTotal.charged - OwnerMonthlyTotal.paid), 0),
+  ).filter(_in_period(OwnerMonthlyTotal, None, end)).one()
+  categories = session.query(
+    Category.id, Category.name, func.sum(CategoryMonthlyTotal.amount).label('amount'),
+  ).join(Category, Category.id == CategoryMonthlyTotal.category_id).filter(
+    _in_period(CategoryMonthlyTotal, start, end)
+  ).group_by(Category.id, Category.name).having(func.sum(CategoryMonthlyTotal.amount) != 0).order_by(
+    func.sum(CategoryMonthlyTotal.amount).desc()
+  ).limit(5).all()
+  accounts = _with_live_balances(session, session.query(Account).filter(Account.is_active == True).all())
+
+  charged, collected = _to_decimal(charged), _to_decimal(collected)
+  return jsonify({
+    'period': _period_json(start, end),
+    'income': float(income),
+    'expense': float(expense),
+    'net': float(_to_decimal(income) - _to_decimal(expense)),
+    'transaction_count': int(tx_count),
+    'charged': float(charged),
+    'collected': float(collected),
+    'late_fees': float(late_fees),
+    'collection_rate': round(float(collected / charged), 4) if charged else None,
+    'total_debt': float(debt),
+    'total_balance': float(sum((_to_decimal(acc.balance or 0) for acc in accounts), Decimal('0'))),
+    'top_expense_categories': [
+      {'category_id': category_id, 'name': name, 'amount': float(amount)}
+      for category_id, name, amount in categories
+      if amount
+    ],
+  })
+
+
+@app.route('/api/reports/chart', methods=['GET'])
+@conditional('account_monthly_totals', 'category_monthly_totals', 'owner_monthly_totals', 'categories')
+def report_chart():
+  """Aylık seriler (gelir, gider, tahakkuk, tahsilat) ve kategori dağılımı; varsayılan son 12 ay"""
+  session = get_session()
+  try:
+    start, end = _report_period()
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+  if start is None and end is None:
+    now = datetime.utcnow()
+    end = now.year * 100 + now.month
+    start = _shift_month(end, -11)
+  elif start is None or end is None:
+    return jsonify({'success': False, 'message': 'period_from ve period_to birlikte verilmeli'}), 400
+
+  months = []
+  key = start
+  while key <= end and len(months) < MAX_CHART_MONTHS:
+    months.append(key)
+    key = _shift_month(key, 1)
+  series = {name: dict.fromkeys(months, Decimal('0')) for name in ('income', 'expense', 'charged', 'collected')}
+
+  for year, month, income, expense in session.query(
+    AccountMonthlyTotal.year, AccountMonthlyTotal.month,
+    func.sum(AccountMonthlyTotal.income), func.sum(AccountMonthlyTotal.expense),
+  ).filter(_in_period(AccountMonthlyTotal, start, end)).group_by(AccountMonthlyTotal.year, AccountMonthlyTotal.month):
+    if year * 100 + month in series['income']:
+      series['income'][year * 100 + month] = _to_decimal(income)
+      series['expense'][year * 100 + month] = _to_decimal(expense)
+  for year, month, charged, paid in session.query(
+    OwnerMonthlyTotal.year, OwnerMonthlyTotal.month,
+    func.sum(OwnerMonthlyTotal.charged), func.sum(OwnerMonthlyTotal.paid),
+  ).filter(_in_period(OwnerMonthlyTotal, start, end)).group_by(OwnerMonthlyTotal.year, OwnerMonthlyTotal.month):
+    if year * 100 + month in series['charged']:
+      series['charged'][year * 100 + month] = _to_decimal(charged)
+      series['collected'][year * 100 + month] = _to_decimal(paid)
+  categories = session.query(
+    Category.id, Category.name, func.sum(CategoryMonthlyTotal.amount),
+  ).join(Category, Category.id == CategoryMonthlyTotal.category_id).filter(
+    _in_period(CategoryMonthlyTotal, start, end)
+  ).group_by(Category.id, Category.name).order_by(func.sum(CategoryMonthlyTotal.amount).desc()).all()
+
+  return jsonify({
+    'period': _period_json(start, end),
+    'labels': [_month_label(key) for key in months],
+    **{name: [float(values[key]) for key in months] for name, values in series.items()},
+    'categories': [
+      {'category_id': category_id, 'name': name, 'amount': float(amount)}
+      for category_id, name, amount in categories
+      if amount
+    ],
+  })
+
+
+# YEAR-END API
+# Kapanış ve yıl özeti yearend.py'de; kapalı yılın özeti kapanıştaki anlık görüntüden okunur
+def _year_summary_json(session, summary):
+  names = dict(session.query(Account.id, Account.name))
+  closed = summary['closed']
+  return {
+    'year': summary['year'],
+    'closed': closed,
+    'closed_at': summary['closed_at'].isoformat() if closed and summary['closed_at'] else None,
+    'total_income': float(summary['total_income']),
+    'total_expense': float(summary['total_expense']),
+    'net_balance': float(_to_decimal(summary['total_income']) - _to_decimal(summary['total_expense'])),
+    'charged': float(summary['charged']),
+    'paid_rents': float(summary['paid_rents']),
+    'late_fees': float(summary['late_fees']),
+    'unpaid_rents': float(summary['unpaid_rents']),
+    'unpaid_count': summary['unpaid_count'],
+    'total_balance': float(summary['total_balance']),
+    'total_debt': float(summary['total_debt']),
+    'accounts': [
+      {'account_id': account_id, 'name': names.get(account_id), 'balance': float(balance)}
+      for account_id, balance in sorted(summary['account_balances'].items())
+    ],
+    'archived': {
+      name: summary[f'archived_{name}'] for name in yearend.ARCHIVE_ORDER
+    } if closed else None,
+  }
+
+
+@app.route('/api/year-end/summary/<int:year>', methods=['GET'])
+@conditional('closed_years', 'account_opening_balances', 'account_monthly_totals', 'owner_monthly_totals', 'rents', 'accounts')
+def year_end_summary(year):
+  """Yıl özeti: kapalı yıl için kapanış anlık görüntüsü, açık yıl için güncel toplamlar"""
+  session = get_session()
+  return jsonify(_year_summary_json(session, yearend.year_summary(session, year)))
+
+
+@app.route('/api/year-end/close', methods=['POST'])
+def close_year():
+  """Yılı (ve kapatılmamış önceki yılları) kapat: özet, arşivleme, açılış bakiyeleri"""
+  data = request.json or {}
+  try:
+    year = int(data.get('year'))
+  except (TypeError, ValueError):
+    return jsonify({'success': False, 'message': 'year gerekli'}), 400
+  session = get_session()
+  try:
+    closed = yearend.close_year(session, year)
+  except yearend.YearAlreadyClosed as e:
+    return jsonify({'success': False, 'message': str(e)}), 409
+  except ValueError as e:
+    return jsonify({'success': False, 'message': str(e)}), 400
+  return jsonify({
+    'success': True,
+    'message': f'{year} yılı kapatıldı',
+    'closed_years': [row.year for row in closed],
+    'archived': {name: sum(getattr(row, f'archived_{name}') for row in closed) for name in yearend.ARCHIVE_ORDER},
+    'summary': _year_summary_json(session, yearend.year_summary(session, year)),
+  })
+
+
+# SYNC API
+def _parse_watermark(value):
+  since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+  if since.tzinfo is not None:
+    since = since.astimezone(timezone.utc).replace(tzinfo=None)
+  return since
+
+
+@app.route('/api/sync', methods=['GET'])
+def sync_changes():
+  """since watermark'ından sonra değişen satırları ve tombstone'ları döndür.
+
+  since verilmezse tam anlık görüntü döner. Yanıttaki watermark bir sonraki
+  istekte since olarak gönderilir; SYNC_OVERLAP_SECONDS kadar örtüşme nedeniyle
+  bazı satırlar tekrar gelebilir.
+  """
+  since = None
+  if request.args.get('since'):
+    try:
+      since = _parse_watermark(request.args.get('since')) - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+    except ValueError:
+      return jsonify({'success': False, 'message': 'Geçersiz since değeri'}), 400
+
+  watermark = datetime.utcnow()
+  session = get_session()
+
+  def changed(q, *models):
+    if since is None:
+      return q
+    return q.filter(or_(*[model.updated_at >= since for model in models]))
+
+  owners = changed(_owner_totals_query(session), Owner, OwnerBalance).all()
+  rents = changed(
+    session.query(Rent, Owner.full_name).outerjoin(Owner, Owner.id == Rent.owner_id), Rent
+  ).all()
+  payments = changed(session.query(Payment), Payment).all()
+  accounts_q = session.query(Account)
+  if LEDGER_MODE and since is not None:
+    # Defter modunda bakiye değişikliği accounts.updated_at'i değiştirmez
+    accounts_q = accounts_q.filter(or_(
+      Account.updated_at >= since,
+      Account.id.in_(select(AccountLedger.account_id).where(AccountLedger.created_at >= since)),
+    ))
+  else:
+    accounts_q = changed(accounts_q, Account)
+  accounts = _with_live_balances(session, accounts_q.all())
+  transactions = changed(session.query(Transaction), Transaction).all()
+  expenses = changed(
+    session.query(Expense, Account, Category)
+    .join(Account, Expense.account_id == Account.id)
+    .join(Category, Expense.category_id == Category.id),
+    Expense,
+  ).all()
+  categories = changed(session.query(Category), Category).all()
+
+  deleted = {name: [] for name in ('owners', 'rents', 'payments', 'accounts', 'transactions', 'expenses', 'categories')}
+  deleted['owners'] = [o.id for o, _, _ in owners if not o.is_active]
+  deleted['payments'] = [p.id for p in payments if p.is_cancelled]
+  deleted['accounts'] = [a.id for a in accounts if not a.is_active]
+  deleted['transactions'] = [t.id for t in transactions if t.is_canceled]
+  deleted['categories'] = [c.id for c in categories if not c.is_active]
+  if since is not None:
+    for entity, entity_id in session.query(DeletedRecord.entity, DeletedRecord.entity_id).filter(
+      DeletedRecord.deleted_at >= since
+    ):
+      deleted.setdefault(entity, []).append(entity_id)
+
+  return jsonify({
+    'watermark': watermark.isoformat(),
+    'full': since is None,
+    'owners': [serialize_owner(o, total_rent, total_paid) for o, total_rent, total_paid in owners],
+    'rents': [serialize_rent(rent, owner_name) for rent, owner_name in rents],
+    'payments': [serialize_payment(p) for p in payments],
+    'accounts': [serialize_account(a) for a in accounts],
+    'transactions': [serialize_transaction(t) for t in transactions],
+    'expenses': [serialize_expense(exp, cat, acc) for exp, acc, cat in expenses],
+    'categories': [dict(serialize_category(c), is_active=c.is_active) for c in categories],
+    'deleted': deleted,
+  })
+
+
+# RECONCILIATION API
+# Hesap bakiyelerinin hareketlerle mutabakatı reconcile.py'de; sonuçlar account_reconciliations'ta
+def _reconciliation_json(result):
+  return {
+    'account_id': result['account_id'],
+    'name': result['name'],
+    'is_active': result['is_active'],
+    'expected_balance': float(result['expected_balance']),
+    'actual_balance': float(result['actual_balance']),
+    'drift': float(result['drift']),
+    'suspect_transaction_ids': result['suspect_transaction_ids'],
+    'last_transaction_id': result['last_transaction_id'],
+    'opening_year': result['opening_year'],
+    'mode': result['mode'],
+    'reason': result['reason'],
+    'checked_at': result['checked_at'].isoformat() if result['checked_at'] else None,
+  }
+
+
+def _reconciliation_response(results):
+  return {
+    'success': True,
+    'drifted': sum(1 for result in results if result['drift']),
+    'accounts': [_reconciliation_json(result) for result in results],
+  }
+
+
+@app.route('/api/admin/reconcile', methods=['GET'])
+@conditional('account_reconciliations', 'accounts')
+def last_reconciliation():
+  """Son mutabakat sonuçları (hesap başına beklenen/gerçek bakiye ve fark)"""
+  session = get_session()
+  return jsonify(_reconciliation_response(reconcile.latest(session)))
+
+
+@app.route('/api/admin/reconcile', methods=['POST'])
+def run_reconciliation():
+  """Hesapları mutabakat et: kontrol noktasından itibaren (full=true: baştan) tara"""
+  data = request.json or {}
+  try:
+    account_ids = [int(account_id) for account_id in data['account_ids']] if data.get('account_ids') else None
+  except (TypeError, ValueError):
+    return jsonify({'success': False, 'message': 'account_ids sayısal olmalı'}), 400
+  return jsonify(_reconciliation_response(reconcile.run(account_ids, full=bool(data.get('full')))))
+
+
 @app.route('/api/health', methods=['GET'])
 def health():
   return jsonify({'status': 'ok'})
 
+
+@app.route('/api/health/db', methods=['GET'])
+def health_db():
+  """Bağlantı havuzu doluluğu ve checkout bekleme süreleri (izleme için)"""
+  return jsonify(pool_stats())
+
 # SETTINGS API
 @app.route('/api/settings', methods=['GET'])
+@conditional('settings')
 def get_settings():
-  session = SessionLocal()
+  session = get_session()
   settings = session.query(Settings).first()
-  session.close()
   
   if not settings:
     return jsonify({
@@ -1334,7 +2612,7 @@ def get_settings():
 @app.route('/api/settings', methods=['POST', 'PUT'])
 def save_settings():
   data = request.json or {}
-  session = SessionLocal()
+  session = get_session()
   
   settings = session.query(Settings).first()
   if not settings:
@@ -1355,26 +2633,18 @@ def save_settings():
   settings.apply_late_fee = data.get('apply_late_fee', False)
   settings.late_fee_rate = data.get('late_fee_rate', 0.0)
   
-  session.commit()
-  session.close()
+  session.flush()
   
   return jsonify({'success': True, 'message': 'Ayarlar kaydedildi'}), 200
 
 # CATEGORIES API
 @app.route('/api/categories', methods=['GET'])
+@conditional('categories')
 def get_categories():
-  session = SessionLocal()
+  session = get_session()
   categories = session.query(Category).filter_by(is_active=True).all()
-  session.close()
-  
-  result = []
-  for cat in categories:
-    result.append({
-      'id': cat.id,
-      'name': cat.name,
-      'category_type': cat.category_type,
-    })
   
+  result = [serialize_category(cat) for cat in categories]
   return jsonify(result), 200
 
 @app.route('/api/categories', methods=['POST'])
@@ -1386,32 +2656,25 @@ def create_category():
   if not name or not category_type:
     return jsonify({'success': False, 'message': 'Kategori adı ve tipi gerekli'}), 400
   
-  session = SessionLocal()
+  session = get_session()
   category = Category(name=name, category_type=category_type)
   session.add(category)
-  session.commit()
+  session.flush()
   
-  result = {
-    'id': category.id,
-    'name': category.name,
-    'category_type': category.category_type,
-  }
-  session.close()
+  result = serialize_category(category)
   
   return jsonify(result), 201
 
 @app.route('/api/categories/<int:category_id>', methods=['DELETE'])
 def delete_category(category_id):
-  session = SessionLocal()
+  session = get_session()
   category = session.query(Category).filter_by(id=category_id).first()
   
   if not category:
-    session.close()
     return jsonify({'success': False, 'message': 'Kategori bulunamadı'}), 404
   
   category.is_active = False
-  session.commit()
-  session.close()
+  session.flush()
   
   return jsonify({'success': True, 'message': 'Kategori silindi'}), 200
 
@@ -1529,23 +2792,174 @@ def backup_database():
     return jsonify({'success': False, 'message': f'Yedekleme hatası: {str(e)}'}), 500
 
 
-# ==================== WEBSOCKET EVENTS ====================
-# WebSocket desteği şu anda devre dışı (gelecekte yapılacak)
-# @socketio.on('connect')
-# def handle_connect():
-#   print(f'Client connected')
-#   emit('connection_response', {'data': 'Connected to server'})
+@app.cli.command('rebuild-owner-balances')
+def rebuild_owner_balances_command():
+  """owner_balances tablosunu rents/payments tablolarından yeniden oluştur"""
+  session = SessionLocal()
+  try:
+    count = rebuild_owner_balances(session)
+    session.commit()
+    print(f"✅ {count} malik bakiyesi yeniden oluşturuldu")
+  except Exception:
+    session.rollback()
+    raise
+  finally:
+    session.close()
+
+
+@app.cli.command('rebuild-rollups')
+@click.argument('names', nargs=-1, type=click.Choice(sorted(rollups.ROLLUPS)))
+def rebuild_rollups_command(names):
+  """Rapor özetlerini (account / category / owner; varsayılan hepsi) ham tablolardan yeniden üret"""
+  session = SessionLocal()
+  try:
+    counts = rollups.rebuild(session, names or None)
+    session.commit()
+    for name, count in counts.items():
+      print(f"✅ {name}: {count} aylık özet satırı yeniden oluşturuldu")
+  except Exception:
+    session.rollback()
+    raise
+  finally:
+    session.close()
+
 
-# @socketio.on('disconnect')
-# def handle_disconnect():
-#   print(f'Client disconnected')
+@app.cli.command('check-rollups')
+@click.argument('names', nargs=-1, type=click.Choice(sorted(rollups.ROLLUPS)))
+@click.option('--limit', default=20, show_default=True, help='Özet başına gösterilecek en fazla fark')
+def check_rollups_command(names, limit):
+  """Rapor özetlerini ham tablolarla karşılaştır; fark varsa çıkış kodu 1"""
+  session = SessionLocal()
+  try:
+    drift = rollups.check(session, names or None)
+  finally:
+    session.close()
+  for name, differences in drift.items():
+    if not differences:
+      print(f"✅ {name}: tutarlı")
+      continue
+    print(f"❌ {name}: {len(differences)} farklı satır")
+    for difference in differences[:limit]:
+      print(f"   {difference}")
+  if any(drift.values()):
+    print("Düzeltmek için: flask rebuild-rollups")
+    raise SystemExit(1)
+
+
+@app.cli.command('close-year')
+@click.argument('year', type=int)
+def close_year_command(year):
+  """Yılı kapat: özet anlık görüntüsü, arşive taşıma ve açılış bakiyeleri"""
+  session = SessionLocal()
+  try:
+    closed = [
+      (row.year, ', '.join(f'{name} {getattr(row, f"archived_{name}")}' for name in yearend.ARCHIVE_ORDER))
+      for row in yearend.close_year(session, year)
+    ]
+    session.commit()
+  except (ValueError, yearend.YearAlreadyClosed) as e:
+    session.rollback()
+    raise click.ClickException(str(e))
+  finally:
+    session.close()
+  for closed_year, archived in closed:
+    print(f"✅ {closed_year} kapatıldı (arşive taşınan: {archived})")
+
+
+@app.cli.command('ensure-partitions')
+def ensure_partitions_command():
+  """Bu yılın ve gelecek yılın transactions/payments partition'larını oluştur (DB_PARTITIONING)"""
+  if partitioning.default_engine.dialect.name != 'postgresql':
+    raise click.ClickException('Partition modu yalnızca PostgreSQL için')
+  if not partitioning.DB_PARTITIONING:
+    # Düz tabloları dönüştürmek açık bir tercih olmalı; setup() dönüşümü de yapar
+    raise click.ClickException('DB_PARTITIONING=true değil; tablolar dönüştürülmedi')
+  created = partitioning.setup()
+  print(f"✅ Oluşturulan: {', '.join(created)}" if created else "✅ Partition'lar güncel")
+
+
+@app.cli.command('reconcile-accounts')
+@click.argument('account_ids', nargs=-1, type=int)
+@click.option('--full', is_flag=True, help='Kontrol noktalarını yok say, tüm hareketleri tara')
+@click.option('--workers', default=reconcile.RECONCILE_WORKERS, show_default=True, help='Paralel hesap sayısı')
+def reconcile_accounts_command(account_ids, full, workers):
+  """Hesap bakiyelerini hareketlerden yeniden türet; fark varsa çıkış kodu 1"""
+  results = reconcile.run(list(account_ids) or None, full=full, workers=workers)
+  for result in results:
+    mode = f"{result['mode'].lower()}{', ' + result['reason'] if result['reason'] else ''}"
+    if not result['drift']:
+      print(f"✅ {result['account_id']} {result['name']}: {result['actual_balance']} ({mode})")
+      continue
+    print(
+      f"❌ {result['account_id']} {result['name']}: bakiye {result['actual_balance']}, "
+      f"hareketlerden {result['expected_balance']}, fark {result['drift']} ({mode})"
+    )
+    if result['suspect_transaction_ids']:
+      print(f"   şüpheli hareketler: {', '.join(map(str, result['suspect_transaction_ids']))}")
+  if any(result['drift'] for result in results):
+    raise SystemExit(1)
+
+
+@app.cli.command('fold-ledger')
+def fold_ledger_command():
+  """account_ledger'daki katlanmamış hareketleri hesap bakiyelerine kat"""
+  total = 0
+  while True:
+    count = fold_ledger()
+    total += count
+    if count < LEDGER_FOLD_BATCH:
+      break
+  print(f"✅ {total} defter satırı katlandı")
+
+
+# ==================== DEĞİŞİKLİK OLAYLARI (SSE) ====================
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+  """Commit edilen yazmaları Server-Sent Events olarak it.
+
+  Her olay: id = outbox sırası, data = {"entity", "id", "op", "version"}.
+  Yeniden bağlanırken Last-Event-ID gönderilirse kaçırılan olaylar tekrar
+  gönderilir; tampon yetmezse "reset" olayı gelir ve istemci /api/sync ile
+  eşitlenir. Bağlantı EVENTS_MAX_STREAM_SECONDS sonra kapanır (worker
+  thread'i serbest kalır, istemci otomatik yeniden bağlanır). Süreçte
+  EVENTS_MAX_SUBSCRIBERS akış açıksa 503 döner; istemci Retry-After /
+  retry: kadar bekleyip yeniden dener.
+  """
+  last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+  try:
+    last_event_id = int(last_event_id) if last_event_id else None
+  except ValueError:
+    last_event_id = None
+  subscriber = broadcaster.subscribe(last_event_id, limit=EVENTS_MAX_SUBSCRIBERS)
+  if subscriber is None:
+    return Response(f'retry: {EVENTS_BUSY_RETRY_MS}\n\n', status=503, mimetype='text/event-stream', headers={
+      'Retry-After': str(EVENTS_BUSY_RETRY_MS // 1000),
+      'Cache-Control': 'no-cache',
+    })
+
+  def generate():
+    try:
+      yield f'retry: {EVENTS_RETRY_MS}\n\n'
+      deadline = time.monotonic() + EVENTS_MAX_STREAM_SECONDS
+      while time.monotonic() < deadline:
+        try:
+          item = subscriber.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+        except queue.Empty:
+          yield ': ping\n\n'
+          continue
+        if item is RESET:
+          yield 'event: reset\ndata: {}\n\n'
+          return
+        data = {k: v for k, v in item.items() if k != 'event_id'}
+        yield f"id: {item['event_id']}\nevent: change\ndata: {dumps(data).decode()}\n\n"
+    finally:
+      broadcaster.unsubscribe(subscriber)
+
+  return Response(generate(), mimetype='text/event-stream', headers={
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # reverse proxy tamponlamasın
+  })
 
-# def broadcast_data_update(event_type, data):
-#   socketio.emit('data_update', {
-#     'event': event_type,
-#     'data': data,
-#     'timestamp': datetime.utcnow().isoformat()
-#   }, broadcast=True)
 
 if __name__ == '__main__':
   try:
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""Banka ekstresi içe aktarma: CSV satırlarını ödenmemiş aidatlarla eşleştir
+
+Ekstre akış olarak okunur (csv.reader satır satır); bellek kullanımı dosya
+boyutundan bağımsızdır, yalnızca açık aidat index'i kadardır (önerilen aidat
+kümesi de en fazla açık aidat sayısına ulaşır). Her satır açıklamasındaki
+daire adı ve malik/kiracı adı ile tutarına göre puanlanır.
+Metinler Türkçe karakterlerden arındırılıp küçük harfe çevrilerek
+karşılaştırılır ("İŞ BANKASI" == "is bankasi"). Sonuç gözden geçirilecek bir
+eşleşme listesidir; onaylanan öneriler POST /api/payments/batch ile kaydedilir.
+"""
+import csv
+import re
+from collections import Counter, defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import combinations
+
+from database import Owner, Payment, Rent
+
+# Aynı referans numarasıyla kayıtlı ödeme var mı sorgusu bu kadar satırda bir yapılır
+IMPORT_CHUNK_SIZE = 500
+
+# Durumlar: MATCHED (tutar + daire/isim tuttu), REVIEW (kontrol edilmeli),
+# UNMATCHED, DUPLICATE (referans zaten kayıtlı), SKIPPED (çıkış / geçersiz satır)
+MATCH_SCORE = 5
+REVIEW_SCORE = 3
+
+_TURKISH_FOLD = str.maketrans({
+  "ç": "c", "Ç": "c", "ğ": "g", "Ğ": "g", "ı": "i", "I": "i", "İ": "i",
+  "ö": "o", "Ö": "o", "ş": "s", "Ş": "s", "ü": "u", "Ü": "u",
+  "â": "a", "Â": "a", "î": "i", "Î": "i", "û": "u", "Û": "u",
+})
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+HEADER_ALIASES = {
+  "date": {"tarih", "islem tarihi", "valor", "date", "value date", "transaction date"},
+  "description": {"aciklama", "islem aciklamasi", "description", "details", "explanation"},
+  "amount": {"tutar", "islem tutari", "amount"},
+  "credit": {"alacak", "gelen", "credit"},
+  "debit": {"borc", "giden", "debit"},
+  "reference": {"referans", "referans no", "dekont no", "islem no", "fis no", "reference", "ref"},
+}
+_DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d.%m.%y")
+
+
+def normalize(text):
+  """Türkçe karakter ve büyük/küçük harf duyarsız, yalnızca harf/rakam ve tek boşluk"""
+  if not text:
+    return ""
+  # Önce çeviri: str.lower() "I"yı "i", "İ"yi "i̇" yapar
+  text = str(text).translate(_TURKISH_FOLD).lower()
+  return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def unit_key(text):
+  """Daire adının boşluksuz anahtarı: "A Blok - 12" → "ablok12" """
+  return normalize(text).replace(" ", "")
+
+
+def parse_amount(value):
+  """"1.234,56", "1,234.56", "1234,5 TL" → Decimal; okunamazsa None"""
+  text = re.sub(r"[^0-9,.\-+]", "", str(value or ""))
+  if not text:
+    return None
+  if "," in text and "." in text:
+    # Son görülen ayraç ondalıktır
+    if text.rfind(",") > text.rfind("."):
+      text = text.replace(".", "").replace(",", ".")
+    else:
+      text = text.replace(",", "")
+  elif "," in text:
+    text = text.replace(",", ".")
+  try:
+    return Decimal(text).quantize(Decimal("0.01"))
+  except InvalidOperation:
+    return None
+
+
+def parse_date(value):
+  text = str(value or "").strip()[:10]
+  for fmt in _DATE_FORMATS:
+    try:
+      return datetime.strptime(text, fmt)
+    except ValueError:
+      continue
+  return None
+
+
+def _sniff_delimiter(line):
+  return max((";", ",", "\t", "|"), key=line.count)
+
+
+def _map_columns(header):
+  columns = {}
+  for index, name in enumerate(header):
+    name = normalize(name)
+    for field, aliases in HEADER_ALIASES.items():
+      if name in aliases and field not in columns:
+        columns[field] = index
+  if "description" not in columns or not ({"amount", "credit"} & columns.keys()):
+    raise ValueError("Başlık satırında açıklama ve tutar/alacak kolonları bulunamadı")
+  return columns
+
+
+def read_statement(lines):
+  """Metin satırları üzerinden ekstreyi akış olarak oku.
+
+  İlk boş olmayan satır başlıktır; ayraç (; , sekme |) ondan tahmin edilir.
+  Her satır için (satır no, tarih, açıklama, tutar, referans) üretir. Çıkış
+  hareketlerinde tutar negatiftir.
+  """
+  lines = iter(lines)
+  header_line = ""
+  line_no = 0
+  for header_line in lines:
+    line_no += 1
+    if header_line.strip():
+      break
+  delimiter = _sniff_delimiter(header_line)
+  columns = _map_columns(next(csv.reader([header_line], delimiter=delimiter)))
+
+  def cell(row, field):
+    index = columns.get(field)
+    return row[index].strip() if index is not None and index < len(row) else ""
+
+  for row in csv.reader(lines, delimiter=delimiter):
+    line_no += 1
+    if not any(value.strip() for value in row):
+      continue
+    if "amount" in columns:
+      amount = parse_amount(cell(row, "amount"))
+    else:
+      credit = parse_amount(cell(row, "credit"))
+      debit = parse_amount(cell(row, "debit"))
+      amount = credit if credit else (-abs(debit) if debit else None)
+    yield line_no, parse_date(cell(row, "date")), cell(row, "description"), amount, cell(row, "reference") or None
+
+
+class OpenRentIndex:
+  """Ödenmemiş aidatların bellek içi index'i: daire anahtarı, isim kelimesi ve tutar"""
+
+  def __init__(self):
+    self.by_unit = defaultdict(set)  # daire anahtarı → malik id'leri
+    self.by_name_pair = defaultdict(set)  # isimdeki iki kelime (sıralı çift) → malik id'leri
+    self.by_amount = defaultdict(set)  # tutar → malik id'leri
+    self.owners = {}  # malik id → (ad, daire, isim kelime kümeleri)
+    self.rents = defaultdict(list)  # malik id → [(yıl, ay, rent id, tutar, gecikme)], eskiden yeniye
+    self.claimed = set()  # bu içe aktarmada önerilen aidatlar
+    self.max_unit_tokens = 1
+
+  @classmethod
+  def load(cls, session, batch_size=2000):
+    index = cls()
+    rows = (
+      session.query(
+        Rent.id, Rent.owner_id, Rent.year, Rent.month, Rent.amount, Rent.late_fee,
+        Owner.full_name, Owner.tenant_name, Owner.unit_name,
+      )
+      .join(Owner, Owner.id == Rent.owner_id)
+      .filter(Rent.status == "UNPAID", Owner.is_active == True)
+      .order_by(Rent.owner_id, Rent.year, Rent.month)
+      .yield_per(batch_size)
+    )
+    for rent_id, owner_id, year, month, amount, late_fee, full_name, tenant_name, unit_name in rows:
+      if owner_id not in index.owners:
+        index._add_owner(owner_id, full_name, tenant_name, unit_name)
+      amount = Decimal(str(amount or 0)).quantize(Decimal("0.01"))
+      late_fee = Decimal(str(late_fee or 0)).quantize(Decimal("0.01"))
+      index.rents[owner_id].append((year, month, rent_id, amount, late_fee))
+      index.by_amount[amount].add(owner_id)
+      if late_fee:
+        index.by_amount[amount + late_fee].add(owner_id)
+    return index
+
+  def _add_owner(self, owner_id, full_name, tenant_name, unit_name):
+    names = [frozenset(t for t in normalize(name).split() if len(t) > 1) for name in (full_name, tenant_name) if name]
+    names = [tokens for tokens in names if tokens]
+    for tokens in names:
+      # Tek kelime (ör. "mehmet") binlerce malike uyar; aday üretimi kelime çiftleriyle yapılır
+      for pair in combinations(sorted(tokens), 2):
+        self.by_name_pair[pair].add(owner_id)
+    key = unit_key(unit_name)
+    if key:
+      self.by_unit[key].add(owner_id)
+      self.max_unit_tokens = max(self.max_unit_tokens, len(normalize(unit_name).split()))
+    self.owners[owner_id] = (full_name, unit_name, names)
+
+  @property
+  def open_rent_count(self):
+    return sum(len(rents) for rents in self.rents.values())
+
+  def match(self, description, amount):
+    """En iyi (puan, malik id, aidat) üçlüsü ve ikinci en iyi puan; aday yoksa None"""
+    tokens = normalize(description).split()
+    candidates = Counter()
+    unit_hits = {}
+    for size in range(1, self.max_unit_tokens + 1):
+      for start in range(len(tokens) - size + 1):
+        key = "".join(tokens[start:start + size])
+        if key in self.by_unit:
+          unit_hits[key] = self.by_unit[key]
+    token_set = set(tokens)
+    for key, owner_ids in unit_hits.items():
+      # Yalnızca rakamdan oluşan daire adı ("12") tarih/tutarla karışabilir; daha az puan alır
+      for owner_id in owner_ids:
+        candidates[owner_id] = max(candidates[owner_id], 2 if key.isdigit() else 3)
+    name_candidates = set(candidates)  # daireyi tutan malikte tek kelime de sayılır
+    for pair in combinations(sorted(token_set), 2):
+      name_candidates.update(self.by_name_pair.get(pair, ()))
+    for owner_id in name_candidates:
+      names = self.owners[owner_id][2]
+      best = max((len(name & token_set) / len(name) for name in names), default=0)
+      if best >= 0.5:
+        candidates[owner_id] += round(4 * best)
+    if not candidates and amount is not None:
+      # Ne daire ne isim tuttu: tutar yalnızca tek bir malike uyuyorsa aday olur
+      owners = self.by_amount.get(amount, ())
+      if len(owners) == 1:
+        candidates[next(iter(owners))] += 1
+
+    if not candidates:
+      return None
+    matching_amount = self.by_amount.get(amount, ()) if amount is not None else ()
+    for owner_id in candidates:
+      if owner_id in matching_amount:
+        candidates[owner_id] += 2
+    # Yalnızca en iyi iki puan gerekir; aidat seçimi kazanan malik için yapılır
+    (owner_id, score), *rest = candidates.most_common(2)
+    runner_up = rest[0][1] if rest else 0
+    # Açık aidatı kalmamış malik de sıralamada kalır (rent None); yoksa daha zayıf bir aday kazanırdı
+    return (score, owner_id in matching_amount, owner_id, self._pick_rent(owner_id, amount)), runner_up
+
+  def _pick_rent(self, owner_id, amount):
+    """Malikin önerilmemiş en eski aidatı; tutarı tutan varsa o"""
+    first_open = None
+    for rent in self.rents.get(owner_id, ()):
+      if rent[2] in self.claimed:
+        continue
+      if amount is not None and amount in (rent[3], rent[3] + rent[4]):
+        return rent
+      if first_open is None:
+        first_open = rent
+    return first_open
+
+
+def match_statement(lines, index, session, account_id=None):
+  """Ekstre satırlarını eşleştir; her satır için bir sonuç sözlüğü, en sonda özet üretir.
+
+  session yalnızca referans numarası tekrar kontrolü için kullanılır
+  (IMPORT_CHUNK_SIZE satırda bir, payments.reference_number index'i üzerinden).
+  """
+  summary = Counter()
+  chunk = []
+
+  def flush(chunk):
+    references = {line[4] for line in chunk if line[4]}
+    recorded = set()
+    if references:
+      recorded = {ref for (ref,) in session.query(Payment.reference_number).filter(
+        Payment.reference_number.in_(references), Payment.is_cancelled == False
+      )}
+    for line in chunk:
+      result = _match_line(line, index, recorded, account_id)
+      summary[result["status"]] += 1
+      yield result
+
+  for line in read_statement(lines):
+    chunk.append(line)
+    if len(chunk) >= IMPORT_CHUNK_SIZE:
+      yield from flush(chunk)
+      chunk = []
+  if chunk:
+    yield from flush(chunk)
+  yield {"summary": dict(summary, lines=sum(summary.values()), open_rents=index.open_rent_count)}
+
+
+def _match_line(line, index, recorded, account_id):
+  line_no, date, description, amount, reference = line
+  result = {
+    "line": line_no,
+    "date": date.isoformat() if date else None,
+    "description": description,
+    "amount": float(amount) if amount is not None else None,
+    "reference": reference,
+  }
+  if amount is None or amount <= 0:
+    result.update(status="SKIPPED", reason="Tutar yok veya çıkış hareketi")
+    return result
+  if reference and reference in recorded:
+    result.update(status="DUPLICATE", reason="Bu referansla kayıtlı ödeme var")
+    return result
+
+  found = index.match(description, amount)
+  if found is None:
+    result["status"] = "UNMATCHED"
+    return result
+  (score, amount_matches, owner_id, rent), runner_up = found
+  full_name, unit_name, _ = index.owners[owner_id]
+  if rent is None:
+    if score < REVIEW_SCORE:
+      result["status"] = "UNMATCHED"
+      return result
+    result.update(
+      status="REVIEW", reason="Malikin önerilecek açık aidatı kalmadı", score=score,
+      ambiguous=score <= runner_up, amount_matches=amount_matches,
+      owner_id=owner_id, owner_name=full_name, unit_name=unit_name,
+    )
+    return result
+  year, month, rent_id, rent_amount, late_fee = rent
+  rent_fits = amount in (rent_amount, rent_amount + late_fee)
+  if score >= MATCH_SCORE and rent_fits and score > runner_up:
+    status = "MATCHED"
+  elif score >= REVIEW_SCORE:
+    status = "REVIEW"
+  else:
+    result["status"] = "UNMATCHED"
+    return result
+
+  index.claimed.add(rent[2])
+  late_fee_amount = amount - rent_amount if rent_fits and amount != rent_amount else Decimal("0")
+  payment = {
+    "rent_id": rent_id,
+    "amount": float(amount - late_fee_amount),
+    "late_fee_amount": float(late_fee_amount),
+    "payment_date": date.isoformat() if date else None,
+    "reference_number": reference,
+  }
+  if account_id is not None:
+    payment["account_id"] = account_id
+  result.update(
+    status=status,
+    score=score,
+    ambiguous=score <= runner_up,
+    amount_matches=rent_fits,
+    owner_id=owner_id,
+    owner_name=full_name,
+    unit_name=unit_name,
+    rent_year=year,
+    rent_month=month,
+    rent_amount=float(rent_amount),
+    payment=payment,
+  )
+  return result
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Banka ekstresi eşleştirme: 10 bin daireli site, sentetik ekstre
+
+Geçici bir SQLite veritabanına UNITS malik (her birinin 3 ödenmemiş aidatı)
+eklenir ve noktalı virgüllü, Türk tutar biçimli ("1.250,00") bir ekstre
+dosyası üretilir: malik/kiracı adı ve daire içeren ödemeler (büyük harf,
+Türkçe karakterli ya da karaktersiz yazımlar), gecikme zamlı ödemeler,
+ilgisiz gelirler, çıkışlar ve daha önce kaydedilmiş referanslar. Ölçülenler:
+  - açık aidat index'inin yüklenme süresi,
+  - satır/s eşleştirme hızı ve doğru malike giden MATCHED oranı,
+  - akış sırasında tracemalloc tepe belleği (10 bin ve LINES satır için
+    yaklaşık aynı kalmalı; fark yalnızca açık aidat sayısıyla sınırlı
+    önerilen aidat kümesidir),
+  - aynı dosyanın küçük bir kısmı POST /api/bank-import/match üzerinden.
+Kullanım: python bench_bank_import.py [ekstre satırı] [daire sayısı]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+LINES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+UNITS = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+workdir = tempfile.mkdtemp(prefix="ays_import_")
+os.chdir(workdir)  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import api  # noqa: E402
+import bank_import  # noqa: E402
+from database import Owner, Payment, Rent, SessionLocal, engine  # noqa: E402
+
+FIRST = ["Ayşe", "Mehmet", "Fatma", "Ahmet", "Emine", "Mustafa", "Hatice", "Ali", "Zeynep", "Hüseyin",
+         "Elif", "İbrahim", "Şükrü", "Gülşen", "Çağlar", "Özge", "İsmail", "Ümit", "Doğan", "Işıl"]
+LAST = ["Yılmaz", "Kaya", "Demir", "Şahin", "Çelik", "Yıldız", "Yıldırım", "Öztürk", "Aydın", "Özdemir",
+        "Arslan", "Doğan", "Kılıç", "Aslan", "Çetin", "Kara", "Koç", "Kurt", "Özkan", "Şimşek"]
+BLOCKS = "ABCDEFGHJK"
+random.seed(7)
+
+
+def person():
+    return f"{random.choice(FIRST)} {random.choice(FIRST) + ' ' if random.random() < 0.2 else ''}{random.choice(LAST)}"
+
+
+def ascii_upper(text):
+    # Bazı bankalar Türkçe karakterleri düşürür: "ŞÜKRÜ" → "SUKRU"
+    return bank_import.normalize(text).upper()
+
+
+# --- Site verisi ---
+started = time.perf_counter()
+owners = []
+for i in range(UNITS):
+    block, number = BLOCKS[i % len(BLOCKS)], i // len(BLOCKS) + 1
+    owners.append({
+        "id": i + 1, "full_name": person(), "email": f"m{i}@x", "password": "x",
+        "unit_name": f"{block} Blok {number}", "tenant_name": person() if random.random() < 0.3 else None,
+        "is_active": True, "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+    })
+rents = []
+for owner in owners:
+    amount = random.choice((750, 1000, 1250))
+    owner["rent_amount"] = amount
+    for month in (1, 2, 3):
+        rents.append({"owner_id": owner["id"], "year": 2025, "month": month, "amount": amount,
+                      "late_fee": 50 if month == 1 else 0, "status": "UNPAID"})
+with engine.begin() as conn:
+    conn.execute(Owner.__table__.insert(), [{k: v for k, v in o.items() if k != "rent_amount"} for o in owners])
+    conn.execute(Rent.__table__.insert(), rents)
+    conn.execute(Payment.__table__.insert(), [
+        {"rent_id": 1, "owner_id": 1, "account_id": 1, "amount": 1, "reference_number": f"REF{n}", "is_cancelled": False}
+        for n in range(0, LINES, 97)
+    ])
+print(f"{UNITS:,} daire, {len(rents):,} ödenmemiş aidat hazırlandı ({time.perf_counter() - started:.1f} s)")
+
+
+# --- Sentetik ekstre ---
+def write_statement(path, count):
+    expected = {}
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        f.write("Tarih;Açıklama;Tutar;Bakiye;Referans No\n")
+        for n in range(count):
+            kind = random.random()
+            owner = random.choice(owners)
+            amount = owner["rent_amount"]
+            if kind < 0.55:
+                payer = owner["tenant_name"] if owner["tenant_name"] and random.random() < 0.5 else owner["full_name"]
+                payer = random.choice((payer.upper(), ascii_upper(payer), payer))
+                unit = random.choice((owner["unit_name"], owner["unit_name"].upper(), owner["unit_name"].replace(" Blok ", "-")))
+                description = random.choice((
+                    f"EFT - {payer} - {unit} AİDAT",
+                    f"{payer} OCAK AIDAT ODEMESI",
+                    f"HAVALE {unit} {payer}",
+                ))
+                if random.random() < 0.1:
+                    amount += 50
+                expected[n + 2] = owner["id"]
+            elif kind < 0.75:
+                description = f"FAST {ascii_upper(person())} {random.choice(('KIRA', 'BORC', 'IADE'))}"
+                amount = random.choice((120, 333.5, 2750))
+            else:
+                description = random.choice(("ELEKTRIK FATURASI", "ASANSOR BAKIM", "TEMIZLIK MALZEMESI"))
+                amount = -random.choice((450, 1200, 3000))
+            formatted = f"{amount:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            f.write(f"{3 + n % 27:02d}.01.2025;{description};{formatted};0,00;REF{n}\n")
+    return expected
+
+
+def run(path, measure_memory=False):
+    session = SessionLocal()
+    t0 = time.perf_counter()
+    index = bank_import.OpenRentIndex.load(session)
+    load_s = time.perf_counter() - t0
+    if measure_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    results = Counter()
+    matched = {}
+    summary = None
+    with open(path, encoding="utf-8", newline="") as f:
+        for result in bank_import.match_statement(f, index, session, account_id=1):
+            if "summary" in result:
+                summary = result["summary"]
+                continue
+            results[result["status"]] += 1
+            if result["status"] == "MATCHED":
+                matched[result["line"]] = result["owner_id"]
+    elapsed = time.perf_counter() - t0
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    session.close()
+    return load_s, elapsed, results, matched, summary, peak
+
+
+statement = os.path.join(workdir, "ekstre.csv")
+small = os.path.join(workdir, "ekstre_kucuk.csv")
+expected = write_statement(statement, LINES)
+write_statement(small, min(10_000, LINES))
+print(f"{LINES:,} satırlık ekstre: {os.path.getsize(statement) / 1e6:.1f} MB")
+
+load_s, elapsed, results, matched, summary, _ = run(statement)
+correct = sum(1 for line, owner_id in matched.items() if expected.get(line) == owner_id)
+print(f"\nIndex yükleme: {load_s * 1000:.0f} ms")
+print(f"Eşleştirme: {elapsed:.2f} s  ({LINES / elapsed:,.0f} satır/s)")
+print(f"Durumlar: {dict(results)}")
+print(f"MATCHED doğruluğu: {correct}/{len(matched)} ({correct / max(len(matched), 1):.2%})")
+
+_, _, _, _, _, peak_small = run(small, measure_memory=True)
+_, _, _, _, _, peak_large = run(statement, measure_memory=True)
+print(f"Akış tepe belleği: {min(10_000, LINES):,} satır {peak_small / 1e6:.1f} MB, {LINES:,} satır {peak_large / 1e6:.1f} MB")
+
+client = api.app.test_client()
+with open(small, "rb") as f:
+    response = client.post("/api/bank-import/match?account_id=1", data={"file": (f, "ekstre.csv")},
+                           content_type="multipart/form-data")
+rows = [json.loads(line) for line in response.get_data().splitlines()]
+print(f"POST /api/bank-import/match: {response.status_code}, {len(rows) - 1} satır, özet {rows[-1]['summary']}")
+
+failures = []
+if summary["lines"] != LINES:
+    failures.append(f"özet satır sayısı {summary['lines']} != {LINES}")
+if correct / max(len(matched), 1) < 0.99:
+    failures.append("MATCHED doğruluğu %99'un altında")
+if results["DUPLICATE"] == 0:
+    failures.append("kayıtlı referanslar DUPLICATE olarak işaretlenmedi")
+if peak_large > 2 * peak_small + 5e6:
+    failures.append("akış belleği satır sayısıyla büyüyor")
+if response.status_code != 200 or "summary" not in rows[-1]:
+    failures.append("uç nokta beklenen NDJSON'u dönmedi")
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print("✅ Ekstre akış olarak eşleştirildi")
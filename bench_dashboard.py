@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Dashboard grafiği ve ödenmemiş aidat listesi: geçmiş büyürken sabit maliyet
+
+Geçici bir SQLite veritabanına UNITS daire ve 3 hesap eklenir; geçmiş her
+aşamada STAGES yılına kadar geriye doğru büyütülür (hesap başına aylık
+TX_PER_ACCOUNT_MONTH hareket, her ay tüm dairelere aidat, her yirminci
+aidat ödenmemiş). Her aşamada ölçülenler:
+  - GET /api/dashboard/chart-data (12 ay ve 120 ay / 24 nokta) ve
+    GET /api/dashboard/unpaid-rents (ilk sayfa ve cursor'lı sayfa) süresi,
+  - istek başına çalışan SQL sayısı (sabit kalmalı),
+  - 12 aylık seri toplamının ham transactions taramasıyla eşitliği,
+  - sayfaların tüm ödenmemiş aidatları vade sırasıyla bir kez döndürmesi.
+Kullanım: python bench_dashboard.py [daire sayısı] [yıl aşamaları, ör. 1,5,15]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+UNITS = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+STAGES = [int(y) for y in sys.argv[2].split(",")] if len(sys.argv) > 2 else [1, 5, 15]
+TX_PER_ACCOUNT_MONTH = 150
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+os.chdir(tempfile.mkdtemp(prefix="ays_dashboard_"))  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, func  # noqa: E402
+
+import api  # noqa: E402
+import rollups  # noqa: E402
+from database import Account, Owner, Rent, SessionLocal, Transaction, engine  # noqa: E402
+
+api.app.logger.setLevel(logging.CRITICAL)
+client = api.app.test_client()
+statements = []
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+def shift(year, month, months):
+    year, month = divmod(year * 12 + month - 1 + months, 12)
+    return year, month + 1
+
+
+with engine.begin() as conn:
+    conn.execute(Account.__table__.insert(), [
+        {"name": name, "type": kind, "balance": 0, "is_active": True}
+        for name, kind in (("Banka", "BANK"), ("Kasa", "CASH"), ("Yedek", "BANK"))
+    ])
+    conn.execute(Owner.__table__.insert(), [
+        {"full_name": f"Malik {i}", "email": f"m{i}@x", "password": "x", "unit_name": f"D{i}", "is_active": True}
+        for i in range(UNITS)
+    ])
+    owner_ids = [row[0] for row in conn.execute(Owner.__table__.select().with_only_columns(Owner.id))]
+
+now = datetime.utcnow()
+loaded = 0  # şimdiye kadar eklenen ay sayısı (bu aydan geriye)
+
+
+def grow(total_months):
+    global loaded
+    rent_rows, tx_rows = [], []
+    for back in range(loaded, total_months):
+        year, month = shift(now.year, now.month, -back)
+        for n, owner_id in enumerate(owner_ids):
+            unpaid = (owner_id + back) % 20 == 0
+            rent_rows.append({
+                "owner_id": owner_id, "year": year, "month": month, "amount": 100,
+                "status": "UNPAID" if unpaid else "PAID",
+                "due_date": datetime(year, month, 10) + timedelta(days=n % 5) if n % 50 else None,
+            })
+        for account_id in (1, 2, 3):
+            for i in range(TX_PER_ACCOUNT_MONTH):
+                tx_type = ("INCOME", "EXPENSE", "TRANSFER")[i % 3]
+                tx_rows.append({
+                    "account_id": account_id, "related_account": account_id % 3 + 1 if tx_type == "TRANSFER" else None,
+                    "type": tx_type, "source": "MANUAL", "amount": 1 + (i + account_id) % 9, "is_canceled": i % 40 == 0,
+                    "created_at": datetime(year, month, 1 + i % 28, 9),
+                })
+    with engine.begin() as conn:
+        conn.execute(Rent.__table__.insert(), rent_rows)
+        conn.execute(Transaction.__table__.insert(), tx_rows)
+    loaded = total_months
+    session = SessionLocal()
+    rollups.rebuild(session, ["account", "owner"])
+    session.commit()
+    session.close()
+
+
+def timed(path, repeat=5):
+    best = None
+    for _ in range(repeat):
+        statements.clear()
+        started = time.perf_counter()
+        response = client.get(path)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(statements), response
+
+
+def raw_window_totals(months):
+    # 12 aylık seri toplamının ham tablodan karşılığı
+    start_year, start_month = shift(now.year, now.month, 1 - months)
+    session = SessionLocal()
+    try:
+        rows = session.query(Transaction.type, func.sum(Transaction.amount)).filter(
+            Transaction.is_canceled == False, Transaction.type.in_(("INCOME", "EXPENSE")),
+            Transaction.created_at >= datetime(start_year, start_month, 1),
+        ).group_by(Transaction.type).all()
+        return {tx_type.lower(): round(float(total), 2) for tx_type, total in rows}
+    finally:
+        session.close()
+
+
+def walk_unpaid():
+    # Tüm sayfalar: her ödenmemiş aidat bir kez, vadesi olanlar artan vadeyle, vadesizler sonda
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = client.get("/api/dashboard/unpaid-rents?limit=500" + (f"&cursor={cursor}" if cursor else ""))
+        body = response.get_json()
+        seen.extend(body["rents"])
+        pages += 1
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen, pages
+
+
+failures = []
+results = []
+for years in STAGES:
+    started = time.perf_counter()
+    grow(years * 12)
+    session = SessionLocal()
+    raw_tx = session.query(func.count(Transaction.id)).scalar()
+    raw_rents = session.query(func.count(Rent.id)).scalar()
+    unpaid = session.query(func.count(Rent.id)).filter(Rent.status == "UNPAID").scalar()
+    session.close()
+    print(f"\n{years} yıl geçmiş: {raw_tx:,} hareket, {raw_rents:,} aidat ({unpaid:,} ödenmemiş)"
+          f" — hazırlık {time.perf_counter() - started:.1f} s")
+
+    chart_ms, chart_sql, chart = timed("/api/dashboard/chart-data")
+    long_ms, long_sql, long_chart = timed("/api/dashboard/chart-data?months=120&max_points=24")
+    first_ms, first_sql, first = timed("/api/dashboard/unpaid-rents")
+    cursor = first.get_json()["next_cursor"]
+    page_ms, page_sql, page = timed(f"/api/dashboard/unpaid-rents?cursor={cursor}")
+    results.append((years, chart_ms, long_ms, first_ms, page_ms, (chart_sql, long_sql, first_sql, page_sql)))
+    print(f"  chart-data 12 ay          {chart_ms:7.1f} ms  {chart_sql} SQL  {len(chart.get_json()['labels'])} nokta")
+    body = long_chart.get_json()
+    print(f"  chart-data 120 ay/24 nokta {long_ms:6.1f} ms  {long_sql} SQL  {len(body['labels'])} nokta"
+          f" × {body['bucket_months']} ay")
+    print(f"  unpaid-rents ilk sayfa    {first_ms:7.1f} ms  {first_sql} SQL  {len(first.get_json()['rents'])} satır")
+    print(f"  unpaid-rents cursor       {page_ms:7.1f} ms  {page_sql} SQL  {len(page.get_json()['rents'])} satır")
+
+    body = chart.get_json()
+    reported = {"income": round(sum(body["income"]), 2), "expense": round(sum(body["expense"]), 2)}
+    if reported != raw_window_totals(12):
+        failures.append(f"{years} yıl: grafik toplamı {reported} != ham {raw_window_totals(12)}")
+    if len(long_chart.get_json()["labels"]) > 24:
+        failures.append(f"{years} yıl: 120 aylık grafik 24 noktayı aştı")
+
+    rows, pages = walk_unpaid()
+    ids = [row["id"] for row in rows]
+    dated = [row["due_date"] for row in rows if row["due_date"]]
+    if len(ids) != unpaid or len(set(ids)) != unpaid:
+        failures.append(f"{years} yıl: sayfalar {len(set(ids))}/{unpaid} ödenmemiş aidat döndürdü")
+    if dated != sorted(dated) or any(row["due_date"] for row in rows[len(dated):]):
+        failures.append(f"{years} yıl: sayfalar vade sırasında değil")
+    if not all(row["unit_name"] and row["owner_name"] for row in rows):
+        failures.append(f"{years} yıl: malik adı/daire eksik")
+    print(f"  tüm ödenmemişler {pages} sayfada, sıralı ve tekil")
+
+sql_counts = {counts for *_, counts in results}
+if len(sql_counts) != 1:
+    failures.append(f"istek başına SQL sayısı geçmişle değişti: {sorted(sql_counts)}")
+first, last = results[0], results[-1]
+for name, column in (("chart-data", 1), ("chart-data 120 ay", 2), ("unpaid-rents", 3), ("unpaid-rents cursor", 4)):
+    if last[column] > 3 * first[column] + 5:
+        failures.append(f"{name}: {first[0]} yıldan {last[0]} yıla {first[column]:.1f} → {last[column]:.1f} ms")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print(f"\n✅ İstek başına SQL sayısı sabit {sorted(sql_counts)[0]}, yanıt süreleri geçmişten bağımsız")
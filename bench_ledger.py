@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Tek hesaba eşzamanlı ödeme yazma hızı: LEDGER_MODE kapalı/açık, 1, 4 ve 16 istemci
+
+Tüm ödemeler aynı hesaba (binanın ana banka hesabı) yazılır; LEDGER_MODE
+kapalıyken her ödeme hesap satırını commit'e kadar kilitler, açıkken
+yalnızca account_ledger'a satır ekler. Her ölçüm ayrı bir alt süreçte çalışır
+(mod import sırasında okunur). DATABASE_URL verilirse o veritabanı kullanılır
+(satır kilidi çekişmesi PostgreSQL'de ölçülmelidir; SQLite zaten tek yazarlıdır),
+verilmezse her ölçüm geçici bir SQLite dosyası kullanır. Sonunda canlı bakiye
+başarılı ödemelerin toplamıyla karşılaştırılır ve katlayıcı çalıştırılır.
+Kullanım: python bench_ledger.py [istemci başına ödeme]
+
+Şu ana kadarki ölçümler yalnızca SQLite'ta (istemci başına 100 ödeme,
+başarılı ödeme/s):
+  doğrudan      1: 89   4: 117   16: 125
+  LEDGER_MODE   1: 144  4: 117   16: 96
+SQLite yazmaları zaten sıraya soktuğundan bu sayılar hesap satırı kilidinin
+maliyetini göstermez. LEDGER_MODE'un asıl hedefi olan PostgreSQL ölçümü
+henüz yok; modu üretimde açmadan önce DATABASE_URL ile PostgreSQL'de
+çalıştırılmalıdır.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+CLIENTS = (1, 4, 16)
+
+
+def worker(clients, per_client):
+    if not os.environ.get("DATABASE_URL"):
+        os.chdir(tempfile.mkdtemp(prefix="ays_bench_"))  # database.py lokal modda ./ays.db kullanır
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import api
+    from database import Account, Owner, Rent, SessionLocal
+    from ledger import fold_ledger, live_balances
+
+    session = SessionLocal()
+    account = Account(name=f"Bench {time.time_ns()}", type="BANK", balance=0)
+    owners = [Owner(full_name=f"Bench Malik {i}", email=f"bench{i}@x", password="x") for i in range(clients)]
+    session.add(account)
+    session.add_all(owners)
+    session.flush()
+    total = clients * per_client
+    rents = [
+        Rent(owner_id=owners[i % clients].id, month=i % 12 + 1, year=2000 + i // 12, amount=100, status="UNPAID")
+        for i in range(total)
+    ]
+    session.add_all(rents)
+    session.flush()
+    account_id, rent_ids = account.id, [rent.id for rent in rents]
+    session.commit()
+    session.close()
+
+    failures = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def pay(rent_id):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = api.app.test_client()
+        response = client.post("/api/payments", json={"rent_id": rent_id, "account_id": account_id, "amount": 100})
+        if response.status_code != 201:
+            with lock:
+                failures.append(response.get_json().get("message"))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        list(executor.map(pay, rent_ids))
+    elapsed = time.perf_counter() - started
+
+    session = SessionLocal()
+    live = live_balances(session, [account_id])[account_id]
+    session.close()
+    fold_started = time.perf_counter()
+    folded = 0
+    while True:
+        count = fold_ledger()
+        folded += count
+        if count == 0:
+            break
+    fold_ms = (time.perf_counter() - fold_started) * 1000
+    session = SessionLocal()
+    checkpoint = session.query(Account.balance).filter(Account.id == account_id).scalar()
+    session.close()
+    expected = Decimal(100 * (total - len(failures)))
+    print(json.dumps({
+        "per_sec": (total - len(failures)) / elapsed,
+        "failures": len(failures),
+        "first_failure": failures[0].splitlines()[0] if failures else None,
+        "balance_ok": live == expected and Decimal(checkpoint) == expected,
+        "folded": folded,
+        "fold_ms": fold_ms,
+    }))
+
+
+def main(per_client):
+    if not os.environ.get("DATABASE_URL", "").startswith("postgresql"):
+        print("⚠️  SQLite: satır kilidi çekişmesi ölçülmüyor, PostgreSQL için DATABASE_URL verin\n")
+    print(f"{'mod':<12}{'istemci':>8}{'başarılı/s':>12}{'hata':>7}{'katlanan':>10}{'katlama ms':>12}  bakiye")
+    for mode in ("false", "true"):
+        for clients in CLIENTS:
+            env = dict(os.environ, LEDGER_MODE=mode, EVENTS_POLL_INTERVAL="5", LEDGER_FOLD_INTERVAL="3600")
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", str(clients), str(per_client)],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(out)
+            label = "LEDGER_MODE" if mode == "true" else "doğrudan"
+            print(
+                f"{label:<12}{clients:>8}{result['per_sec']:>12.0f}{result['failures']:>7}"
+                f"{result['folded']:>10}{result['fold_ms']:>12.1f}  "
+                f"{'✅' if result['balance_ok'] else '❌'}"
+                + (f"  ({result['first_failure']})" if result["first_failure"] else "")
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Ekstre günü: N ödemeyi tek tek POST /api/payments ile ve tek POST /api/payments/batch ile kaydet
+
+Geçici bir SQLite veritabanında aynı sayıda aidat iki yöntemle ödenir; süreler,
+hesap bakiyesi ve malik bakiyeleri karşılaştırılır. Ardından best_effort ve
+all_or_nothing modları hatalı kalem içeren bir partiyle, ödenmiş aidata
+ikinci ödeme de ayrıca sınanır.
+Kullanım: python bench_payment_batch.py [ödeme sayısı]
+"""
+import os
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+os.chdir(tempfile.mkdtemp(prefix="ays_batch_"))  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import api  # noqa: E402
+from database import Account, Owner, OwnerBalance, Payment, Rent, SessionLocal  # noqa: E402
+from ledger import live_balances  # noqa: E402
+
+session = SessionLocal()
+session.add_all([Account(name="Tek tek", type="BANK", balance=0), Account(name="Toplu", type="BANK", balance=0)])
+owners = [Owner(full_name=f"Malik {i}", email=f"m{i}@x", password="x") for i in range(50)]
+session.add_all(owners)
+session.flush()
+rents = [
+    Rent(owner_id=owners[i % 50].id, month=i // 50 % 12 + 1, year=2000 + i // 600, amount=100, status="UNPAID")
+    for i in range(2 * COUNT + 3)
+]
+session.add_all(rents)
+session.flush()
+rent_ids = [rent.id for rent in rents]
+session.commit()
+session.close()
+
+client = api.app.test_client()
+single_ids, batch_ids, extra_ids = rent_ids[:COUNT], rent_ids[COUNT:2 * COUNT], rent_ids[2 * COUNT:]
+
+started = time.perf_counter()
+for rent_id in single_ids:
+    response = client.post("/api/payments", json={"rent_id": rent_id, "account_id": 1, "amount": 100, "late_fee_amount": 5})
+    assert response.status_code == 201, response.get_json()
+single_ms = (time.perf_counter() - started) * 1000
+
+started = time.perf_counter()
+response = client.post("/api/payments/batch", json={
+    "payments": [{"rent_id": rent_id, "account_id": 2, "amount": 100, "late_fee_amount": 5} for rent_id in batch_ids],
+})
+batch_ms = (time.perf_counter() - started) * 1000
+assert response.status_code == 201, response.get_json()
+body = response.get_json()
+
+print(f"{COUNT} ödeme")
+print(f"  tek tek POST /api/payments:    {single_ms:8.0f} ms  ({COUNT / single_ms * 1000:,.0f} ödeme/s)")
+print(f"  tek POST /api/payments/batch:  {batch_ms:8.0f} ms  ({COUNT / batch_ms * 1000:,.0f} ödeme/s)")
+
+failures = []
+session = SessionLocal()
+balances = live_balances(session, [1, 2])
+paid_by_owner = dict(session.query(OwnerBalance.owner_id, OwnerBalance.paid).all())
+session.close()
+if balances[1] != balances[2] or balances[2] != Decimal(105 * COUNT):
+    failures.append(f"bakiyeler tutarsız: {balances}")
+if sum(paid_by_owner.values()) != Decimal(200 * COUNT):
+    failures.append(f"malik bakiyeleri tutarsız: {sum(paid_by_owner.values())}")
+if body["created"] != COUNT or not all(result["success"] for result in body["results"]):
+    failures.append("toplu yanıt tüm kalemleri başarılı göstermiyor")
+
+bad_batch = [
+    {"rent_id": extra_ids[0], "account_id": 2, "amount": 100},
+    {"rent_id": 999999, "account_id": 2, "amount": 100},
+    {"rent_id": extra_ids[1], "account_id": 2, "amount": -1},
+    {"rent_id": extra_ids[2], "account_id": 2, "amount": 100},
+]
+response = client.post("/api/payments/batch", json={"payments": bad_batch})
+print(f"  all_or_nothing, 2/4 hatalı:    {response.status_code}, {response.get_json()['created']} kaydedildi")
+if response.status_code != 400 or response.get_json()["created"] != 0:
+    failures.append("all_or_nothing hatalı kalemle yazdı")
+response = client.post("/api/payments/batch", json={"payments": bad_batch, "mode": "best_effort"})
+results = response.get_json()["results"]
+print(f"  best_effort, 2/4 hatalı:       {response.status_code}, {response.get_json()['created']} kaydedildi, "
+      f"hatalar: {[result.get('message') for result in results if not result['success']]}")
+if response.status_code != 201 or [result["success"] for result in results] != [True, False, False, True]:
+    failures.append("best_effort kalem sonuçları beklenenden farklı")
+response = client.post("/api/payments/batch", json={"payments": bad_batch[:1], "mode": "best_effort"})
+results = response.get_json()["results"]
+print(f"  ödenmiş aidat tekrar:          {response.status_code}, {results[0].get('message')}")
+if results[0]["success"] or response.get_json()["created"] != 0:
+    failures.append("ödenmiş aidata ikinci ödeme kaydedildi")
+
+session = SessionLocal()
+payments = session.query(Payment).count()
+session.close()
+if payments != 2 * COUNT + 2:
+    failures.append(f"ödeme sayısı {payments} != {2 * COUNT + 2}")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print("✅ Toplu ödeme tek tek ödemelerle aynı bakiyeleri üretti")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Raporlar: aylık özet tabloları (rollups.py) ile ham tablo taraması karşılaştırması
+
+1. Eşzamanlı thread'lerle API üzerinden gelir, gider, transfer, ödeme, toplu
+   ödeme, gider düzenleme/silme ve iptaller yapılır (bir kısmı yetersiz bakiye
+   ya da olmayan kayıt nedeniyle reddedilir). Sonunda özetler ham tablolarla
+   birebir tutarlı olmalı (rollups.check): artımlı güncelleme hiçbir yolda
+   kayıp ya da fazla fark bırakmamalı, reddedilen isteğin farkı yazılmamalı.
+2. YEARS yıllık sentetik geçmiş (hesap başına aylık yüzlerce hareket, UNITS
+   daire) doğrudan tablolara eklenir, özetler rebuild ile üretilir. Her rapor
+   ucu ölçülür ve aynı toplamı ham tablolardan hesaplayan sorguyla
+   karşılaştırılır; okunan özet satırı sayısı yazdırılır.
+WRITE_QUEUE=true ve LEDGER_MODE=true ile diğer yazma modları da sınanır.
+Kullanım: python bench_reports.py [API işlemi] [yıl] [daire sayısı]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+OPERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+YEARS = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+UNITS = int(sys.argv[3]) if len(sys.argv) > 3 else 400
+THREADS = 8
+TX_PER_ACCOUNT_MONTH = 400
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+os.chdir(tempfile.mkdtemp(prefix="ays_reports_"))  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import case, func  # noqa: E402
+
+import api  # noqa: E402
+import rollups  # noqa: E402
+from database import (  # noqa: E402
+    Account, AccountMonthlyTotal, Category, Expense, Owner, OwnerMonthlyTotal, Payment, Rent, SessionLocal,
+    Transaction, engine,
+)
+
+api.app.logger.setLevel(logging.CRITICAL)
+client = api.app.test_client()
+random.seed(11)
+
+# --- 1. API üzerinden artımlı güncelleme ---
+session = SessionLocal()
+session.add_all([Account(name="Banka", type="BANK", balance=5000), Account(name="Kasa", type="CASH", balance=500)])
+session.add_all([Category(name=f"Gider {i}", category_type="EXPENSE") for i in range(4)])
+session.add_all([Owner(full_name=f"Malik {i}", email=f"m{i}@x", password="x", unit_name=f"D{i}") for i in range(40)])
+session.commit()
+session.close()
+for month in range(1, 13):
+    assert client.post("/api/rents/bulk", json={"month": month, "year": 2025, "amount": 100}).status_code == 201
+
+session = SessionLocal()
+open_rents = [rent_id for (rent_id,) in session.query(Rent.id).order_by(Rent.id)]
+session.close()
+random.shuffle(open_rents)
+
+
+def operation(n):
+    kind = random.random()
+    account = random.choice((1, 2))
+    if kind < 0.15:
+        return client.post("/api/transactions/income", json={"account_id": account, "amount": random.randint(1, 300)})
+    if kind < 0.25:
+        return client.post("/api/transactions/expense", json={"account_id": account, "amount": random.randint(1, 400)})
+    if kind < 0.35:
+        return client.post("/api/transactions/transfer", json={
+            "source_account_id": account, "target_account_id": 3 - account, "amount": random.randint(1, 500),
+        })
+    if kind < 0.55 and open_rents:
+        rent_id = open_rents.pop()
+        return client.post("/api/payments", json={
+            "rent_id": rent_id, "account_id": account, "amount": 100, "late_fee_amount": random.choice((0, 5)),
+            "payment_date": f"2025-{random.randint(1, 12):02d}-10",
+        })
+    if kind < 0.62 and len(open_rents) > 3:
+        batch = [open_rents.pop() for _ in range(3)]
+        return client.post("/api/payments/batch", json={"payments": [
+            {"rent_id": rent_id, "account_id": account, "amount": 100} for rent_id in batch
+        ]})
+    if kind < 0.75:
+        return client.post("/api/expenses", json={
+            "name": f"Gider {n}", "category_id": random.randint(1, 4), "account_id": account,
+            "amount": random.randint(1, 200), "date": f"2025-{random.randint(1, 12):02d}-05",
+        })
+    if kind < 0.82:
+        return client.put(f"/api/expenses/{random.randint(1, n // 8 + 1)}", json={
+            "amount": random.randint(1, 200), "category_id": random.randint(1, 4), "account_id": random.choice((1, 2, 99)),
+            "date": f"2025-{random.randint(1, 12):02d}-20",
+        })
+    if kind < 0.86:
+        return client.delete(f"/api/expenses/{random.randint(1, n // 8 + 1)}")
+    if kind < 0.93:
+        return client.put(f"/api/payments/{random.randint(1, n // 5 + 1)}/cancel", json={})
+    if kind < 0.97:
+        return client.delete(f"/api/transactions/{random.randint(1, n + 1)}")
+    return client.put(f"/api/rents/{random.randint(1, 480)}", json={"amount": random.choice((100, 120))})
+
+
+started = time.perf_counter()
+with ThreadPoolExecutor(THREADS) as executor:
+    statuses = Counter(response.status_code for response in executor.map(operation, range(OPERATIONS)))
+print(f"{OPERATIONS:,} API işlemi, {THREADS} thread: {time.perf_counter() - started:.1f} s, durumlar {dict(statuses)}")
+
+failures = []
+session = SessionLocal()
+drift = rollups.check(session)
+session.close()
+print(f"Artımlı özet tutarlılığı: {({name: len(rows) for name, rows in drift.items()})}")
+if any(drift.values()):
+    failures.append(f"özetler ham tablolardan farklı: {[rows[:2] for rows in drift.values() if rows]}")
+if statuses[500]:
+    failures.append(f"{statuses[500]} istek 500 döndü")
+
+# --- 2. Çok yıllık geçmiş ---
+started = time.perf_counter()
+now = datetime.utcnow()
+first_year = now.year - YEARS
+with engine.begin() as conn:
+    conn.execute(Owner.__table__.insert(), [
+        {"full_name": f"Geçmiş {i}", "email": f"g{i}@x", "password": "x", "unit_name": f"G{i}", "is_active": True}
+        for i in range(UNITS)
+    ])
+    owner_ids = [row[0] for row in conn.execute(Owner.__table__.select().with_only_columns(Owner.id))]
+    rent_rows, tx_rows, expense_rows = [], [], []
+    for year in range(first_year, now.year):
+        for month in range(1, 13):
+            for owner_id in owner_ids[40:]:
+                rent_rows.append({"owner_id": owner_id, "year": year, "month": month, "amount": 100, "status": "PAID"})
+            for account_id in (1, 2):
+                for i in range(TX_PER_ACCOUNT_MONTH):
+                    tx_type = ("INCOME", "EXPENSE", "TRANSFER")[i % 3]
+                    tx_rows.append({
+                        "account_id": account_id, "related_account": 3 - account_id if tx_type == "TRANSFER" else None,
+                        "type": tx_type, "source": "MANUAL", "amount": 1 + i % 7, "is_canceled": i % 50 == 0,
+                        "created_at": datetime(year, month, 1 + i % 28, 12),
+                    })
+            for i in range(40):
+                expense_rows.append({
+                    "name": "Geçmiş gider", "category_id": 1 + i % 4, "account_id": 1, "amount": 10 + i,
+                    "expense_date": datetime(year, month, 1 + i % 28),
+                })
+    conn.execute(Rent.__table__.insert(), rent_rows)
+    conn.execute(Transaction.__table__.insert(), tx_rows)
+    conn.execute(Expense.__table__.insert(), expense_rows)
+    rent_ids = conn.execute(
+        Rent.__table__.select().with_only_columns(Rent.id, Rent.owner_id, Rent.year, Rent.month)
+        .where(Rent.year < now.year, Rent.owner_id > 40)
+    ).all()
+    conn.execute(Payment.__table__.insert(), [
+        {"rent_id": rent_id, "owner_id": owner_id, "account_id": 1, "amount": 100, "late_fee_amount": 0,
+         "payment_date": datetime(year, month, 15), "is_cancelled": False}
+        for rent_id, owner_id, year, month in rent_ids
+        if (rent_id % 10) != 0  # her onuncu aidat ödenmemiş kalır
+    ])
+session = SessionLocal()
+counts = rollups.rebuild(session)
+session.commit()
+raw_rows = {model.__tablename__: session.query(func.count()).select_from(model).scalar() for model in (Transaction, Payment, Rent, Expense)}
+rollup_rows = {model.__tablename__: session.query(func.count()).select_from(model).scalar() for model in (AccountMonthlyTotal, OwnerMonthlyTotal)}
+session.close()
+print(f"\n{YEARS} yıllık geçmiş eklendi ve özetler üretildi ({time.perf_counter() - started:.1f} s)")
+print(f"  ham satırlar: {raw_rows}")
+print(f"  özet satırları: {counts}")
+
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def raw_summary():
+    # Aynı dönem toplamlarını ham tablolardan hesaplayan sorgular
+    session = SessionLocal()
+    try:
+        start, end = datetime(first_year, 1, 1), datetime(now.year, 1, 1)
+        income, expense = session.query(
+            func.coalesce(func.sum(case((Transaction.type == "INCOME", Transaction.amount), else_=0)), 0),
+            func.coalesce(func.sum(case((Transaction.type == "EXPENSE", Transaction.amount), else_=0)), 0),
+        ).filter(Transaction.is_canceled == False, Transaction.created_at >= start, Transaction.created_at < end).one()
+        charged = session.query(func.coalesce(func.sum(Rent.amount), 0)).filter(
+            Rent.year >= first_year, Rent.year < now.year
+        ).scalar()
+        collected = session.query(func.coalesce(func.sum(Payment.amount), 0)).filter(
+            Payment.is_cancelled == False, Payment.payment_date >= start, Payment.payment_date < end
+        ).scalar()
+        return float(income), float(expense), float(charged), float(collected)
+    finally:
+        session.close()
+
+
+period = f"period_from={first_year}-01&period_to={now.year - 1}-12"
+raw_ms, (income, expense, charged, collected) = timed(raw_summary)
+print(f"\nHam tablo taraması (gelir/gider/tahakkuk/tahsilat): {raw_ms:8.1f} ms")
+for path in ("summary", "balance", "chart", "debt", "apartment-list"):
+    elapsed, response = timed(lambda: client.get(f"/api/reports/{path}?{period}"))
+    print(f"GET /api/reports/{path:<15} {elapsed:8.1f} ms  ({response.status_code}, {len(response.get_data()):,} bayt)")
+    if response.status_code != 200:
+        failures.append(f"/api/reports/{path} {response.status_code} döndü")
+    if path == "summary":
+        body = response.get_json()
+        reported = tuple(round(body[name], 2) for name in ("income", "expense", "charged", "collected"))
+        if reported != tuple(round(value, 2) for value in (income, expense, charged, collected)):
+            failures.append(f"rapor özeti ham tablolarla farklı: {reported} != {(income, expense, charged, collected)}")
+
+session = SessionLocal()
+drift = rollups.check(session)
+session.close()
+if any(drift.values()):
+    failures.append("yeniden üretilen özetler ham tablolardan farklı")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print(f"✅ Raporlar {sum(rollup_rows.values()):,} özet satırından okundu, özetler ham tablolarla tutarlı")
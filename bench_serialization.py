@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""100k transaction için JSON serileştirme hızı: eski yol ve derlenmiş serializer
+
+Eski yol: elle yazılmış sözlük builder'ı + Flask'ın varsayılan json.dumps
+ayarları (sort_keys, ensure_ascii). Yeni yol: serializers.serialize_transaction
++ serializers.dumps (orjson varsa). Ayrıca orjson ve stdlib yollarının aynı
+baytları ürettiği, aidat/ödeme oluşturma yanıtlarının eski alan değerlerini
+(sıfır gecikme bedeli null) koruduğu doğrulanır. Bilinçli fark: Türkçe
+karakterler \\uXXXX yerine ham UTF-8 olarak yazılır (JSON olarak eşdeğer).
+"""
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import serializers
+from database import Base, Payment, Rent, Transaction
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+
+def legacy_json_transaction(tx):
+    return {
+        'id': tx.id,
+        'account_id': tx.account_id,
+        'related_account': tx.related_account,
+        'type': tx.type,
+        'source': tx.source,
+        'related_id': tx.related_id,
+        'amount': float(tx.amount or 0),
+        'description': tx.description,
+        'is_canceled': tx.is_canceled,
+        'created_by': tx.created_by,
+        'created_at': tx.created_at.isoformat() if tx.created_at else None,
+        'updated_at': tx.updated_at.isoformat() if tx.updated_at else None,
+    }
+
+
+def legacy_dumps(obj):
+    return json.dumps(obj, ensure_ascii=True, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+# Gerçek yanıtlardaki gibi veritabanından yüklenmiş nesneler
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Base.metadata.create_all(engine)
+base = datetime(2024, 1, 1, 9, 30, 15, 123456)
+rows = [
+    dict(
+        id=i,
+        account_id=i % 3 + 1,
+        related_account=(i % 3 + 2) if i % 10 == 0 else None,
+        type=('INCOME', 'EXPENSE', 'TRANSFER')[i % 3],
+        source='RENT',
+        related_id=i,
+        amount=Decimal('1250.50') + i % 100,
+        description=f'Aidat - {i % 12 + 1}/2024 Şükrü Öztürk',
+        is_canceled=i % 50 == 0,
+        created_by=None,
+        created_at=base + timedelta(minutes=i),
+        updated_at=base + timedelta(minutes=i),
+    )
+    for i in range(1, ROWS + 1)
+]
+with engine.begin() as conn:
+    conn.execute(Transaction.__table__.insert(), rows)
+session = Session(engine)
+txs = session.query(Transaction).all()
+
+print(f"Encoder: {'orjson ' + serializers.orjson.__version__ if serializers.orjson else 'stdlib json'}")
+print(f"Satır: {ROWS:,}\n")
+
+
+def bench(label, build, encode):
+    start = time.perf_counter()
+    payload = encode({'transactions': [build(t) for t in txs]})
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:8.1f} ms  {ROWS / elapsed:12,.0f} satır/s  {len(payload) / 1e6:6.2f} MB")
+    return elapsed, payload
+
+
+before, _ = bench("önce  (dict builder + json)", legacy_json_transaction, legacy_dumps)
+after, fast = bench("sonra (derlenmiş + dumps)", serializers.serialize_transaction, serializers.dumps)
+_, reference = bench("sonra (derlenmiş + stdlib)", serializers.serialize_transaction, serializers.stdlib_dumps)
+
+print(f"\nHızlanma: {before / after:.1f}x")
+assert fast == reference, "orjson ve stdlib çıktıları farklı"
+assert json.loads(fast) == json.loads(legacy_dumps({'transactions': [legacy_json_transaction(t) for t in txs]}))
+
+
+# Tekil yanıtların eski el yazımı değerleri (create/update rent, create/cancel payment)
+def legacy_rent_detail(rent, owner_name):
+    return {
+        'id': rent.id, 'owner_id': rent.owner_id, 'owner_name': owner_name, 'month': rent.month, 'year': rent.year,
+        'amount': float(rent.amount or 0),
+        'due_date': rent.due_date.isoformat() if rent.due_date else None,
+        'status': rent.status or 'UNPAID',
+        'late_fee': float(rent.late_fee or 0) if rent.late_fee else None,
+        'category_id': rent.category_id, 'description': rent.description,
+        'created_at': rent.created_at.isoformat() if rent.created_at else None,
+        'updated_at': rent.updated_at.isoformat() if rent.updated_at else None,
+    }
+
+
+def legacy_payment_detail(payment):
+    return {
+        'amount': float(payment.amount or 0),
+        'late_fee_amount': float(payment.late_fee_amount or 0) if payment.late_fee_amount else None,
+        'total_amount': float(payment.amount or 0) + float(payment.late_fee_amount or 0),
+    }
+
+
+for late_fee in (None, 0, Decimal('12.5')):
+    rent = Rent(id=1, owner_id=1, month=1, year=2024, amount=0, status=None, late_fee=late_fee, created_at=base)
+    assert legacy_dumps(serializers.serialize_rent_detail(rent, 'Ali')) == legacy_dumps(legacy_rent_detail(rent, 'Ali'))
+    payment = Payment(id=1, rent_id=1, owner_id=1, account_id=1, amount=0, late_fee_amount=late_fee)
+    detail = serializers.serialize_payment_detail(payment, 'Ali', 'Kasa')
+    legacy = legacy_payment_detail(payment)
+    assert legacy_dumps({key: detail[key] for key in legacy}) == legacy_dumps(legacy), (detail, legacy)
+print("✅ Çıktılar bayt bazında aynı, içerik eski yolla eşdeğer; tekil yanıtlar eski değerleri koruyor")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""/api/transactions: tam liste yanıtı ile ?stream=1 yanıtının tepe belleği
+
+Geçici bir dizinde ROWS transaction'lık bir SQLite veritabanı oluşturur,
+iki yanıtı test client ile okur ve tracemalloc tepe değerlerini karşılaştırır.
+Akış yanıtı gövdeyi parça parça tüketir (gerçek bir istemci gibi).
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+workdir = tempfile.mkdtemp(prefix='ays_bench_')
+os.chdir(workdir)  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import api  # noqa: E402
+from database import Account, SessionLocal, Transaction  # noqa: E402
+
+session = SessionLocal()
+session.add(Account(name='Banka', type='BANK', balance=0))
+session.commit()
+base = datetime(2024, 1, 1)
+session.execute(Transaction.__table__.insert(), [
+    dict(account_id=1, type='INCOME', source='RENT', amount=1250, description=f'Aidat {i}',
+         is_canceled=False, created_at=base + timedelta(minutes=i), updated_at=base)
+    for i in range(ROWS)
+])
+session.commit()
+session.close()
+
+client = api.app.test_client()
+
+
+def measure(label, path, headers=None):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(path, headers=headers)
+    size = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:8.0f} ms  tepe {peak / 1e6:8.1f} MB  gövde {size / 1e6:6.1f} MB")
+    return peak
+
+
+print(f"Satır: {ROWS:,}\n")
+full = measure('tam liste', '/api/transactions')
+streamed = measure('?stream=1 (JSON dizi)', '/api/transactions?stream=1')
+measure('application/x-ndjson', '/api/transactions', {'Accept': 'application/x-ndjson'})
+print(f"\nTepe bellek oranı: {full / streamed:.1f}x")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Ödeme yazma hızı: 1, 4 ve 16 eşzamanlı istemci, WRITE_QUEUE açık/kapalı
+
+Her ölçüm ayrı bir alt süreçte, geçici bir SQLite veritabanına karşı çalışır
+(WRITE_QUEUE import sırasında okunur). İstemciler thread'lerdir ve
+POST /api/payments çağırır; hız yalnızca başarılı (201) ödemeleri sayar,
+başarısız yanıtlar ayrıca gösterilir.
+Kullanım: python bench_write_queue.py [istemci başına ödeme]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CLIENTS = (1, 4, 16)
+
+
+def worker(clients, per_client):
+    workdir = tempfile.mkdtemp(prefix="ays_bench_")
+    os.chdir(workdir)  # database.py lokal modda ./ays.db kullanır
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import api
+    from database import Account, Owner, Rent, SessionLocal
+
+    session = SessionLocal()
+    session.add(Account(name="Banka", type="BANK", balance=0))
+    session.add_all([Owner(full_name=f"Malik {i}", email=f"m{i}@x", password="x") for i in range(clients)])
+    session.flush()
+    total = clients * per_client
+    session.add_all([
+        Rent(owner_id=i % clients + 1, month=i % 12 + 1, year=2000 + i // 12, amount=100, status="UNPAID")
+        for i in range(total)
+    ])
+    session.commit()
+    session.close()
+
+    failures = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def pay(rent_id):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = api.app.test_client()
+        response = client.post("/api/payments", json={"rent_id": rent_id, "account_id": 1, "amount": 100})
+        if response.status_code != 201:
+            with lock:
+                failures.append(response.get_json().get("message"))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        list(executor.map(pay, range(1, total + 1)))
+    elapsed = time.perf_counter() - started
+
+    session = SessionLocal()
+    balance = float(session.query(Account.balance).scalar())
+    session.close()
+    queue = api.write_queue
+    print(json.dumps({
+        "per_sec": (total - len(failures)) / elapsed,
+        "failures": len(failures),
+        "first_failure": failures[0].splitlines()[0] if failures else None,
+        "balance_ok": balance == 100 * (total - len(failures)),
+        "avg_batch": queue.jobs / queue.batches if queue and queue.batches else None,
+    }))
+
+
+def main(per_client):
+    print(f"{'mod':<14}{'istemci':>8}{'başarılı/s':>12}{'hata':>7}{'ort. parti':>12}  bakiye")
+    for mode in ("false", "true"):
+        for clients in CLIENTS:
+            env = dict(os.environ, WRITE_QUEUE=mode, EVENTS_POLL_INTERVAL="5")
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", str(clients), str(per_client)],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(out)
+            label = "WRITE_QUEUE" if mode == "true" else "doğrudan"
+            batch = f"{result['avg_batch']:.1f}" if result["avg_batch"] else "-"
+            print(
+                f"{label:<14}{clients:>8}{result['per_sec']:>12.0f}{result['failures']:>7}{batch:>12}  "
+                f"{'✅' if result['balance_ok'] else '❌'}"
+                + (f"  ({result['first_failure']})" if result["first_failure"] else "")
+            )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        worker(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Idempotency-Key davranışını geçici bir SQLite veritabanında doğrula
+
+  - aynı anahtarla eşzamanlı gönderilen ödeme yalnızca bir kez yazılır,
+    diğerleri aynı yanıtı Idempotent-Replayed başlığıyla alır,
+  - anahtar farklı bir gövdeyle kullanılırsa 422 döner,
+  - başarısız (4xx) istek saklanmaz; aynı anahtarla yeniden denenebilir.
+WRITE_QUEUE=true ile kuyruk modu da sınanır.
+Kullanım: python check_idempotency.py [eşzamanlı tekrar sayısı]
+"""
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+DUPLICATES = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+os.chdir(tempfile.mkdtemp(prefix="ays_idempotency_"))  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import api  # noqa: E402
+from database import Account, IdempotencyKey, Owner, Payment, Rent, SessionLocal  # noqa: E402
+
+session = SessionLocal()
+session.add(Account(name="Banka", type="BANK", balance=0))
+session.add(Owner(full_name="Malik", email="malik@x", password="x"))
+session.flush()
+session.add_all([Rent(owner_id=1, month=month, year=2024, amount=100, status="UNPAID") for month in (1, 2)])
+session.commit()
+session.close()
+
+failures = []
+
+
+def post(body, key):
+    return api.app.test_client().post("/api/payments", json=body, headers={"Idempotency-Key": key})
+
+
+with ThreadPoolExecutor(8) as executor:
+    responses = list(executor.map(lambda _: post({"rent_id": 1, "account_id": 1, "amount": 100}, "odeme-1"), range(DUPLICATES)))
+
+session = SessionLocal()
+payments = session.query(Payment).count()
+balance = session.query(Account.balance).scalar()
+session.close()
+statuses = {r.status_code for r in responses}
+replayed = sum(1 for r in responses if r.headers.get("Idempotent-Replayed") == "true")
+print(f"{DUPLICATES} eşzamanlı tekrar: durumlar {statuses}, tekrar oynatılan {replayed}, ödeme {payments}, bakiye {balance}")
+if statuses != {201} or len({r.get_data() for r in responses}) != 1:
+    failures.append("tekrarlar aynı 201 yanıtını almadı")
+if replayed != DUPLICATES - 1:
+    failures.append(f"tekrar oynatılan {replayed} != {DUPLICATES - 1}")
+if payments != 1 or balance != 100:
+    failures.append(f"ödeme birden çok kez yazıldı: {payments} ödeme, bakiye {balance}")
+
+status = post({"rent_id": 2, "account_id": 1, "amount": 100}, "odeme-1").status_code
+print(f"Anahtar farklı gövdeyle: {status}")
+if status != 422:
+    failures.append(f"farklı gövde {status} döndü, 422 bekleniyordu")
+
+first = post({"rent_id": 99, "account_id": 1, "amount": 100}, "odeme-2")
+retry = post({"rent_id": 99, "account_id": 1, "amount": 100}, "odeme-2")
+print(f"Başarısız istek ve tekrarı: {first.status_code}, {retry.status_code} (replayed={retry.headers.get('Idempotent-Replayed')})")
+if retry.headers.get("Idempotent-Replayed"):
+    failures.append("başarısız yanıt saklandı")
+
+session = SessionLocal()
+keys = {key.key: key.status for key in session.query(IdempotencyKey)}
+session.close()
+if keys != {"odeme-1": "DONE"}:
+    failures.append(f"beklenmeyen anahtar satırları: {keys}")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print("✅ Idempotency-Key: tekrarlar bir kez yazıldı")
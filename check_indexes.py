@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Hot-path index'lerinin sorgu planına girdiğini doğrula (SQLite EXPLAIN QUERY PLAN)
+
+Boş bir bellek içi veritabanında önce yalnızca create_all ile, sonra
+migration'lar uygulanarak her sorgunun planı karşılaştırılır.
+"""
+import sys
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from migrations import run_migrations
+
+# (açıklama, sorgu, migration sonrası planda beklenen index)
+CHECKS = [
+    ("rents by owner", "SELECT id FROM rents WHERE owner_id = 1", "uq_rents_owner_period"),
+    ("unpaid rents total", "SELECT count(id), sum(amount) FROM rents WHERE status = 'UNPAID'", "ix_rents_unpaid"),
+    ("monthly collection",
+     "SELECT sum(amount) FROM payments WHERE is_cancelled = 0 AND payment_date >= '2025-01-01'",
+     "ix_payments_date_id"),
+    ("payments by rent", "SELECT id FROM payments WHERE rent_id = 1", "ix_payments_rent_id"),
+    ("transaction lookup by source",
+     "SELECT id FROM transactions WHERE source = 'RENT' AND related_id = 1 AND is_canceled = 0",
+     "ix_transactions_source_related"),
+    ("account statement",
+     "SELECT id FROM transactions WHERE account_id = 1 ORDER BY created_at DESC",
+     "ix_transactions_account_created"),
+    ("expense listing", "SELECT id FROM expenses ORDER BY expense_date DESC, id DESC LIMIT 50", "ix_expenses_date_id"),
+    ("rent page",
+     "SELECT id FROM rents WHERE (year, month, id) < (2025, 3, 900) ORDER BY year DESC, month DESC, id DESC LIMIT 100",
+     "ix_rents_period"),
+    ("payment page",
+     "SELECT id FROM payments WHERE (payment_date, id) < ('2025-03-01', 900) "
+     "ORDER BY payment_date DESC, id DESC LIMIT 100",
+     "ix_payments_date_id"),
+    ("owner payment page",
+     "SELECT id FROM payments WHERE owner_id = 7 AND (payment_date, id) < ('2025-03-01', 900) "
+     "ORDER BY payment_date DESC, id DESC LIMIT 100",
+     "ix_payments_owner_date"),
+    ("transaction page",
+     "SELECT id FROM transactions WHERE (created_at, id) < ('2025-03-01', 900) "
+     "ORDER BY created_at DESC, id DESC LIMIT 100",
+     "ix_transactions_created_id"),
+    ("account expense page",
+     "SELECT id FROM expenses WHERE account_id = 2 AND (expense_date, id) < ('2025-03-01', 900) "
+     "ORDER BY expense_date DESC, id DESC LIMIT 100",
+     "ix_expenses_account_date"),
+    ("unpaid rent page",
+     "SELECT rents.id, owners.full_name FROM rents JOIN owners ON owners.id = rents.owner_id "
+     "WHERE rents.status = 'UNPAID' AND rents.due_date IS NOT NULL AND (rents.due_date, rents.id) > ('2025-03-01', 900) "
+     "ORDER BY rents.due_date, rents.id LIMIT 51",
+     "ix_rents_unpaid_due"),
+    ("dashboard chart months",
+     "SELECT account_id, income, expense FROM account_monthly_totals WHERE (year, month) >= (2024, 6) AND (year, month) <= (2025, 5)",
+     "ix_account_monthly_totals_period"),
+]
+
+
+def plan(conn, sql):
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Base.metadata.create_all(engine)
+
+with engine.connect() as conn:
+    before = {name: plan(conn, sql) for name, sql, _ in CHECKS}
+
+run_migrations(engine)
+
+failed = 0
+with engine.connect() as conn:
+    for name, sql, index in CHECKS:
+        after = plan(conn, sql)
+        ok = index in after
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {name}")
+        print(f"     önce : {before[name]}")
+        print(f"     sonra: {after}")
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""Hesap mutabakatı (reconcile.py): fark tespiti, kontrol noktaları ve paralel tarama
+
+Geçici bir SQLite veritabanında:
+  1. Yazan thread'ler API üzerinden gelir, gider, transfer, ödeme, gider
+     düzenleme/silme ve iptaller yaparken mutabakat tekrar tekrar çalışır;
+     tek anlık görüntüden okunduğu için hiçbir çalıştırma fark bulmamalı.
+  2. İlk çalıştırma FULL, değişiklik yoksa sonraki INCREMENTAL; eski bir
+     satırın iptali ve giderin başka hesaba taşınması ilgili hesapları baştan
+     taratır. Pasif hesaptaki gider silindiğinde bakiye iade edilir (fark yok).
+  3. Bakiyeye yansımamış bir hareket (doğrudan eklenen satır) fark olarak
+     bulunur, sorumlu hareket ilk sırada önerilir; sonraki çalıştırmada öneri
+     korunur, bakiye düzeltilince fark kapanır.
+  4. HISTORY satırlık iki yıllık geçmişte tam tarama ile artımlı tarama süresi
+     karşılaştırılır; geçen yıl kapatılınca hesaplar açılış bakiyesinden
+     yeniden taranır ve fark çıkmaz.
+WRITE_QUEUE=true ve LEDGER_MODE=true ile diğer yazma modları da sınanır.
+Kullanım: python check_reconcile.py [API işlemi] [geçmiş hareket sayısı]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+OPERATIONS = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+HISTORY = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+THREADS = 6
+ACCOUNTS = 8
+SLACK_SECONDS = 1
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+os.environ["RECONCILE_SLACK_SECONDS"] = str(SLACK_SECONDS)
+os.chdir(tempfile.mkdtemp(prefix="ays_reconcile_"))  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text  # noqa: E402
+
+import api  # noqa: E402
+import reconcile  # noqa: E402
+import rollups  # noqa: E402
+from database import Category, Owner, Rent, SessionLocal, Transaction, engine  # noqa: E402
+
+api.app.logger.setLevel(logging.CRITICAL)
+client = api.app.test_client()
+random.seed(5)
+failures = []
+
+
+def settle():
+    # Son eklenen satırlar kontrol noktasına girsin
+    time.sleep(SLACK_SECONDS + 0.1)
+
+
+def drifted(results):
+    return {result["account_id"]: result for result in results if result["drift"]}
+
+
+def modes(results):
+    return {result["account_id"]: (result["mode"], result["reason"]) for result in results}
+
+
+for i in range(ACCOUNTS):
+    assert client.post("/api/accounts", json={"name": f"Hesap {i}", "type": "BANK", "balance": 50_000}).status_code == 201
+session = SessionLocal()
+session.add_all([Category(name=f"Gider {i}", category_type="EXPENSE") for i in range(3)])
+session.add_all([Owner(full_name=f"Malik {i}", email=f"m{i}@x", password="x", unit_name=f"D{i}") for i in range(30)])
+session.commit()
+session.close()
+this_year = datetime.utcnow().year
+for month in range(1, 7):
+    assert client.post("/api/rents/bulk", json={"month": month, "year": this_year, "amount": 100}).status_code == 201
+session = SessionLocal()
+open_rents = [rent_id for (rent_id,) in session.query(Rent.id).order_by(Rent.id)]
+session.close()
+random.shuffle(open_rents)
+rent_lock = threading.Lock()
+
+
+def operation(n):
+    kind = random.random()
+    account = random.randint(1, ACCOUNTS)
+    other = account % ACCOUNTS + 1
+    if kind < 0.2:
+        return client.post("/api/transactions/income", json={"account_id": account, "amount": random.randint(1, 300)})
+    if kind < 0.3:
+        return client.post("/api/transactions/expense", json={"account_id": account, "amount": random.randint(1, 300)})
+    if kind < 0.45:
+        return client.post("/api/transactions/transfer", json={
+            "source_account_id": account, "target_account_id": other, "amount": random.randint(1, 300),
+        })
+    if kind < 0.6:
+        with rent_lock:
+            rent_id = open_rents.pop() if open_rents else None
+        if rent_id:
+            return client.post("/api/payments", json={
+                "rent_id": rent_id, "account_id": account, "amount": 100, "late_fee_amount": random.choice((0, 5)),
+            })
+    if kind < 0.75:
+        return client.post("/api/expenses", json={
+            "name": f"Gider {n}", "category_id": random.randint(1, 3), "account_id": account,
+            "amount": random.randint(1, 200),
+        })
+    if kind < 0.82:
+        return client.put(f"/api/expenses/{random.randint(1, n // 6 + 1)}", json={
+            "amount": random.randint(1, 200), "account_id": random.randint(1, ACCOUNTS),
+        })
+    if kind < 0.87:
+        return client.delete(f"/api/expenses/{random.randint(1, n // 6 + 1)}")
+    if kind < 0.93:
+        return client.put(f"/api/payments/{random.randint(1, n // 6 + 1)}/cancel", json={})
+    return client.delete(f"/api/transactions/{random.randint(1, n + 1)}")
+
+
+# --- 1. Yazarken mutabakat ---
+stop = threading.Event()
+concurrent_runs = []
+
+
+def reconcile_loop():
+    while not stop.is_set():
+        concurrent_runs.append(reconcile.run())
+
+
+started = time.perf_counter()
+checker = threading.Thread(target=reconcile_loop)
+checker.start()
+with ThreadPoolExecutor(THREADS) as executor:
+    statuses = Counter(response.status_code for response in executor.map(operation, range(OPERATIONS)))
+stop.set()
+checker.join()
+print(f"{OPERATIONS} API işlemi + {len(concurrent_runs)} eşzamanlı mutabakat: "
+      f"{time.perf_counter() - started:.1f} s, durumlar {dict(statuses)}")
+if statuses[500]:
+    failures.append(f"{statuses[500]} istek 500 döndü")
+for results in concurrent_runs:
+    if drifted(results):
+        failures.append(f"yazarken fark bulundu: {[(r['account_id'], str(r['drift'])) for r in drifted(results).values()]}")
+        break
+
+# --- 2. Kontrol noktaları ---
+results = reconcile.run(full=True)
+if drifted(results) or any(result["mode"] != reconcile.FULL for result in results):
+    failures.append(f"tam tarama: {modes(results)}, farklar {list(drifted(results))}")
+settle()
+reconcile.run()
+results = reconcile.run()
+if drifted(results) or set(modes(results).values()) != {(reconcile.INCREMENTAL, None)}:
+    failures.append(f"değişiklik yokken: {modes(results)}, farklar {list(drifted(results))}")
+print(f"Eşzamanlılık sonrası: {len(results)} hesap tutarlı, ikinci çalıştırma artımlı")
+
+session = SessionLocal()
+old_tx = session.query(Transaction.id, Transaction.account_id).filter(
+    Transaction.is_canceled == False, Transaction.source == "MANUAL", Transaction.type == "INCOME",
+).order_by(Transaction.id).first()
+session.close()
+assert client.delete(f"/api/transactions/{old_tx.id}").status_code == 200
+created = client.post("/api/expenses", json={"name": "Taşınan", "category_id": 1, "account_id": 1, "amount": 10})
+settle()
+reconcile.run()
+moved = client.put(f"/api/expenses/{created.get_json()['expense']['id']}", json={"account_id": 2, "amount": 12})
+assert moved.status_code == 200, moved.get_json()
+results = reconcile.run()
+reasons = modes(results)
+print(f"Eski satır iptali ve hesap değiştiren gider sonrası: {reasons[1]}, {reasons[2]}")
+if drifted(results):
+    failures.append(f"iptal/taşıma sonrası fark: {list(drifted(results))}")
+if reasons[1] != (reconcile.FULL, "changed"):
+    failures.append(f"giderin taşındığı eski hesap baştan taranmadı: {reasons[1]}")
+
+# Pasif hesaptaki gider silinir: bakiye iade edilmeli
+inactive = ACCOUNTS
+expense = client.post("/api/expenses", json={"name": "Pasif", "category_id": 1, "account_id": inactive, "amount": 75})
+settle()
+reconcile.run()
+assert client.delete(f"/api/accounts/{inactive}").status_code == 200
+deleted = client.delete(f"/api/expenses/{expense.get_json()['expense']['id']}")
+results = reconcile.run()
+print(f"Pasif hesaptaki gider silindi ({deleted.status_code}): fark {drifted(results).get(inactive, {}).get('drift', 0)}")
+if drifted(results):
+    failures.append(f"pasif hesaptaki gider silinince fark: {[(r['account_id'], str(r['drift'])) for r in drifted(results).values()]}")
+
+# --- 3. Bakiyeye yansımamış hareket ---
+with engine.begin() as conn:
+    conn.execute(Transaction.__table__.insert(), [{
+        "account_id": 3, "type": "INCOME", "source": "MANUAL", "amount": 42.17, "is_canceled": False,
+        "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+    }])
+    rogue = conn.execute(text("SELECT max(id) FROM transactions")).scalar()
+results = drifted(reconcile.run())
+found = results.get(3)
+print(f"Bakiyeye yansımamış hareket #{rogue}: fark {found and found['drift']}, "
+      f"şüpheliler {found and found['suspect_transaction_ids'][:3]}")
+if set(results) != {3} or found["drift"] != -reconcile._decimal("42.17"):
+    failures.append(f"eksik bakiye güncellemesi bulunamadı: {[(r['account_id'], str(r['drift'])) for r in results.values()]}")
+elif found["suspect_transaction_ids"][:1] != [rogue]:
+    failures.append(f"sorumlu hareket önerilmedi: {found['suspect_transaction_ids']}")
+settle()
+client.post("/api/transactions/income", json={"account_id": 3, "amount": 5})
+again = drifted(reconcile.run()).get(3)
+if not again or again["suspect_transaction_ids"][:1] != [rogue]:
+    failures.append(f"sonraki çalıştırmada sorumlu hareket kayboldu: {again and again['suspect_transaction_ids']}")
+response = client.get("/api/admin/reconcile")
+if response.get_json()["drifted"] != 1:
+    failures.append(f"GET /api/admin/reconcile farkı göstermedi: {response.get_json()['drifted']}")
+with engine.begin() as conn:
+    conn.execute(text("UPDATE accounts SET balance = balance + 42.17 WHERE id = 3"))
+response = client.post("/api/admin/reconcile", json={"account_ids": [3]})
+if response.status_code != 200 or response.get_json()["drifted"]:
+    failures.append(f"bakiye düzeltilince fark kapanmadı: {response.get_json()}")
+
+# --- 4. Geçmiş: tam / artımlı tarama ve yıl kapanışı ---
+last_year = this_year - 1
+rows = []
+net = Counter()
+for i in range(HISTORY):
+    account = 1 + i % (ACCOUNTS - 1)
+    tx_type = ("INCOME", "EXPENSE", "TRANSFER")[i % 3]
+    amount = 1 + i % 9
+    year = last_year if i < HISTORY * 2 // 3 else this_year
+    rows.append({
+        "account_id": account, "related_account": account % (ACCOUNTS - 1) + 1 if tx_type == "TRANSFER" else None,
+        "type": tx_type, "source": "MANUAL", "amount": amount, "is_canceled": False,
+        "created_at": datetime(year, 1 + i % 12 if year == last_year else 1, 1 + i % 28, 8),
+    })
+    rows[-1]["updated_at"] = rows[-1]["created_at"]
+    net[account] += amount if tx_type == "INCOME" else -amount
+    if tx_type == "TRANSFER":
+        net[rows[-1]["related_account"]] += amount
+with engine.begin() as conn:
+    conn.execute(Transaction.__table__.insert(), rows)
+    for account, delta in net.items():
+        conn.execute(text("UPDATE accounts SET balance = balance + :delta WHERE id = :id"), {"delta": delta, "id": account})
+session = SessionLocal()
+rollups.rebuild(session)
+session.commit()
+session.close()
+
+started = time.perf_counter()
+results = reconcile.run(full=True)
+full_ms = (time.perf_counter() - started) * 1000
+settle()
+reconcile.run()
+for i in range(20):
+    client.post("/api/transactions/income", json={"account_id": 1 + i % 4, "amount": 3})
+settle()
+started = time.perf_counter()
+incremental = reconcile.run()
+incremental_ms = (time.perf_counter() - started) * 1000
+print(f"{HISTORY:,} geçmiş hareket, {ACCOUNTS} hesap, {reconcile.RECONCILE_WORKERS} worker: "
+      f"tam tarama {full_ms:.0f} ms, artımlı {incremental_ms:.0f} ms")
+if drifted(results) or drifted(incremental):
+    failures.append(f"geçmiş eklenince fark: {list(drifted(results))} / {list(drifted(incremental))}")
+if {result["mode"] for result in incremental} != {reconcile.INCREMENTAL}:
+    failures.append(f"artımlı çalıştırma baştan taradı: {modes(incremental)}")
+if incremental_ms * 3 > full_ms:
+    failures.append(f"artımlı tarama tam taramadan belirgin hızlı değil ({incremental_ms:.0f} / {full_ms:.0f} ms)")
+
+closed = client.post("/api/year-end/close", json={"year": last_year})
+if closed.status_code != 200:
+    failures.append(f"{last_year} kapatılamadı: {closed.get_json()}")
+results = reconcile.run()
+print(f"{last_year} kapatıldı: {Counter(result['reason'] for result in results)}")
+if drifted(results):
+    failures.append(f"yıl kapanışı sonrası fark: {[(r['account_id'], str(r['drift'])) for r in drifted(results).values()]}")
+if {result["reason"] for result in results} != {"year_closed"}:
+    failures.append(f"yıl kapanışı hesapları baştan taratmadı: {modes(results)}")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print("✅ Mutabakat yazarken tutarlı, farkı ve sorumlu hareketi buluyor, artımlı çalışıyor")
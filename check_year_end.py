@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""Yıl sonu kapanışını geçici bir SQLite veritabanında doğrula
+
+İki geçmiş yıllık veri (aidat, ödeme, gider, kasa hareketi; ödenmemiş aidatlar
+ve ertesi yıl ödenen aidatlar dahil) eklenir, geçen yıl kapatılır (daha eski
+yıl da onunla kapanır). Denetlenenler:
+  - kapalı yılın yıl sonu özeti ve /api/reports/summary kapanıştan önceki
+    değerlerle aynı; özet closed_years anlık görüntüsünden okunur,
+  - sıcak tablolarda kapalı yıla ait yalnızca açık kalemler (ödenmemiş ya da
+    ödemesi açık yılda olan aidatlar) kalır; sıcak + arşiv = önceki satırlar,
+  - arşivlenen satırlar /api/sync'te silinmiş (tombstone) olarak bildirilir,
+  - hesap bakiyeleri değişmez ve açılış bakiyesi + sıcak hareketlere eşittir;
+    owner_balances ve rapor özetleri yeniden üretildiğinde aynı kalır,
+  - kapalı yıla kayıt eklenemez/değiştirilemez; eski aidat bugün ödenebilir,
+  - aynı yıl ikinci kez ya da içinde bulunulan yıl kapatılamaz.
+WRITE_QUEUE=true ve LEDGER_MODE=true ile diğer yazma modları da sınanır.
+Kullanım: python check_year_end.py [daire sayısı]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+UNITS = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+os.chdir(tempfile.mkdtemp(prefix="ays_year_end_"))  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func, select  # noqa: E402
+
+import api  # noqa: E402
+import rollups  # noqa: E402
+from database import (  # noqa: E402
+    ARCHIVE_TABLES, Account, AccountOpeningBalance, Category, Expense, Owner, OwnerBalance, Payment, Rent,
+    SessionLocal, Transaction, engine, rebuild_owner_balances,
+)
+from ledger import live_balances  # noqa: E402
+
+api.app.logger.setLevel(logging.CRITICAL)
+client = api.app.test_client()
+now = datetime.utcnow()
+THIS_YEAR = now.year
+OLD, LAST = THIS_YEAR - 2, THIS_YEAR - 1
+HOT = {"transactions": Transaction, "payments": Payment, "rents": Rent, "expenses": Expense}
+
+# --- Geçmiş iki yıl (Core ile) ---
+session = SessionLocal()
+session.add_all([Account(name="Banka", type="BANK", balance=0), Account(name="Kasa", type="CASH", balance=0)])
+session.add(Category(name="Bakım", category_type="EXPENSE"))
+session.add_all([Owner(full_name=f"Malik {i}", email=f"m{i}@x", password="x", unit_name=f"D{i}") for i in range(UNITS)])
+session.commit()
+session.close()
+
+with engine.begin() as conn:
+    rents, tx_rows, expenses = [], [], []
+    for year in (OLD, LAST):
+        for month in range(1, 13):
+            for owner_id in range(1, UNITS + 1):
+                rents.append({"owner_id": owner_id, "year": year, "month": month, "amount": 100,
+                              "due_date": datetime(year, month, 10), "status": "UNPAID", "late_fee": 0})
+            tx_rows.append({"account_id": 2, "type": "INCOME", "source": "MANUAL", "amount": 40,
+                            "is_canceled": False, "created_at": datetime(year, month, 3)})
+            tx_rows.append({"account_id": 1, "related_account": 2, "type": "TRANSFER", "source": "TRANSFER",
+                            "amount": 25, "is_canceled": month == 6, "created_at": datetime(year, month, 4)})
+            expenses.append({"name": "Asansör", "category_id": 1, "account_id": 1, "amount": 70,
+                             "expense_date": datetime(year, month, 5), "created_at": datetime(year, month, 5)})
+    conn.execute(Rent.__table__.insert(), rents)
+    conn.execute(Expense.__table__.insert(), expenses)
+    payments = []
+    for rent_id, owner_id, year, month in conn.execute(select(Rent.id, Rent.owner_id, Rent.year, Rent.month)):
+        # Her yedinci malik ödemiyor; geçen yılın Aralık aidatları bu yıl ödenecek
+        if owner_id % 7 == 0 or (year == LAST and month == 12):
+            continue
+        paid_at = datetime(year, month, 15)
+        payments.append({"rent_id": rent_id, "owner_id": owner_id, "account_id": 1, "amount": 100,
+                         "late_fee_amount": 5 if month == 1 else 0, "payment_date": paid_at, "created_at": paid_at,
+                         "is_cancelled": owner_id == 1 and month == 2})
+    conn.execute(Payment.__table__.insert(), payments)
+    conn.execute(Rent.__table__.update().where(
+        Rent.id.in_([p["rent_id"] for p in payments if not p["is_cancelled"]])
+    ).values(status="PAID"))
+    for payment_id, amount, late_fee, paid_at, cancelled in conn.execute(select(
+        Payment.id, Payment.amount, Payment.late_fee_amount, Payment.payment_date, Payment.is_cancelled
+    )):
+        tx_rows.append({"account_id": 1, "type": "INCOME", "source": "RENT", "related_id": payment_id,
+                        "amount": amount + late_fee, "is_canceled": cancelled, "created_at": paid_at})
+    for (expense_id, amount, spent_at) in conn.execute(select(Expense.id, Expense.amount, Expense.expense_date)):
+        tx_rows.append({"account_id": 1, "type": "EXPENSE", "source": "EXPENSE", "related_id": expense_id,
+                        "amount": amount, "is_canceled": False, "created_at": spent_at})
+    conn.execute(Transaction.__table__.insert(), tx_rows)
+
+session = SessionLocal()
+rollups.rebuild(session)
+rebuild_owner_balances(session)
+for account in session.query(Account):
+    # Hesap bakiyesi = geçmiş hareketlerin etkisi
+    account.balance = sum(
+        (tx.amount if tx.type == "INCOME" or (tx.type == "TRANSFER" and tx.related_account == account.id) else -tx.amount)
+        for tx in session.query(Transaction).filter(
+            Transaction.is_canceled == False,
+            (Transaction.account_id == account.id) | (Transaction.related_account == account.id),
+        )
+    )
+session.commit()
+session.close()
+
+# --- Bu yılın hareketleri (API) ---
+failures = []
+
+
+def expect(response, status, what):
+    if response.status_code != status:
+        failures.append(f"{what}: {response.status_code} döndü, {status} bekleniyordu ({response.get_json()})")
+    return response
+
+
+expect(client.post("/api/transactions/income", json={"account_id": 2, "amount": 300}), 201, "bu yıl gelir")
+session = SessionLocal()
+december = [rent_id for (rent_id,) in session.query(Rent.id).filter(Rent.year == LAST, Rent.month == 12, Rent.owner_id <= 5)]
+session.close()
+for rent_id in december:
+    expect(client.post("/api/payments", json={"rent_id": rent_id, "account_id": 1, "amount": 100}), 201, "Aralık ödemesi")
+# Bu yıl girilen ama tarihi geçen yıla düşen gider: kapanıştan sonra değiştirilemez
+backdated = expect(client.post("/api/expenses", json={
+    "name": "Geç fatura", "category_id": 1, "account_id": 1, "amount": 30, "date": f"{LAST}-12-28",
+}), 201, "geriye tarihli gider").get_json()
+
+
+def state():
+    session = SessionLocal()
+    try:
+        accounts = [account_id for (account_id,) in session.query(Account.id)]
+        return {
+            "balances": live_balances(session, accounts),
+            "owners": {row.owner_id: (row.charged, row.paid, row.late_fees) for row in session.query(OwnerBalance)},
+            "rows": {name: session.query(func.count()).select_from(model).scalar() for name, model in HOT.items()},
+        }
+    finally:
+        session.close()
+
+
+SUMMARY_FIELDS = ("total_income", "total_expense", "net_balance", "charged", "paid_rents", "late_fees",
+                  "unpaid_rents", "unpaid_count", "total_balance", "total_debt", "accounts")
+before = state()
+summaries = {year: client.get(f"/api/year-end/summary/{year}").get_json() for year in (OLD, LAST)}
+reports = {year: client.get(f"/api/reports/summary?year={year}").get_json() for year in (OLD, LAST)}
+print(f"Kapanış öncesi sıcak satırlar: {before['rows']}")
+print(f"{LAST} özeti (canlı): " + ", ".join(f"{k}={summaries[LAST][k]}" for k in SUMMARY_FIELDS[:-1]))
+
+# --- Kapanış ---
+expect(client.post("/api/year-end/close", json={"year": THIS_YEAR}), 400, "içinde bulunulan yılı kapatma")
+sync_watermark = client.get("/api/sync").get_json()["watermark"]
+started = time.perf_counter()
+response = expect(client.post("/api/year-end/close", json={"year": LAST}), 200, "kapanış")
+print(f"\nPOST /api/year-end/close: {(time.perf_counter() - started) * 1000:.0f} ms → {response.get_json()['archived']}")
+if response.get_json().get("closed_years") != [OLD, LAST]:
+    failures.append(f"kapatılan yıllar {response.get_json().get('closed_years')} != {[OLD, LAST]}")
+expect(client.post("/api/year-end/close", json={"year": LAST}), 409, "aynı yılı tekrar kapatma")
+expect(client.post("/api/year-end/close", json={"year": OLD}), 409, "önceki yılı tekrar kapatma")
+
+after = state()
+print(f"Kapanış sonrası sıcak satırlar: {after['rows']}")
+for year in (OLD, LAST):
+    closed = client.get(f"/api/year-end/summary/{year}").get_json()
+    if not closed["closed"] or closed["archived"] is None:
+        failures.append(f"{year} özeti kapalı yıl anlık görüntüsünden gelmedi")
+    changed = {k: (summaries[year][k], closed[k]) for k in SUMMARY_FIELDS if summaries[year][k] != closed[k]}
+    if changed:
+        failures.append(f"{year} yıl sonu özeti kapanışla değişti: {changed}")
+    if client.get(f"/api/reports/summary?year={year}").get_json() != reports[year]:
+        failures.append(f"{year} rapor özeti kapanışla değişti")
+
+session = SessionLocal()
+archived = {name: session.execute(select(func.count()).select_from(ARCHIVE_TABLES[name])).scalar() for name in HOT}
+if any(before["rows"][name] != after["rows"][name] + archived[name] for name in HOT):
+    failures.append(f"sıcak + arşiv satırları kapanış öncesiyle tutmuyor: {after['rows']} + {archived} != {before['rows']}")
+# Artımlı eşitleyen istemci arşivlenen satırları tombstone olarak almalı
+synced = client.get("/api/sync", query_string={"since": sync_watermark}).get_json()["deleted"]
+for name in HOT:
+    archived_ids = {row_id for (row_id,) in session.execute(select(ARCHIVE_TABLES[name].c.id))}
+    if not archived_ids <= set(synced.get(name, [])):
+        failures.append(f"/api/sync arşivlenen {name} satırlarını silinmiş bildirmedi "
+                        f"({len(archived_ids - set(synced.get(name, [])))} eksik)")
+start = datetime(THIS_YEAR, 1, 1)
+leftovers = {
+    "transactions": session.query(Transaction).filter(Transaction.created_at < start).count(),
+    "payments": session.query(Payment).filter(Payment.payment_date < start, Payment.created_at < start).count(),
+    "expenses": session.query(Expense).filter(Expense.expense_date < start, Expense.created_at < start).count(),
+    "rents": session.query(Rent).filter(
+        Rent.year < THIS_YEAR, Rent.status != "UNPAID", ~Rent.id.in_(select(Payment.rent_id))
+    ).count(),
+}
+if any(leftovers.values()):
+    failures.append(f"kapalı yıl satırları sıcak tablolarda kaldı: {leftovers}")
+carried = session.query(Rent).filter(Rent.year < THIS_YEAR).count()
+print(f"Sıcak tabloda kalan eski aidat (açık kalem): {carried}")
+
+if after["balances"] != before["balances"]:
+    failures.append(f"hesap bakiyeleri değişti: {before['balances']} → {after['balances']}")
+openings = dict(session.query(AccountOpeningBalance.account_id, AccountOpeningBalance.balance).filter(
+    AccountOpeningBalance.year == THIS_YEAR
+))
+for account_id, balance in after["balances"].items():
+    effect = sum(
+        (tx.amount if tx.type == "INCOME" or (tx.type == "TRANSFER" and tx.related_account == account_id) else -tx.amount)
+        for tx in session.query(Transaction).filter(
+            Transaction.is_canceled == False,
+            (Transaction.account_id == account_id) | (Transaction.related_account == account_id),
+        )
+    )
+    if openings.get(account_id, 0) + effect != balance:
+        failures.append(f"hesap {account_id}: açılış {openings.get(account_id)} + hareketler {effect} != bakiye {balance}")
+
+rebuild_owner_balances(session)
+session.commit()
+rebuilt = {row.owner_id: (row.charged, row.paid, row.late_fees) for row in session.query(OwnerBalance)}
+if rebuilt != before["owners"]:
+    diff = {k: (before["owners"].get(k), rebuilt.get(k)) for k in set(rebuilt) | set(before["owners"])
+            if before["owners"].get(k) != rebuilt.get(k)}
+    failures.append(f"owner_balances yeniden üretilince değişti: {list(diff.items())[:3]}")
+drift = rollups.check(session)
+rollups.rebuild(session)
+session.commit()
+drift_after_rebuild = rollups.check(session)
+session.close()
+if any(drift.values()) or any(drift_after_rebuild.values()):
+    failures.append(f"rapor özetleri açık yılda tutarsız: {drift}")
+if client.get(f"/api/reports/summary?year={LAST}").get_json() != reports[LAST]:
+    failures.append("rebuild-rollups kapalı yılın rapor özetini değiştirdi")
+
+# --- Kapalı yıl koruması ---
+session = SessionLocal()
+old_unpaid = session.query(Rent.id).filter(Rent.year == OLD, Rent.status == "UNPAID").first()[0]
+last_unpaid = session.query(Rent.id).filter(Rent.year == LAST, Rent.month == 12, Rent.status == "UNPAID").first()[0]
+session.close()
+blocked = [
+    ("kapalı yıla gider", client.post("/api/expenses", json={
+        "name": "Eski", "category_id": 1, "account_id": 1, "amount": 10, "date": f"{LAST}-03-01"})),
+    ("kapalı yıla geriye tarihli ödeme", client.post("/api/payments", json={
+        "rent_id": last_unpaid, "account_id": 1, "amount": 100, "payment_date": f"{LAST}-12-20"})),
+    ("kapalı yıla aidat", client.post("/api/rents", json={"owner_id": 1, "year": OLD, "month": 1, "amount": 1})),
+    ("kapalı yıla toplu aidat", client.post("/api/rents/bulk", json={"year": LAST, "month": 1, "amount": 1})),
+    ("kapalı yıl aidatının tutarı", client.put(f"/api/rents/{old_unpaid}", json={"amount": 120})),
+    ("kapalı yıl aidatını silme", client.delete(f"/api/rents/{old_unpaid}")),
+    ("kapalı yıla tarihli gideri düzenleme", client.put(f"/api/expenses/{backdated['expense']['id']}", json={"amount": 31})),
+    ("kapalı yıla tarihli gideri silme", client.delete(f"/api/expenses/{backdated['expense']['id']}")),
+]
+for what, response in blocked:
+    if response.status_code < 400 or "kapatıldı" not in (response.get_json() or {}).get("message", ""):
+        failures.append(f"{what} engellenmedi: {response.status_code} {response.get_json()}")
+print(f"Kapalı yıla yazma denemeleri: {[response.status_code for _, response in blocked]}")
+
+paid = expect(client.post("/api/payments", json={"rent_id": old_unpaid, "account_id": 1, "amount": 100}),
+              201, "eski aidatı bugün ödeme").get_json()
+if paid.get("payment"):
+    expect(client.put(f"/api/payments/{paid['payment']['id']}/cancel", json={}), 200, "bugünkü ödemeyi iptal")
+expect(client.post("/api/transactions/income", json={"account_id": 1, "amount": 10}), 201, "kapanış sonrası gelir")
+if state()["balances"][1] != before["balances"][1] + 10:
+    failures.append("kapanış sonrası yazmalar bakiyeye yanlış yansıdı")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print(f"✅ {OLD}-{LAST} kapatıldı: özetler ve bakiyeler korundu, kapalı yıllar yazmaya kapalı")
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 import os
+import threading
+import time
 from datetime import datetime
+from decimal import Decimal
 from sqlalchemy import (
   create_engine,
+  event,
+  exc,
+  select,
+  update,
   Column,
   Integer,
   String,
@@ -12,25 +19,192 @@ from sqlalchemy import (
   ForeignKey,
   Numeric,
   Text,
+  Index,
+  Table,
+  text,
 )
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.pool import QueuePool
 from werkzeug.security import generate_password_hash
 
-# SQLite - PythonAnywhere uyumlu
-import os
-# PythonAnywhere için tam path, lokal için relatif
-if os.path.exists('/home/SerkanEFE'):
+def _database_url():
+  url = os.environ.get("DATABASE_URL")
+  if url:
+    # Render/Heroku "postgres://" verir; SQLAlchemy yalnızca "postgresql://" kabul eder
+    if url.startswith("postgres://"):
+      url = "postgresql://" + url[len("postgres://"):]
+    return url
+  # SQLite - PythonAnywhere uyumlu
+  # PythonAnywhere için tam path, lokal için relatif
+  if os.path.exists('/home/SerkanEFE'):
     # PythonAnywhere
-    DATABASE_URL = "sqlite:////home/SerkanEFE/ays.db"
-else:
-    # Lokal
-    DATABASE_URL = "sqlite:///./ays.db"
-engine = create_engine(
-  DATABASE_URL,
-  connect_args={"check_same_thread": False},
-  echo=False,
-)
+    return "sqlite:////home/SerkanEFE/ays.db"
+  # Lokal
+  return "sqlite:///./ays.db"
+
+
+DATABASE_URL = _database_url()
+
+# Havuz ayarları (QueuePool): gthread worker başına thread sayısı kadar bağlantı
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+# Bu süreden uzun bekleyen checkout'lar yavaş sayılır (ms)
+DB_POOL_SLOW_CHECKOUT_MS = float(os.environ.get("DB_POOL_SLOW_CHECKOUT_MS", "100"))
+
+# SQLite bağlantı ayarları
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "16384"))
+
+
+class _PoolMetrics:
+  """Checkout bekleme süreleri; /api/health/db üzerinden okunur"""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.checkouts = 0
+    self.slow_checkouts = 0
+    self.timeouts = 0
+    self.wait_total = 0.0
+    self.wait_max = 0.0
+
+  def record(self, waited, timed_out):
+    with self._lock:
+      self.checkouts += 1
+      self.wait_total += waited
+      self.wait_max = max(self.wait_max, waited)
+      if waited * 1000 >= DB_POOL_SLOW_CHECKOUT_MS:
+        self.slow_checkouts += 1
+      if timed_out:
+        self.timeouts += 1
+
+  def snapshot(self):
+    with self._lock:
+      return {
+        "checkouts": self.checkouts,
+        "slow_checkouts": self.slow_checkouts,
+        "timeouts": self.timeouts,
+        "wait_avg_ms": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+        "wait_max_ms": round(self.wait_max * 1000, 3),
+      }
+
+
+pool_metrics = _PoolMetrics()
+_checkout_state = threading.local()
+
+
+class InstrumentedQueuePool(QueuePool):
+  """Havuzdan bağlantı alırken geçen bekleme süresini ölçen QueuePool"""
+
+  def _do_get(self):
+    if getattr(_checkout_state, "active", False):
+      # QueuePool taşma yarışında kendini yeniden çağırır; tek checkout say
+      return super()._do_get()
+    _checkout_state.active = True
+    started = time.perf_counter()
+    timed_out = False
+    try:
+      return super()._do_get()
+    except exc.TimeoutError:
+      timed_out = True
+      raise
+    finally:
+      _checkout_state.active = False
+      pool_metrics.record(time.perf_counter() - started, timed_out)
+
+
+def _create_engine(url):
+  if url.startswith("sqlite"):
+    if url in ("sqlite://", "sqlite:///:memory:"):
+      return create_engine(url, connect_args={"check_same_thread": False}, echo=False)
+    options = {"connect_args": {"check_same_thread": False}}
+  else:
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+  return create_engine(
+    url,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    echo=False,
+    **options,
+  )
+
+
+engine = _create_engine(DATABASE_URL)
+
+
+if engine.dialect.name == "sqlite":
+  @event.listens_for(engine, "connect")
+  def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+      # WAL: okuyucular yazarı beklemez; NORMAL WAL'da commit başına fsync'i kaldırır
+      cursor.execute("PRAGMA journal_mode=WAL")
+      cursor.execute("PRAGMA synchronous=NORMAL")
+      cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+      cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")  # negatif değer KiB cinsinden
+    finally:
+      cursor.close()
+    # pysqlite'ın örtük BEGIN yönetimi kapatılır; aksi halde ilk SAVEPOINT işlemi
+    # kendisi açar ve RELEASE edilince commit eder. BEGIN'i aşağıdaki kanca yayar.
+    dbapi_connection.isolation_level = None
+
+  @event.listens_for(engine, "begin")
+  def _sqlite_begin(conn):
+    # sqlite_immediate: yazma kilidi işlem başında alınır (tek yazıcı kuyruğu)
+    conn.exec_driver_sql("BEGIN IMMEDIATE" if conn.get_execution_options().get("sqlite_immediate") else "BEGIN")
+
+
+# Yeniden denenebilir hatalar: serialization_failure, deadlock_detected,
+# lock_not_available (PostgreSQL) ve SQLite kilit hataları
+RETRYABLE_PG_CODES = {"40001", "40P01", "55P03"}
+_conflicts = threading.local()
+
+
+def is_retryable_error(exc):
+  orig = getattr(exc, "orig", exc)
+  if getattr(orig, "pgcode", None) in RETRYABLE_PG_CODES:
+    return True
+  message = str(orig).lower()
+  return "database is locked" in message or "database table is locked" in message
+
+
+@event.listens_for(engine, "handle_error")
+def _remember_conflict(context):
+  # View'lar hataları yakalayıp 4xx'e çevirebilir; çakışma yine de görülsün
+  if is_retryable_error(context.original_exception):
+    _conflicts.seen = True
+
+
+def take_conflict_flag():
+  """Bu thread'de son çağrıdan beri yeniden denenebilir bir DB hatası oldu mu"""
+  seen = getattr(_conflicts, "seen", False)
+  _conflicts.seen = False
+  return seen
+
+
+def pool_stats():
+  """Havuz doluluğu ve checkout bekleme metrikleri"""
+  pool = engine.pool
+  stats = {"pool": type(pool).__name__, "dialect": engine.dialect.name}
+  if isinstance(pool, QueuePool):
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    stats.update({
+      "size": pool.size(),
+      "max_overflow": pool._max_overflow,
+      "checked_out": pool.checkedout(),
+      "idle": pool.checkedin(),
+      "overflow": pool.overflow(),
+      "saturation": round(pool.checkedout() / capacity, 3) if capacity else None,
+    })
+  stats.update(pool_metrics.snapshot())
+  return stats
 
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
@@ -74,6 +248,10 @@ class Rent(Base):
   updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
   owner = relationship("Owner", back_populates="rents")
 
+  __table_args__ = (
+    Index("uq_rents_owner_period", "owner_id", "year", "month", unique=True),
+  )
+
 
 class Payment(Base):
   __tablename__ = "payments"
@@ -95,6 +273,60 @@ class Payment(Base):
   account = relationship("Account", backref="payments")
 
 
+class OwnerBalance(Base):
+  __tablename__ = "owner_balances"
+  owner_id = Column(Integer, ForeignKey("owners.id"), primary_key=True)
+  charged = Column(Numeric(14, 2), nullable=False, default=0)  # Tahakkuk eden aidat
+  paid = Column(Numeric(14, 2), nullable=False, default=0)  # İptal edilmemiş tahsilat
+  late_fees = Column(Numeric(14, 2), nullable=False, default=0)  # Tahsil edilen gecikme bedeli
+  updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DeletedRecord(Base):
+  """Fiziksel olarak silinen satırlar için senkronizasyon tombstone kaydı"""
+  __tablename__ = "deleted_records"
+  id = Column(Integer, primary_key=True)
+  entity = Column(String(50), nullable=False)  # rents / expenses; yıl kapanışında arşive taşınanlar
+  entity_id = Column(Integer, nullable=False)
+  deleted_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class TableVersion(Base):
+  """Tablo başına artan sürüm sayacı; GET yanıtlarının ETag'i buradan türetilir"""
+  __tablename__ = "table_versions"
+  table_name = Column(String(100), primary_key=True)
+  version = Column(Integer, nullable=False, default=0)
+
+
+class ChangeEvent(Base):
+  """Commit edilen yazmaların outbox'ı; /api/events yayıncısı buradan okur"""
+  __tablename__ = "change_events"
+  id = Column(Integer, primary_key=True)
+  entity = Column(String(50), nullable=False)  # tablo adı
+  entity_id = Column(Integer, nullable=True)  # toplu (Core) yazmalarda boş
+  op = Column(String(10), nullable=False)  # insert / update / delete
+  version = Column(Integer, nullable=False)  # commit sonrası tablo sürümü
+  created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class IdempotencyKey(Base):
+  """Idempotency-Key başlığıyla gelen yazma isteklerinin saklanan sonuçları"""
+  __tablename__ = "idempotency_keys"
+  key = Column(String(128), primary_key=True)
+  request_hash = Column(String(64), nullable=False)  # yöntem + yol + gövde
+  status = Column(String(10), nullable=False, default="PENDING")  # PENDING / DONE
+  response_status = Column(Integer, nullable=True)
+  response_body = Column(Text, nullable=True)
+  created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class SchemaMigration(Base):
+  __tablename__ = "schema_migrations"
+  version = Column(Integer, primary_key=True, autoincrement=False)
+  name = Column(String(255), nullable=False)
+  applied_at = Column(DateTime, default=datetime.utcnow)
+
+
 class Settings(Base):
   __tablename__ = "settings"
   id = Column(Integer, primary_key=True)
@@ -156,6 +388,8 @@ class Account(Base):
   name = Column(String(100), nullable=False)
   type = Column(String(10), nullable=False)  # CASH / BANK
   balance = Column(Numeric(14, 2), nullable=False, default=0)
+  # Hesap açılırken girilen bakiye (karşılığında hareket yok); mutabakatın başlangıcı
+  opening_balance = Column(Numeric(14, 2), nullable=False, default=0)
   is_active = Column(Boolean, default=True)
   created_at = Column(DateTime, default=datetime.utcnow)
   updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -183,10 +417,390 @@ class Transaction(Base):
   is_canceled = Column(Boolean, default=False)
   created_by = Column(Integer, nullable=True)
   created_at = Column(DateTime, default=datetime.utcnow)
+  updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
   account = relationship("Account", foreign_keys=[account_id], back_populates="transactions")
   related_account_obj = relationship("Account", foreign_keys=[related_account], back_populates="related_transactions")
 
 
+class AccountLedger(Base):
+  """Bakiye defteri (LEDGER_MODE): hesap bakiyesine yazılmamış hareketler.
+
+  Canlı bakiye = accounts.balance (son katlanmış kontrol noktası) + folded=false
+  satırların toplamı. Satırlar silinmez; katlayıcı (ledger.py) folded=true yapar.
+  """
+  __tablename__ = "account_ledger"
+  id = Column(Integer, primary_key=True)
+  account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+  delta = Column(Numeric(14, 2), nullable=False)
+  folded = Column(Boolean, nullable=False, default=False)
+  created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+  __table_args__ = (
+    Index("ix_account_ledger_account_folded", "account_id", "folded"),
+  )
+
+
+# ==================== RAPOR ÖZETLERİ ====================
+# Aylık toplamlar yazan yollarda artımlı güncellenir (rollups.py); raporlar ham
+# tabloları taramak yerine bu satırları okur. Ham tablolardan yeniden üretilebilir.
+class AccountMonthlyTotal(Base):
+  """Hesap başına aylık hareket toplamları (iptal edilmemiş transactions, created_at ayı)"""
+  __tablename__ = "account_monthly_totals"
+  account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+  year = Column(Integer, primary_key=True, autoincrement=False)
+  month = Column(Integer, primary_key=True, autoincrement=False)
+  income = Column(Numeric(14, 2), nullable=False, default=0)
+  expense = Column(Numeric(14, 2), nullable=False, default=0)
+  transfer_in = Column(Numeric(14, 2), nullable=False, default=0)
+  transfer_out = Column(Numeric(14, 2), nullable=False, default=0)
+  tx_count = Column(Integer, nullable=False, default=0)  # Hesaba dokunan hareket sayısı
+  updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class CategoryMonthlyTotal(Base):
+  """Kategori başına aylık gider toplamları (expenses, expense_date ya da created_at ayı)"""
+  __tablename__ = "category_monthly_totals"
+  category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+  year = Column(Integer, primary_key=True, autoincrement=False)
+  month = Column(Integer, primary_key=True, autoincrement=False)
+  amount = Column(Numeric(14, 2), nullable=False, default=0)
+  expense_count = Column(Integer, nullable=False, default=0)
+  updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class OwnerMonthlyTotal(Base):
+  """Malik başına aylık tahakkuk (aidat dönemi) ve tahsilat (ödeme tarihi) toplamları"""
+  __tablename__ = "owner_monthly_totals"
+  owner_id = Column(Integer, ForeignKey("owners.id"), primary_key=True)
+  year = Column(Integer, primary_key=True, autoincrement=False)
+  month = Column(Integer, primary_key=True, autoincrement=False)
+  charged = Column(Numeric(14, 2), nullable=False, default=0)
+  paid = Column(Numeric(14, 2), nullable=False, default=0)  # İptal edilmemiş ödemeler
+  late_fees = Column(Numeric(14, 2), nullable=False, default=0)
+  updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+# ==================== YIL SONU ====================
+# Kapatılan yılın satırları sıcak tablolardan *_archive tablolarına taşınır
+# (yearend.py); liste ve rapor sorguları yalnızca açık yılı tarar.
+class ClosedYear(Base):
+  """Kapatılmış yıl ve kapanış anındaki özet; kapalı yılın yıl sonu raporu buradan okunur"""
+  __tablename__ = "closed_years"
+  year = Column(Integer, primary_key=True, autoincrement=False)
+  total_income = Column(Numeric(14, 2), nullable=False, default=0)
+  total_expense = Column(Numeric(14, 2), nullable=False, default=0)
+  charged = Column(Numeric(14, 2), nullable=False, default=0)  # Yılın aidat tahakkuku
+  paid_rents = Column(Numeric(14, 2), nullable=False, default=0)  # Yıl içindeki tahsilat
+  late_fees = Column(Numeric(14, 2), nullable=False, default=0)
+  unpaid_rents = Column(Numeric(14, 2), nullable=False, default=0)  # Kapanışta ödenmemiş yıl aidatları
+  unpaid_count = Column(Integer, nullable=False, default=0)
+  total_balance = Column(Numeric(14, 2), nullable=False, default=0)  # Yıl sonu hesap bakiyeleri toplamı
+  total_debt = Column(Numeric(14, 2), nullable=False, default=0)  # Yıl sonu malik borçları toplamı
+  archived_transactions = Column(Integer, nullable=False, default=0)
+  archived_payments = Column(Integer, nullable=False, default=0)
+  archived_rents = Column(Integer, nullable=False, default=0)
+  archived_expenses = Column(Integer, nullable=False, default=0)
+  closed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AccountOpeningBalance(Base):
+  """Hesabın açılış bakiyesi: year yılının başındaki (kapatılan yılın sonundaki) bakiye.
+
+  Son açılış yılı için bakiye = açılış + arşive taşınmamış hareketler.
+  """
+  __tablename__ = "account_opening_balances"
+  year = Column(Integer, primary_key=True, autoincrement=False)
+  account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True)
+  balance = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class OwnerOpeningBalance(Base):
+  """Malikin year yılı başındaki borcu ve o ana kadar arşive taşınan aidat/ödeme toplamları.
+
+  owner_balances = son açılış yılının charged/paid/late_fees değerleri + sıcak
+  tablolardaki rents/payments. Ödenmemiş aidatlar arşive taşınmadığından
+  debt, charged - paid'den farklı olabilir.
+  """
+  __tablename__ = "owner_opening_balances"
+  year = Column(Integer, primary_key=True, autoincrement=False)
+  owner_id = Column(Integer, ForeignKey("owners.id"), primary_key=True)
+  debt = Column(Numeric(14, 2), nullable=False, default=0)
+  charged = Column(Numeric(14, 2), nullable=False, default=0)
+  paid = Column(Numeric(14, 2), nullable=False, default=0)
+  late_fees = Column(Numeric(14, 2), nullable=False, default=0)
+
+
+class AccountReconciliation(Base):
+  """Hesap mutabakatının kontrol noktası ve son sonucu (reconcile.py).
+
+  transaction_net, id'si last_transaction_id'ye kadar olan iptal edilmemiş
+  hareketlerin (opening_year'dan itibaren) hesaba net etkisidir; sonraki
+  çalıştırma yalnızca daha yeni ve o andan beri değişmiş satırları tarar.
+  """
+  __tablename__ = "account_reconciliations"
+  account_id = Column(Integer, ForeignKey("accounts.id"), primary_key=True, autoincrement=False)
+  opening_year = Column(Integer, nullable=True)  # İlk açık yıl (kapatılmış yıl yoksa None)
+  last_transaction_id = Column(Integer, nullable=True)
+  transaction_net = Column(Numeric(14, 2), nullable=False, default=0)
+  expected_balance = Column(Numeric(14, 2), nullable=False, default=0)
+  actual_balance = Column(Numeric(14, 2), nullable=False, default=0)
+  drift = Column(Numeric(14, 2), nullable=False, default=0)  # actual - expected
+  suspect_transaction_ids = Column(Text, nullable=True)  # JSON liste
+  mode = Column(String(12), nullable=True)  # FULL / INCREMENTAL
+  checked_at = Column(DateTime, nullable=True)
+
+
+class ReconciliationMark(Base):
+  """Hareketi başka hesaba taşınan ya da silinen hesabın işareti.
+
+  updated_at taraması değişen satırı yalnızca yeni hesabında bulur; eski
+  hesabın kontrol noktası bu işaretle geçersiz sayılır (reconcile.py).
+  """
+  __tablename__ = "reconciliation_marks"
+  id = Column(Integer, primary_key=True)
+  account_id = Column(Integer, nullable=False)
+  transaction_id = Column(Integer, nullable=True)
+  created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+def _archive_table(model, *index_columns):
+  # Aynı kolonlar (INSERT ... SELECT için), yabancı anahtar ve varsayılan yok
+  name = f"{model.__tablename__}_archive"
+  return Table(
+    name,
+    Base.metadata,
+    *[Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in model.__table__.columns],
+    Index(f"ix_{name}_period", *index_columns),
+  )
+
+
+ARCHIVE_TABLES = {
+  "transactions": _archive_table(Transaction, "created_at"),
+  "payments": _archive_table(Payment, "payment_date"),
+  "rents": _archive_table(Rent, "year", "month"),
+  "expenses": _archive_table(Expense, "expense_date"),
+}
+
+
+# ==================== TABLO SÜRÜMLERİ ====================
+# Bir transaction'da yazılan tablolar toplanır ve sürümleri commit'ten hemen
+# önce, aynı işlemde tek UPDATE ile artırılır: veri ve sürüm birlikte kalıcı
+# olur ya da hiçbiri olmaz. Sürüm satırı kilidi yalnızca işlemin son
+# ifadelerinden commit'e kadar tutulur.
+UNVERSIONED_TABLES = {
+  "table_versions", "schema_migrations", "change_events", "account_ledger", "idempotency_keys", "reconciliation_marks",
+}
+
+# Deftere satır eklemek hesabın canlı bakiyesini değiştirir: accounts güncellemesi sayılır
+TABLE_ALIASES = {"account_ledger": ("accounts", "update")}
+
+# Bu tablolardaki commit edilmiş yazmalar change_events'e yazılır (/api/events)
+EVENT_TABLES = {"rents", "payments", "expenses", "transactions", "accounts"}
+CHANGE_NOTIFY_CHANNEL = "ays_changes"
+
+# PostgreSQL advisory kilit anahtarları; hepsi burada tanımlanır, çakışmamalı
+MIGRATION_LOCK_KEY = 48151623  # migrations.run_migrations
+PARTITION_LOCK_KEY = 48151625  # partitioning.setup
+
+
+def _touch_tables(session, names):
+  names = set(names) - UNVERSIONED_TABLES
+  if names:
+    session.info.setdefault("touched_tables", set()).update(names)
+
+
+def _record_change(session, entity, entity_id, op):
+  if entity not in EVENT_TABLES:
+    return
+  changes = session.info.setdefault("change_events", {})
+  # Aynı işlemde eklenip güncellenen satır tek bir insert olarak yayınlanır
+  if changes.get((entity, entity_id)) != "insert" or op == "delete":
+    changes[(entity, entity_id)] = op
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+  modified = [obj for obj in session.dirty if session.is_modified(obj, include_collections=False)]
+  for objects, op in ((session.new, "insert"), (session.deleted, "delete"), (modified, "update")):
+    for obj in objects:
+      _touch_tables(session, [obj.__table__.name])
+      _record_change(session, obj.__table__.name, getattr(obj, "id", None), op)
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+  if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None:
+      op = "insert" if orm_execute_state.is_insert else "update" if orm_execute_state.is_update else "delete"
+      name, op = TABLE_ALIASES.get(table.name, (table.name, op))
+      _touch_tables(orm_execute_state.session, [name])
+      # Tek satırı hedefleyen ifadeler satır id'sini entity_id seçeneğiyle bildirir
+      entity_id = orm_execute_state.execution_options.get("entity_id")
+      _record_change(orm_execute_state.session, name, entity_id, op)
+
+
+@event.listens_for(SessionLocal, "before_commit")
+def _bump_table_versions(session):
+  session.flush()  # Son flush'ta yazılan tablolar da sayılsın
+  touched = session.info.pop("touched_tables", None)
+  changes = session.info.pop("change_events", None)
+  if not touched:
+    return
+  conn = session.connection()
+  conn.execute(
+    update(TableVersion)
+    .where(TableVersion.table_name.in_(sorted(touched)))
+    .values(version=TableVersion.version + 1)
+  )
+  if changes:
+    versions = dict(conn.execute(
+      select(TableVersion.table_name, TableVersion.version)
+      .where(TableVersion.table_name.in_({entity for entity, _ in changes}))
+    ).all())
+    now = datetime.utcnow()
+    conn.execute(ChangeEvent.__table__.insert(), [
+      {"entity": entity, "entity_id": entity_id, "op": op, "version": versions.get(entity, 0), "created_at": now}
+      for (entity, entity_id), op in changes.items()
+    ])
+    if conn.dialect.name == "postgresql":
+      # Bildirim commit ile birlikte teslim edilir; rollback'te hiç gönderilmez
+      conn.execute(text(f"NOTIFY {CHANGE_NOTIFY_CHANNEL}"))
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_touched_tables(session):
+  session.info.pop("touched_tables", None)
+  session.info.pop("change_events", None)
+
+
+def get_table_versions(names, bind=None):
+  """ORM oturumu açmadan tabloların güncel sürümlerini oku"""
+  with (bind or engine).connect() as conn:
+    rows = conn.execute(
+      select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(list(names)))
+    ).all()
+  return dict(rows)
+
+
+def upsert_increment_many(session, model, key_names, rows):
+  """Her satırın anahtarına göre sayaçları artır, olmayan satırları oluştur (tek executemany)"""
+  if not rows:
+    return
+  table = model.__table__
+  now = datetime.utcnow()
+  delta_names = [name for name in rows[0] if name not in key_names]
+  if 'updated_at' in table.c:
+    rows = [dict(row, updated_at=now) for row in rows]
+
+  dialect = session.get_bind().dialect.name
+  if dialect in ('sqlite', 'postgresql'):
+    insert = sqlite_insert if dialect == 'sqlite' else postgresql_insert
+    stmt = insert(table)
+    increments = {name: table.c[name] + stmt.excluded[name] for name in delta_names}
+    if 'updated_at' in table.c:
+      increments['updated_at'] = stmt.excluded.updated_at
+    session.execute(stmt.on_conflict_do_update(index_elements=list(key_names), set_=increments), rows)
+    return
+
+  for row in rows:
+    where = [table.c[name] == row[name] for name in key_names]
+    increments = {name: table.c[name] + row[name] for name in delta_names}
+    if 'updated_at' in row:
+      increments['updated_at'] = row['updated_at']
+    updated = session.execute(table.update().where(*where).values(**increments))
+    if updated.rowcount == 0:
+      session.execute(table.insert().values(**row))
+
+
+def rebuild_owner_balances(session):
+  """owner_balances tablosunu rents/payments tablolarından yeniden üret"""
+  from sqlalchemy import func
+
+  rent_totals = session.query(
+    Rent.owner_id,
+    func.coalesce(func.sum(Rent.amount), 0),
+  ).group_by(Rent.owner_id).all()
+  paid_totals = session.query(
+    Payment.owner_id,
+    func.coalesce(func.sum(Payment.amount), 0),
+    func.coalesce(func.sum(Payment.late_fee_amount), 0),
+  ).filter(Payment.is_cancelled == False).group_by(Payment.owner_id).all()
+
+  # Kapatılmış yıllardan arşive taşınan toplamlar son açılış bakiyesinde tutulur
+  opening_year = session.query(func.max(OwnerOpeningBalance.year)).scalar()
+  rows = {}
+  if opening_year is not None:
+    for opening in session.query(OwnerOpeningBalance).filter(OwnerOpeningBalance.year == opening_year):
+      rows[opening.owner_id] = {
+        'owner_id': opening.owner_id, 'charged': opening.charged, 'paid': opening.paid, 'late_fees': opening.late_fees,
+      }
+  for owner_id, charged in rent_totals:
+    row = rows.setdefault(owner_id, {'owner_id': owner_id, 'charged': 0, 'paid': 0, 'late_fees': 0})
+    row['charged'] += Decimal(str(charged))
+  for owner_id, paid, late_fees in paid_totals:
+    row = rows.setdefault(owner_id, {'owner_id': owner_id, 'charged': 0, 'paid': 0, 'late_fees': 0})
+    row['paid'] += Decimal(str(paid))
+    row['late_fees'] += Decimal(str(late_fees))
+
+  now = datetime.utcnow()
+  session.query(OwnerBalance).delete(synchronize_session=False)
+  if rows:
+    session.execute(OwnerBalance.__table__.insert(), [dict(r, updated_at=now) for r in rows.values()])
+  return len(rows)
+
+
+def _seed_table_versions():
+  with engine.begin() as conn:
+    existing = set(conn.execute(select(TableVersion.table_name)).scalars())
+    missing = [
+      {"table_name": name, "version": 0}
+      for name in Base.metadata.tables
+      if name not in existing and name not in UNVERSIONED_TABLES
+    ]
+    if missing:
+      conn.execute(TableVersion.__table__.insert(), missing)
+
+
 def init_db():
   Base.metadata.create_all(engine)
+  try:
+    _seed_table_versions()
+  except Exception as e:
+    # Eşzamanlı başlayan başka bir worker aynı satırları eklemiş olabilir
+    print(f"table_versions doldurulamadı: {e}")
+
+  # create_all mevcut tablolara index/kolon eklemez; şema farkları migration'larla uygulanır
+  if os.environ.get("DB_AUTO_MIGRATE", "true").lower() == "true":
+    from migrations import run_migrations
+    run_migrations(engine)
+
+  # İsteğe bağlı: transactions/payments yıllık partition'lara (yalnızca PostgreSQL)
+  from partitioning import DB_PARTITIONING, setup as setup_partitions
+  if DB_PARTITIONING:
+    setup_partitions(engine)
+
+  # Mevcut kurulumlar: bakiye tablosu boşsa ve aidat varsa bir kez doldur
+  session = SessionLocal()
+  try:
+    if session.query(OwnerBalance).first() is None and session.query(Rent.id).first() is not None:
+      rebuild_owner_balances(session)
+      session.commit()
+  except Exception as e:
+    session.rollback()
+    print(f"owner_balances doldurulamadı: {e}")
+  finally:
+    session.close()
+
+  # Rapor özetleri (rollups.py) ilk kez oluşturulduysa mevcut veriden doldur
+  from rollups import fill_if_empty
+  session = SessionLocal()
+  try:
+    if fill_if_empty(session):
+      session.commit()
+  except Exception as e:
+    session.rollback()
+    print(f"Rapor özetleri doldurulamadı: {e}")
+  finally:
+    session.close()
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""Değişiklik olaylarının süreç içi yayını (/api/events)
+
+Her worker sürecinde tek bir yayıncı thread'i change_events outbox'ını okur
+ve olayları bağlı tüm abonelere dağıtır; veritabanı yükü bağlı istemci
+sayısından bağımsızdır. PostgreSQL'de commit ile gelen NOTIFY yayıncıyı
+hemen uyandırır, SQLite'ta outbox EVENTS_POLL_INTERVAL aralığıyla okunur.
+
+PostgreSQL'de olay id'leri commit sırasıyla değil insert sırasıyla alınır:
+küçük id'li bir işlem daha geç commit edebilir. Okuma sırasında id'lerde
+görülen boşluklar EVENTS_GAP_SECONDS boyunca yeniden sorgulanır; bu sürede
+gelen olaylar geç de olsa yayınlanır, dolmayan boşluklar (rollback)
+bırakılır. Abonelere sıra yayın sırasıdır, id sırası değil.
+"""
+import os
+import queue
+import select as select_module
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select
+
+from database import CHANGE_NOTIFY_CHANNEL, ChangeEvent, engine as default_engine
+
+EVENTS_POLL_INTERVAL = float(os.environ.get("EVENTS_POLL_INTERVAL", "1"))
+EVENTS_RETENTION_SECONDS = float(os.environ.get("EVENTS_RETENTION_SECONDS", "3600"))
+EVENTS_BUFFER_SIZE = int(os.environ.get("EVENTS_BUFFER_SIZE", "1000"))
+EVENTS_GAP_SECONDS = float(os.environ.get("EVENTS_GAP_SECONDS", "10"))
+EVENTS_CLEANUP_INTERVAL = 60
+
+# Aboneye gönderilir: kaçırılan olaylar tamponda yok, istemci /api/sync ile eşitlenmeli
+RESET = object()
+
+
+class Subscriber:
+  def __init__(self, maxsize):
+    self.queue = queue.Queue(maxsize=maxsize)
+
+  def get(self, timeout):
+    return self.queue.get(timeout=timeout)
+
+
+class ChangeBroadcaster:
+  def __init__(self, engine=default_engine, poll_interval=EVENTS_POLL_INTERVAL, buffer_size=EVENTS_BUFFER_SIZE):
+    self.engine = engine
+    self.poll_interval = poll_interval
+    self._recent = deque(maxlen=buffer_size)
+    self._subscribers = set()
+    self._lock = threading.Lock()
+    self._thread = None
+    self._last_id = 0
+    self._gaps = {}  # henüz görünmeyen olay id'si → son bekleme anı (monotonic)
+    self._next_cleanup = 0
+
+  def start(self):
+    with self._lock:
+      if self._thread is not None and self._thread.is_alive():
+        return
+      with self.engine.connect() as conn:
+        # Tamponu son olaylarla doldur; yeniden bağlanan istemciler kaldığı yerden devam eder
+        rows = conn.execute(
+          select(ChangeEvent).order_by(ChangeEvent.id.desc()).limit(self._recent.maxlen)
+        ).all()
+        self._last_id = conn.execute(select(func.coalesce(func.max(ChangeEvent.id), 0))).scalar()
+      self._recent.clear()
+      self._recent.extend(_event_dict(row) for row in reversed(rows))
+      self._thread = threading.Thread(target=self._run, name="change-broadcaster", daemon=True)
+      self._thread.start()
+
+  def subscribe(self, last_event_id=None, limit=None):
+    """Yeni abone; last_event_id verilirse sonraki olaylar tampondan önce kuyruğa konur.
+
+    limit verilir ve abone sayısı ona ulaşmışsa None döner.
+    """
+    self.start()
+    subscriber = Subscriber(maxsize=self._recent.maxlen)
+    with self._lock:
+      if limit is not None and len(self._subscribers) >= limit:
+        return None
+      # Tampon yayın sırasındadır: son görülen olaydan sonra yayınlananlar tekrar gönderilir
+      position = next((i for i, item in enumerate(self._recent) if item["event_id"] == last_event_id), None)
+      if position is not None:
+        for item in list(self._recent)[position + 1:]:
+          subscriber.queue.put_nowait(item)
+      elif last_event_id is not None and last_event_id < self._last_id:
+        oldest = self._recent[0]["event_id"] if self._recent else self._last_id + 1
+        if last_event_id + 1 < oldest:
+          subscriber.queue.put_nowait(RESET)
+        else:
+          for item in self._recent:
+            if item["event_id"] > last_event_id:
+              subscriber.queue.put_nowait(item)
+      self._subscribers.add(subscriber)
+    return subscriber
+
+  def unsubscribe(self, subscriber):
+    with self._lock:
+      self._subscribers.discard(subscriber)
+
+  @property
+  def subscriber_count(self):
+    return len(self._subscribers)
+
+  def _publish(self, items):
+    with self._lock:
+      for item in items:
+        self._recent.append(item)
+        self._last_id = max(self._last_id, item["event_id"])
+      for subscriber in list(self._subscribers):
+        try:
+          for item in items:
+            subscriber.queue.put_nowait(item)
+        except queue.Full:
+          # Yavaş istemci: bağlantısı kapanır, yeniden bağlanınca reset alır
+          self._subscribers.discard(subscriber)
+          _drain(subscriber.queue)
+          subscriber.queue.put_nowait(RESET)
+
+  def _fetch(self):
+    now = time.monotonic()
+    self._gaps = {event_id: until for event_id, until in self._gaps.items() if until > now}
+    condition = ChangeEvent.id > self._last_id
+    if self._gaps:
+      condition = or_(condition, ChangeEvent.id.in_(list(self._gaps)))
+    with self.engine.connect() as conn:
+      rows = conn.execute(select(ChangeEvent).where(condition).order_by(ChangeEvent.id).limit(500)).all()
+    expected = self._last_id + 1
+    for row in rows:
+      if self._gaps.pop(row.id, None) is not None:
+        continue
+      # Çok büyük sıçramalar (sequence önbelleği, toplu rollback) izlenmez
+      if 0 < row.id - expected <= self._recent.maxlen:
+        self._gaps.update((event_id, now + EVENTS_GAP_SECONDS) for event_id in range(expected, row.id))
+      expected = row.id + 1
+    if rows:
+      self._publish([_event_dict(row) for row in rows])
+    return len(rows)
+
+  def _cleanup(self):
+    now = time.monotonic()
+    if now < self._next_cleanup:
+      return
+    self._next_cleanup = now + EVENTS_CLEANUP_INTERVAL
+    cutoff = datetime.utcnow() - timedelta(seconds=EVENTS_RETENTION_SECONDS)
+    with self.engine.begin() as conn:
+      conn.execute(delete(ChangeEvent).where(ChangeEvent.created_at < cutoff))
+
+  def _run(self):
+    while True:
+      try:
+        if self.engine.dialect.name == "postgresql":
+          self._listen()
+        else:
+          while True:
+            while self._fetch() == 500:
+              pass
+            self._cleanup()
+            time.sleep(self.poll_interval)
+      except Exception as e:
+        print(f"Olay yayıncısı hatası: {e}")
+        time.sleep(5)
+
+  def _listen(self):
+    raw = self.engine.raw_connection()
+    raw.detach()  # autocommit'e alınan bağlantı havuza geri dönmesin
+    try:
+      dbapi_conn = raw.driver_connection
+      dbapi_conn.autocommit = True
+      with dbapi_conn.cursor() as cursor:
+        cursor.execute(f"LISTEN {CHANGE_NOTIFY_CHANNEL}")
+      while True:
+        # Zaman aşımı, bağlantı kopukken kaçan bildirimlere karşı yedek okumadır
+        if select_module.select([dbapi_conn], [], [], max(self.poll_interval, 5)) != ([], [], []):
+          dbapi_conn.poll()
+          dbapi_conn.notifies.clear()
+        while self._fetch() == 500:
+          pass
+        self._cleanup()
+    finally:
+      raw.close()
+
+
+def _event_dict(row):
+  return {
+    "event_id": row.id,
+    "entity": row.entity,
+    "id": row.entity_id,
+    "op": row.op,
+    "version": row.version,
+  }
+
+
+def _drain(q):
+  try:
+    while True:
+      q.get_nowait()
+  except queue.Empty:
+    pass
+
+
+broadcaster = ChangeBroadcaster()
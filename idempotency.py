@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Idempotency-Key ile tekrarlanan yazma isteklerini bir kez çalıştır
+
+Mobil istemci zaman aşımında isteği aynı anahtarla yeniden gönderir. İlk
+istek anahtarı ayrı ve hemen commit edilen bir işlemde PENDING olarak sahiplenir.
+Başarılı yanıt, yazmalarla aynı işlemde DONE olarak saklanır: ya ikisi birden
+kalıcı olur ya hiçbiri. Aynı anahtarla gelen tekrar saklı yanıtı alır; ilk
+istek sürerken gelen tekrar onun bitmesini bekler. Başarısız istekler
+sahipliği bırakır, istemci aynı anahtarla yeniden deneyebilir.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, exc, select, update
+
+from database import IdempotencyKey, engine as default_engine
+
+IDEMPOTENCY_TTL_SECONDS = float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Tekrar, ilk isteği en fazla bu kadar bekler, sonra 409 döner. İstemcinin
+# zaman aşımının (api_service.dart _idempotentTimeout, 8 sn) altında kalmalı:
+# yoksa istemci yanıtı beklemeden vazgeçer, bekleyen thread boşa tutulur.
+IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", "5"))
+# Bu süreden eski PENDING sahiplik çöken bir worker'dan kalmıştır; devralınır
+IDEMPOTENCY_PENDING_TIMEOUT = float(os.environ.get("IDEMPOTENCY_PENDING_TIMEOUT", "120"))
+IDEMPOTENCY_CLEANUP_INTERVAL = 300
+MAX_KEY_LENGTH = 128
+
+
+class KeyReused(Exception):
+  """Anahtar farklı bir istekle (yöntem, yol veya gövde) daha önce kullanılmış"""
+
+
+class StillRunning(Exception):
+  """Aynı anahtarlı ilk istek bekleme süresi içinde bitmedi"""
+
+
+def request_fingerprint(method, path, body):
+  digest = hashlib.sha256()
+  for part in (method.encode(), path.encode(), body or b""):
+    digest.update(part)
+    digest.update(b"\0")
+  return digest.hexdigest()
+
+
+def claim(key, fingerprint, engine=default_engine):
+  """Anahtarı sahiplen; None dönerse istek çalıştırılmalı, aksi halde saklı DONE satırı döner"""
+  deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+  delay = 0.02
+  while True:
+    try:
+      with engine.begin() as conn:
+        conn.execute(IdempotencyKey.__table__.insert().values(
+          key=key, request_hash=fingerprint, status="PENDING", created_at=datetime.utcnow(),
+        ))
+      return None
+    except exc.IntegrityError:
+      pass
+
+    with engine.connect() as conn:
+      row = conn.execute(select(IdempotencyKey).where(IdempotencyKey.key == key)).first()
+    if row is None:
+      continue  # sahibi başarısız olup bıraktı; yeniden sahiplen
+    if row.request_hash != fingerprint:
+      raise KeyReused(key)
+    if row.status == "DONE":
+      return row
+    if row.created_at < datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_PENDING_TIMEOUT):
+      with engine.begin() as conn:
+        taken = conn.execute(
+          update(IdempotencyKey)
+          .where(
+            IdempotencyKey.key == key,
+            IdempotencyKey.status == "PENDING",
+            IdempotencyKey.created_at == row.created_at,
+          )
+          .values(created_at=datetime.utcnow())
+        ).rowcount
+      if taken:
+        return None
+      continue
+    if time.monotonic() >= deadline:
+      raise StillRunning(key)
+    time.sleep(delay)
+    delay = min(delay * 2, 0.5)
+
+
+def complete(session, key, status_code, body):
+  """Yanıtı isteğin kendi işleminde sakla; commit edilmezse anahtar PENDING kalır"""
+  session.execute(
+    update(IdempotencyKey)
+    .where(IdempotencyKey.key == key)
+    .values(status="DONE", response_status=status_code, response_body=body)
+  )
+
+
+def release(key, engine=default_engine):
+  """Commit edilmemiş (PENDING) sahipliği bırak; DONE satıra dokunmaz"""
+  with engine.begin() as conn:
+    conn.execute(
+      delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status == "PENDING")
+    )
+
+
+class IdempotencyCleaner:
+  """Süresi dolan anahtarları arka planda siler (süreç başına tek thread)"""
+
+  def __init__(self, engine=default_engine, interval=IDEMPOTENCY_CLEANUP_INTERVAL):
+    self.engine = engine
+    self.interval = interval
+    self._thread = None
+    self._lock = threading.Lock()
+    self.deleted = 0
+
+  def start(self):
+    if self._thread is not None and self._thread.is_alive():
+      return
+    with self._lock:
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._run, name="idempotency-cleaner", daemon=True)
+        self._thread.start()
+
+  def cleanup(self):
+    cutoff = datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)
+    with self.engine.begin() as conn:
+      deleted = conn.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff)).rowcount
+    self.deleted += deleted
+    return deleted
+
+  def _run(self):
+    while True:
+      try:
+        self.cleanup()
+      except Exception as e:
+        print(f"Idempotency temizleme hatası: {e}")
+      time.sleep(self.interval)
+
+
+cleaner = IdempotencyCleaner()
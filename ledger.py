@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Bakiye defteri ve katlayıcı (LEDGER_MODE=true)
+
+Her ödeme ve gider aynı bir iki hesabın (ana banka ve kasa) satırını günceller;
+yazan istekler bu satırın kilidinde sıraya girer. Defter modunda bakiye
+değişiklikleri account_ledger'a yalnızca eklenir: alacak (pozitif) hareketler
+hesap satırını kilitlemez. Borç (negatif) hareketler negatif bakiye kuralı
+için hesap satırını kilitleyip canlı bakiyeyi kontrol eder.
+
+Canlı bakiye tek ifadede okunur: accounts.balance + katlanmamış satırların
+toplamı. Arka plandaki katlayıcı katlanmamış satırları folded=true yapar ve
+toplamlarını aynı işlemde accounts.balance'a ekler; okuyucu ya ikisini de
+önceki ya da ikisini de sonraki halde görür.
+
+Eşzamanlılık kazancı yalnızca SQLite'ta ölçüldü (bench_ledger.py); orada
+yazmalar zaten sıralı olduğundan kazanç görünmez. PostgreSQL ölçümü yok.
+"""
+import os
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import func, select, update
+
+from database import Account, AccountLedger, engine as default_engine
+
+LEDGER_FOLD_INTERVAL = float(os.environ.get("LEDGER_FOLD_INTERVAL", "1"))
+LEDGER_FOLD_BATCH = int(os.environ.get("LEDGER_FOLD_BATCH", "5000"))
+
+
+def pending_sum(account_id):
+  """Hesabın katlanmamış hareketlerinin toplamı (ilişkili alt sorgu)"""
+  return (
+    select(func.coalesce(func.sum(AccountLedger.delta), 0))
+    .where(AccountLedger.account_id == account_id, AccountLedger.folded == False)
+    .scalar_subquery()
+  )
+
+
+def live_balance_column():
+  return func.coalesce(Account.balance, 0) + pending_sum(Account.id)
+
+
+def live_balances(session, account_ids):
+  """{hesap id: canlı bakiye}; kontrol noktası ve defter aynı anlık görüntüden okunur"""
+  account_ids = list(account_ids)
+  if not account_ids:
+    return {}
+  rows = session.execute(
+    select(Account.id, live_balance_column()).where(Account.id.in_(account_ids))
+  ).all()
+  return {account_id: Decimal(balance) for account_id, balance in rows}
+
+
+def fold_ledger(engine=default_engine, limit=LEDGER_FOLD_BATCH):
+  """En fazla limit katlanmamış satırı hesap bakiyelerine katla; katlanan satır sayısını döner.
+
+  Satırlar tek UPDATE ... WHERE folded = false ile işaretlenir; aynı anda
+  çalışan başka bir worker'ın katlayıcısı aynı satırı iki kez sayamaz.
+  Hesaplar artan id sırasıyla güncellenir (api.py'deki kilit sırası).
+  """
+  with engine.begin() as conn:
+    batch = (
+      select(AccountLedger.id)
+      .where(AccountLedger.folded == False)
+      .order_by(AccountLedger.id)
+      .limit(limit)
+      .scalar_subquery()
+    )
+    mark = (
+      update(AccountLedger)
+      .where(AccountLedger.id.in_(batch), AccountLedger.folded == False)
+      .values(folded=True)
+    )
+    if conn.dialect.update_returning:
+      rows = conn.execute(mark.returning(AccountLedger.account_id, AccountLedger.delta)).all()
+    else:
+      # RETURNING desteklemeyen eski SQLite sürümleri: yazıcı tek, aynı işlemde oku ve işaretle
+      rows = conn.execute(
+        select(AccountLedger.account_id, AccountLedger.delta)
+        .where(AccountLedger.folded == False)
+        .order_by(AccountLedger.id)
+        .limit(limit)
+      ).all()
+      conn.execute(mark)
+    totals = defaultdict(Decimal)
+    for account_id, delta in rows:
+      totals[account_id] += Decimal(delta)
+    for account_id in sorted(totals):
+      conn.execute(
+        update(Account)
+        .where(Account.id == account_id)
+        .values(balance=func.coalesce(Account.balance, 0) + totals[account_id])
+      )
+  return len(rows)
+
+
+class LedgerFolder:
+  def __init__(self, engine=default_engine, interval=LEDGER_FOLD_INTERVAL):
+    self.engine = engine
+    self.interval = interval
+    self._thread = None
+    self._lock = threading.Lock()
+    self.folded = 0
+
+  def start(self):
+    if self._thread is not None and self._thread.is_alive():
+      return
+    with self._lock:
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._run, name="ledger-folder", daemon=True)
+        self._thread.start()
+
+  def _run(self):
+    while True:
+      try:
+        while True:
+          count = fold_ledger(self.engine)
+          self.folded += count
+          if count < LEDGER_FOLD_BATCH:
+            break
+      except Exception as e:
+        print(f"Defter katlayıcı hatası: {e}")
+      time.sleep(self.interval)
+
+
+folder = LedgerFolder()
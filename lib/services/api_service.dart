@@ -1,3 +1,5 @@
+import 'dart:math';
+
 import 'package:dio/dio.dart';
 import 'package:shared_preferences/shared_preferences.dart';
 
@@ -44,6 +46,44 @@ class ApiService {
     ));
   }
 
+  // ==================== IDEMPOTENT YAZMALAR ====================
+  // Para hareketi oluşturan POST'lar Idempotency-Key ile gönderilir: zaman
+  // aşımında aynı anahtarla yeniden denenir, sunucu isteği bir kez çalıştırır
+  // ve tekrarlara saklı yanıtı döner. Bu yüzden kısa zaman aşımı güvenlidir.
+  static const int _idempotentAttempts = 4;
+  static const Duration _idempotentTimeout = Duration(seconds: 8);
+  static final Random _random = Random.secure();
+
+  static String _newIdempotencyKey() {
+    final bytes = List<int>.generate(16, (_) => _random.nextInt(256));
+    return bytes.map((b) => b.toRadixString(16).padLeft(2, '0')).join();
+  }
+
+  Future<Response> _idempotentPost(String path, Map<String, dynamic> data) async {
+    final key = _newIdempotencyKey();
+    for (var attempt = 1;; attempt++) {
+      try {
+        return await _dio.post(
+          path,
+          data: data,
+          options: Options(
+            headers: {'Idempotency-Key': key},
+            sendTimeout: _idempotentTimeout,
+            receiveTimeout: _idempotentTimeout,
+          ),
+        );
+      } on DioException catch (e) {
+        final retryable = e.type == DioExceptionType.connectionTimeout ||
+            e.type == DioExceptionType.sendTimeout ||
+            e.type == DioExceptionType.receiveTimeout ||
+            e.type == DioExceptionType.connectionError ||
+            e.response?.statusCode == 409;
+        if (!retryable || attempt >= _idempotentAttempts) rethrow;
+        await Future.delayed(Duration(milliseconds: 300 * attempt));
+      }
+    }
+  }
+
   // ==================== AUTH ====================
   Future<Map<String, dynamic>> login(String email, String password) async {
     if (useMockData) {
@@ -206,7 +246,7 @@ class ApiService {
     String? paymentDate,
     String? referenceNumber,
   }) async {
-    final response = await _dio.post('/payments', data: {
+    final response = await _idempotentPost('/payments', {
       'rent_id': rentId,
       'account_id': accountId,
       'amount': amount,
@@ -217,6 +257,28 @@ class ApiService {
     return response.data;
   }
 
+  /// Ekstre günleri için toplu ödeme. payments: [{rent_id, account_id, amount, ...}].
+  /// bestEffort false ise tek hatalı kalemde hiçbir ödeme kaydedilmez;
+  /// sonuç her kalem için results[i].success ve hata mesajını içerir.
+  Future<Map<String, dynamic>> createPaymentsBatch(
+    List<Map<String, dynamic>> payments, {
+    bool bestEffort = false,
+  }) async {
+    try {
+      final response = await _idempotentPost('/payments/batch', {
+        'payments': payments,
+        'mode': bestEffort ? 'best_effort' : 'all_or_nothing',
+      });
+      return response.data;
+    } on DioException catch (e) {
+      // 400 yanıtı da kalem bazında sonuç taşır
+      if (e.response?.statusCode == 400 && e.response?.data is Map<String, dynamic>) {
+        return e.response!.data;
+      }
+      rethrow;
+    }
+  }
+
   Future<Map<String, dynamic>> cancelPayment(int paymentId, {String? reason}) async {
     final response = await _dio.put('/payments/$paymentId/cancel', data: {
       'cancellation_reason': reason,
@@ -239,7 +301,7 @@ class ApiService {
     String? receiptNo,
     String? date,
   }) async {
-    final response = await _dio.post('/expenses', data: {
+    final response = await _idempotentPost('/expenses', {
       'name': name,
       'category_id': categoryId,
       'amount': amount,
@@ -865,7 +927,7 @@ class ApiService {
     String? source,
     int? createdBy,
   }) async {
-    final response = await _dio.post('/transactions/income', data: {
+    final response = await _idempotentPost('/transactions/income', {
       'account_id': accountId,
       'amount': amount,
       'description': description,
@@ -882,7 +944,7 @@ class ApiService {
     String? source,
     int? createdBy,
   }) async {
-    final response = await _dio.post('/transactions/expense', data: {
+    final response = await _idempotentPost('/transactions/expense', {
       'account_id': accountId,
       'amount': amount,
       'description': description,
@@ -899,7 +961,7 @@ class ApiService {
     String? description,
     int? createdBy,
   }) async {
-    final response = await _dio.post('/transactions/transfer', data: {
+    final response = await _idempotentPost('/transactions/transfer', {
       'source_account_id': sourceAccountId,
       'target_account_id': targetAccountId,
       'amount': amount,
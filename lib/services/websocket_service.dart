@@ -1,14 +1,26 @@
-import 'package:web_socket_channel/web_socket_channel.dart';
+import 'dart:async';
+import 'dart:convert';
+
+import 'package:http/http.dart' as http;
 import 'package:shared_preferences/shared_preferences.dart';
 
 typedef DataUpdateCallback = Function(String eventType, dynamic data);
 
+/// Sunucudaki /api/events (Server-Sent Events) akışını dinler.
+///
+/// 'change' olaylarında data: {entity, id, op, version}. 'reset' olayı
+/// kaçırılan değişikliklerin tamponda olmadığını bildirir; uygulama
+/// /api/sync ile yeniden eşitlenmelidir.
 class WebSocketService {
   static final WebSocketService _instance = WebSocketService._internal();
-  
-  WebSocketChannel? _channel;
+
+  http.Client? _client;
+  StreamSubscription<String>? _subscription;
   DataUpdateCallback? _onDataUpdate;
   bool _isConnected = false;
+  bool _closedByUser = false;
+  String? _lastEventId;
+  Duration _retry = const Duration(seconds: 3);
 
   factory WebSocketService() {
     return _instance;
@@ -19,62 +31,104 @@ class WebSocketService {
   bool get isConnected => _isConnected;
 
   Future<void> connect() async {
+    _closedByUser = false;
     try {
       final prefs = await SharedPreferences.getInstance();
       final apiUrl = prefs.getString('api_url') ?? 'http://192.168.1.8:5000/api';
-      
-      // API URL'sini WebSocket URL'sine çevir
-      final wsUrl = apiUrl
-          .replaceFirst('http://', 'ws://')
-          .replaceFirst('https://', 'wss://')
-          .replaceFirst('/api', '');
-      
-      print('[WebSocket] Connecting to $wsUrl');
-      
-      _channel = WebSocketChannel.connect(Uri.parse(wsUrl));
+      final token = prefs.getString('token');
+
+      print('[Events] Connecting to $apiUrl/events');
+
+      final request = http.Request('GET', Uri.parse('$apiUrl/events'));
+      request.headers['Accept'] = 'text/event-stream';
+      if (token != null) request.headers['Authorization'] = 'Bearer $token';
+      if (_lastEventId != null) request.headers['Last-Event-ID'] = _lastEventId!;
+
+      _client = http.Client();
+      final response = await _client!.send(request);
+      if (response.statusCode == 503) {
+        // Sunucudaki akış sınırı dolu: Retry-After kadar bekle
+        final seconds = int.tryParse(response.headers['retry-after'] ?? '');
+        if (seconds != null) _retry = Duration(seconds: seconds);
+      }
+      if (response.statusCode != 200) {
+        throw Exception('HTTP ${response.statusCode}');
+      }
       _isConnected = true;
-      
-      // Server cevabını dinle
-      _channel!.stream.listen(
-        (message) {
-          print('[WebSocket] Received: $message');
-          _handleMessage(message);
+
+      String? eventType;
+      final data = StringBuffer();
+      _subscription = response.stream
+          .transform(utf8.decoder)
+          .transform(const LineSplitter())
+          .listen(
+        (line) {
+          if (line.isEmpty) {
+            // Boş satır olayı tamamlar
+            if (data.isNotEmpty) _dispatch(eventType ?? 'message', data.toString());
+            eventType = null;
+            data.clear();
+          } else if (line.startsWith(':')) {
+            // Heartbeat yorumu
+          } else if (line.startsWith('id:')) {
+            _lastEventId = line.substring(3).trim();
+          } else if (line.startsWith('event:')) {
+            eventType = line.substring(6).trim();
+          } else if (line.startsWith('data:')) {
+            if (data.isNotEmpty) data.write('\n');
+            data.write(line.substring(5).trimLeft());
+          } else if (line.startsWith('retry:')) {
+            final ms = int.tryParse(line.substring(6).trim());
+            if (ms != null) _retry = Duration(milliseconds: ms);
+          }
         },
         onError: (error) {
-          print('[WebSocket] Error: $error');
-          _isConnected = false;
+          print('[Events] Error: $error');
+          _scheduleReconnect();
         },
         onDone: () {
-          print('[WebSocket] Disconnected');
-          _isConnected = false;
-          // Yeniden bağlanmaya çalış
-          Future.delayed(Duration(seconds: 3), () => connect());
+          print('[Events] Disconnected');
+          _scheduleReconnect();
         },
+        cancelOnError: true,
       );
     } catch (e) {
-      print('[WebSocket] Connection failed: $e');
-      _isConnected = false;
+      print('[Events] Connection failed: $e');
+      _scheduleReconnect();
     }
   }
 
-  void _handleMessage(dynamic message) {
+  void _dispatch(String eventType, String raw) {
     try {
-      // Message JSON olabilir, parse et
+      if (eventType == 'reset') _lastEventId = null;
       if (_onDataUpdate != null) {
-        // Server'dan gelen event'i callback'e ilet
-        _onDataUpdate!('data_update', message);
+        _onDataUpdate!(eventType, jsonDecode(raw));
       }
     } catch (e) {
-      print('[WebSocket] Error handling message: $e');
+      print('[Events] Error handling message: $e');
     }
   }
 
+  void _scheduleReconnect() {
+    _isConnected = false;
+    _client?.close();
+    _client = null;
+    if (_closedByUser) return;
+    Future.delayed(_retry, () {
+      if (!_closedByUser && !_isConnected) connect();
+    });
+  }
+
   void setOnDataUpdateCallback(DataUpdateCallback callback) {
     _onDataUpdate = callback;
   }
 
   void disconnect() {
-    _channel?.sink.close();
+    _closedByUser = true;
+    _subscription?.cancel();
+    _subscription = null;
+    _client?.close();
+    _client = null;
     _isConnected = false;
   }
 
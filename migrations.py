@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Sürümlü şema migration'ları (SQLite ve PostgreSQL)
+
+create_all yalnızca eksik tabloları oluşturur; mevcut kurulumlara index veya
+kolon eklemek için buraya yeni sürüm eklenir. Uygulanan sürümler
+schema_migrations tablosunda tutulur, her migration tekrar çalıştırılabilir
+(IF NOT EXISTS) yazılır.
+
+Kullanım:
+  python migrations.py            # bekleyen migration'ları uygula
+  python migrations.py status     # uygulanmış / bekleyen sürümleri listele
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import inspect, select, text
+from sqlalchemy.exc import IntegrityError
+
+from database import engine as default_engine, MIGRATION_LOCK_KEY, SchemaMigration
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+  def decorator(fn):
+    MIGRATIONS.append((version, name, fn))
+    return fn
+  return decorator
+
+
+def _supports_partial_index(conn):
+  return conn.dialect.name in ('sqlite', 'postgresql')
+
+
+@migration(1, 'hot_path_indexes')
+def _hot_path_indexes(conn):
+  # rents.owner_id sorguları uq_rents_owner_period index'inin ilk kolonunu kullanır
+  statements = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_rents_owner_period ON rents (owner_id, year, month)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_payment_date ON payments (payment_date)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_rent_id ON payments (rent_id)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_owner_id ON payments (owner_id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_source_related ON transactions (source, related_id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_account_created ON transactions (account_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_date_id ON expenses (expense_date, id)",
+  ]
+  if _supports_partial_index(conn):
+    # Ödenmemiş aidatlar tablonun küçük bir kısmı; dashboard toplamı index'ten okunur
+    statements.append(
+      "CREATE INDEX IF NOT EXISTS ix_rents_unpaid ON rents (due_date, amount) WHERE status = 'UNPAID'"
+    )
+  else:
+    statements.append("CREATE INDEX IF NOT EXISTS ix_rents_status ON rents (status)")
+  for statement in statements:
+    conn.execute(text(statement))
+
+
+@migration(2, 'keyset_pagination_indexes')
+def _keyset_pagination_indexes(conn):
+  # Liste uçlarının (tarih, id) sıralamasına ve sık filtrelerine uygun index'ler
+  statements = [
+    "CREATE INDEX IF NOT EXISTS ix_rents_period ON rents (year, month, id)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_date_id ON payments (payment_date, id)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_owner_date ON payments (owner_id, payment_date, id)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_account_date ON payments (account_id, payment_date, id)",
+    "CREATE INDEX IF NOT EXISTS ix_transactions_created_id ON transactions (created_at, id)",
+    "CREATE INDEX IF NOT EXISTS ix_expenses_account_date ON expenses (account_id, expense_date, id)",
+    # Yeni bileşik index'lerin ön eki olarak kaldılar
+    "DROP INDEX IF EXISTS ix_payments_payment_date",
+    "DROP INDEX IF EXISTS ix_payments_owner_id",
+  ]
+  for statement in statements:
+    conn.execute(text(statement))
+
+
+@migration(3, 'sync_watermarks')
+def _sync_watermarks(conn):
+  columns = {c['name'] for c in inspect(conn).get_columns('transactions')}
+  if 'updated_at' not in columns:
+    conn.execute(text("ALTER TABLE transactions ADD COLUMN updated_at TIMESTAMP"))
+    conn.execute(text("UPDATE transactions SET updated_at = created_at"))
+  # /api/sync her tabloyu updated_at > watermark ile tarar
+  for table in ('owners', 'owner_balances', 'rents', 'payments', 'accounts', 'transactions', 'expenses', 'categories'):
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_updated_at ON {table} (updated_at)"))
+
+
+@migration(4, 'bank_import_indexes')
+def _bank_import_indexes(conn):
+  # Ekstre içe aktarma aynı referansla kayıtlı ödemeyi IN (...) ile arar
+  conn.execute(text("CREATE INDEX IF NOT EXISTS ix_payments_reference_number ON payments (reference_number)"))
+
+
+@migration(5, 'dashboard_indexes')
+def _dashboard_indexes(conn):
+  # Dashboard grafiği özet satırlarını (yıl, ay) aralığıyla okur
+  conn.execute(text(
+    "CREATE INDEX IF NOT EXISTS ix_account_monthly_totals_period ON account_monthly_totals (year, month)"
+  ))
+  if _supports_partial_index(conn):
+    # Ödenmemiş aidat listesi (due_date, id) keyset sayfası; ix_rents_unpaid toplam içindir
+    conn.execute(text(
+      "CREATE INDEX IF NOT EXISTS ix_rents_unpaid_due ON rents (due_date, id) WHERE status = 'UNPAID'"
+    ))
+
+
+@migration(6, 'account_reconciliation')
+def _account_reconciliation(conn):
+  tables = set(inspect(conn).get_table_names())
+  columns = {c['name'] for c in inspect(conn).get_columns('accounts')}
+  if 'opening_balance' not in columns:
+    conn.execute(text("ALTER TABLE accounts ADD COLUMN opening_balance NUMERIC(14, 2) NOT NULL DEFAULT 0"))
+    # Açılış bakiyesi kaydedilmemişti: canlı bakiye - tüm (arşivlenmiş dahil) hareketlerin net etkisi
+    live = "accounts.balance"
+    if 'account_ledger' in tables:
+      live += (
+        " + COALESCE((SELECT SUM(l.delta) FROM account_ledger l"
+        " WHERE l.account_id = accounts.id AND l.folded = :no), 0)"
+      )
+    net = ""
+    for table in ('transactions', 'transactions_archive'):
+      if table not in tables:
+        continue
+      net += (
+        f" - COALESCE((SELECT SUM(CASE WHEN t.type = 'INCOME' THEN t.amount ELSE -t.amount END) FROM {table} t"
+        f" WHERE t.account_id = accounts.id AND t.type IN ('INCOME', 'EXPENSE', 'TRANSFER')"
+        f" AND (t.is_canceled IS NULL OR t.is_canceled = :no)), 0)"
+        f" - COALESCE((SELECT SUM(t.amount) FROM {table} t WHERE t.related_account = accounts.id"
+        f" AND t.type = 'TRANSFER' AND (t.is_canceled IS NULL OR t.is_canceled = :no)), 0)"
+      )
+    conn.execute(text(f"UPDATE accounts SET opening_balance = {live}{net}"), {'no': False})
+  # Mutabakat hesabın hareketlerini id sırasıyla kontrol noktasından itibaren okur
+  conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_account_id ON transactions (account_id, id)"))
+  conn.execute(text("CREATE INDEX IF NOT EXISTS ix_transactions_related_account ON transactions (related_account, id)"))
+
+
+def applied_versions(conn):
+  return {row[0] for row in conn.execute(select(SchemaMigration.version))}
+
+
+def run_migrations(engine=default_engine, verbose=False):
+  """Bekleyen migration'ları sırayla uygula, uygulanan sürümleri döndür"""
+  SchemaMigration.__table__.create(engine, checkfirst=True)
+  applied = []
+  try:
+    with engine.begin() as conn:
+      if conn.dialect.name == 'postgresql':
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+      done = applied_versions(conn)
+      for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in done:
+          continue
+        if verbose:
+          print(f"→ {version:04d} {name}")
+        fn(conn)
+        conn.execute(SchemaMigration.__table__.insert().values(
+          version=version, name=name, applied_at=datetime.utcnow()
+        ))
+        applied.append(version)
+  except IntegrityError:
+    # SQLite'ta başka bir süreç aynı sürümü önce kaydetti; migration'lar idempotent
+    return run_migrations(engine, verbose)
+  return applied
+
+
+def status(engine=default_engine):
+  SchemaMigration.__table__.create(engine, checkfirst=True)
+  with engine.connect() as conn:
+    done = applied_versions(conn)
+  return [(version, name, version in done) for version, name, _ in sorted(MIGRATIONS, key=lambda m: m[0])]
+
+
+if __name__ == '__main__':
+  command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+  if command == 'status':
+    for version, name, is_applied in status():
+      print(f"{'✓' if is_applied else '·'} {version:04d} {name}")
+  elif command == 'upgrade':
+    applied = run_migrations(verbose=True)
+    print(f"✅ {len(applied)} migration uygulandı" if applied else "✅ Şema güncel")
+  else:
+    print(f"Bilinmeyen komut: {command} (upgrade | status)")
+    sys.exit(1)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""PostgreSQL'de transactions ve payments tablolarının yıllık range partition'ları
+
+İsteğe bağlı şema modu (DB_PARTITIONING=true, yalnızca PostgreSQL). Açıkken
+init_db migration'lardan sonra iki tabloyu tarih kolonuna göre
+PARTITION BY RANGE ile yeniden kurar:
+  transactions  created_at    payments  payment_date
+Her yıl bir partition'dır (transactions_y2025 gibi); aralık dışı satırlar
+DEFAULT partition'a düşer. Mevcut veri dönüşümde yeni tabloya kopyalanır,
+index'ler ve foreign key'ler korunur, id sequence'ı devredilir.
+
+Partition anahtarı birincil anahtarda olmak zorunda olduğundan PRIMARY KEY
+(id, tarih) olur ve tarih kolonu NOT NULL yapılır; database.py'deki ORM
+modelleri değişmez (id yine tek başına benzersizdir, sequence'tan gelir).
+Tarih filtreli listeleme ve toplamlar yalnızca ilgili yılların
+partition'larını okur. (source, related_id) ile yapılan iptal aramaları
+kaydın created_at'inden alt sınır alır (api._created_since); sınır olmayan
+aramalar tüm yılları tarar.
+
+Gelecek yılın partition'ı açılışta ve `flask ensure-partitions` ile (cron,
+yılda bir yeter) oluşturulur; yoksa satırlar DEFAULT partition'a düşer ve
+partition oluşturulurken oradan taşınır.
+"""
+import os
+from datetime import datetime
+
+from sqlalchemy import text
+
+from database import engine as default_engine, PARTITION_LOCK_KEY
+
+DB_PARTITIONING = os.environ.get("DB_PARTITIONING", "false").lower() == "true"
+
+# tablo → partition anahtarı
+PARTITIONED = {"transactions": "created_at", "payments": "payment_date"}
+
+# Uygulamanın kilit sırası (api.py): payments, transactions'tan önce kilitlenir
+_LOCK_ORDER = ("payments", "transactions")
+
+# Dönüşümden önce boş anahtarların doldurulacağı kolon (NOT NULL olacak)
+_BACKFILL = {"transactions": "updated_at", "payments": "created_at"}
+
+
+def _partition_name(table, year):
+  return f"{table}_y{year}"
+
+
+def is_partitioned(conn, table):
+  return conn.execute(text(
+    "SELECT c.relkind = 'p' FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+    "WHERE c.relname = :table AND n.nspname = current_schema()"
+  ), {"table": table}).scalar() is True
+
+
+def _year_bounds(year):
+  return f"'{year}-01-01'", f"'{year + 1}-01-01'"
+
+
+def _create_year(conn, table, column, year):
+  """Yılın partition'ını oluştur; DEFAULT partition'da o yıla düşen satırlar varsa taşı"""
+  name = _partition_name(table, year)
+  exists = conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+  if exists:
+    return False
+  low, high = _year_bounds(year)
+  default = f"{table}_default"
+  # DEFAULT'ta aralığa düşen satır varken ATTACH hata verir: önce ayrı tabloya taşı
+  conn.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+  conn.execute(text(
+    f"WITH moved AS (DELETE FROM {default} WHERE {column} >= {low} AND {column} < {high} RETURNING *) "
+    f"INSERT INTO {name} SELECT * FROM moved"
+  ))
+  conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({low}) TO ({high})"))
+  return True
+
+
+def _convert(conn, table, column):
+  """Düz tabloyu aynı adla range partition'lı tabloya dönüştür (tek işlem içinde)"""
+  old = f"{table}_unpartitioned"
+  conn.execute(text(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE"))
+  conn.execute(text(
+    f"UPDATE {table} SET {column} = COALESCE({_BACKFILL[table]}, now()) WHERE {column} IS NULL"
+  ))
+  sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table}).scalar()
+  if sequence:
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+
+  # Index ve foreign key tanımları yeni tabloda aynı adlarla yeniden kurulur
+  indexes = conn.execute(text(
+    "SELECT indexname, indexdef FROM pg_indexes "
+    "WHERE schemaname = current_schema() AND tablename = :table AND indexname <> :pkey"
+  ), {"table": table, "pkey": f"{table}_pkey"}).all()
+  foreign_keys = conn.execute(text(
+    "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+    "WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'"
+  ), {"table": table}).all()
+  for name, _ in indexes:
+    conn.execute(text(f"DROP INDEX {name}"))
+  for name, _ in foreign_keys:
+    conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {name}"))
+  conn.execute(text(f"ALTER TABLE {table} RENAME TO {old}"))
+  conn.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT {table}_pkey TO {old}_pkey"))
+
+  conn.execute(text(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE ({column})"))
+  conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL"))
+  conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, {column})"))
+  for name, definition in foreign_keys:
+    conn.execute(text(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"))
+  conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+  first, last = conn.execute(text(
+    f"SELECT CAST(extract(year FROM min({column})) AS int), CAST(extract(year FROM max({column})) AS int) FROM {old}"
+  )).one()
+  this_year = datetime.utcnow().year
+  for year in range(min(first or this_year, this_year), max(last or this_year, this_year + 1) + 1):
+    low, high = _year_bounds(year)
+    conn.execute(text(
+      f"CREATE TABLE {_partition_name(table, year)} PARTITION OF {table} FOR VALUES FROM ({low}) TO ({high})"
+    ))
+
+  conn.execute(text(f"INSERT INTO {table} SELECT * FROM {old}"))
+  for _, definition in indexes:
+    # Partition'lı tabloda index her partition'da ayrı kurulur (yeni partition'lara da otomatik)
+    conn.execute(text(definition.replace(f" ON {old} ", f" ON {table} ", 1)))
+  if sequence:
+    conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id"))
+  conn.execute(text(f"DROP TABLE {old}"))
+
+
+def ensure_partitions(conn, years_ahead=1):
+  """Bu yılın ve sonraki yılların partition'larını oluştur; oluşturulan adları döner"""
+  this_year = datetime.utcnow().year
+  created = []
+  for table, column in PARTITIONED.items():
+    if not is_partitioned(conn, table):
+      continue
+    for year in range(this_year, this_year + years_ahead + 1):
+      if _create_year(conn, table, column, year):
+        created.append(_partition_name(table, year))
+  return created
+
+
+def _pending(conn, years_ahead=1):
+  """Dönüştürülecek tablo ya da açılacak yıl partition'ı var mı (kilitsiz ön kontrol)"""
+  this_year = datetime.utcnow().year
+  for table in PARTITIONED:
+    if not is_partitioned(conn, table):
+      return True
+    for year in range(this_year, this_year + years_ahead + 1):
+      name = _partition_name(table, year)
+      if not conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar():
+        return True
+  return False
+
+
+def setup(engine=default_engine):
+  """Tabloları gerekiyorsa dönüştür ve eksik yıl partition'larını aç; yapılanları döner"""
+  if engine.dialect.name != "postgresql":
+    return []
+  with engine.connect() as conn:
+    if not _pending(conn):
+      return []
+  done = []
+  with engine.begin() as conn:
+    # Önce tablo kilitleri, sonra advisory kilit: tablo kilidini tutan yazıcılar
+    # bu işlemin tuttuğu bir kilidi beklemez
+    conn.execute(text(f"LOCK TABLE {', '.join(_LOCK_ORDER)} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    for table, column in PARTITIONED.items():
+      if not is_partitioned(conn, table):
+        _convert(conn, table, column)
+        done.append(table)
+    done.extend(ensure_partitions(conn))
+  # Yeni tabloların istatistikleri olmadan planlayıcı partition'ları yanlış tahmin eder
+  if done:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+      for table in PARTITIONED:
+        conn.execute(text(f"ANALYZE {table}"))
+  return done
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""Hesap mutabakatı: accounts bakiyesini hareketlerden yeniden türetip farkı bul
+
+Beklenen bakiye = başlangıç + iptal edilmemiş hareketlerin net etkisi:
+  başlangıç  ilk açık yılın açılış bakiyesi (yearend.py), yoksa accounts.opening_balance
+  net        INCOME +, EXPENSE -, TRANSFER kaynakta -, hedefte (related_account) +
+Gerçek bakiye ledger.live_balances'tır (LEDGER_MODE'da katlanmamış defter dahil).
+Bakiye ve hareketler her hesap için tek anlık görüntüden okunur.
+
+Kontrol noktası (account_reconciliations) hesap başına son taranan hareket id'si
+ve o ana kadarki net etkidir; sonraki çalıştırma yalnızca yeni satırları okur.
+Kontrol noktasından önceki bir satır değiştiyse (iptal, gider düzenleme;
+updated_at), başka hesaba taşındıysa (reconciliation_marks) ya da yıl
+kapatıldıysa hesap baştan taranır. Son RECONCILE_SLACK içinde eklenen satırlar
+beklenen bakiyeye girer ama kontrol noktasına yazılmaz: id'si daha küçük olup
+henüz commit edilmemiş bir satır atlanmaz.
+
+Fark varsa sorumlu hareketler önerilir: farkı ilk kez oluşturan taramadaki
+satırlar (iptal edilmişler dahil), tutarı fark değişimine eşit olanlar önce.
+Hesaplar RECONCILE_WORKERS thread'lik havuzda paralel taranır; sonuçlar
+sonunda tek işlemde yazılır. Kullanım: `flask reconcile-accounts`,
+POST /api/admin/reconcile.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, case, event, func, inspect, or_, true
+
+from database import (
+  Account,
+  AccountOpeningBalance,
+  AccountReconciliation,
+  ClosedYear,
+  ReconciliationMark,
+  SessionLocal,
+  Transaction,
+)
+from ledger import live_balances
+
+RECONCILE_WORKERS = max(int(os.environ.get("RECONCILE_WORKERS", "4")), 1)
+# Bundan kısa sürede commit edilmemiş yazma yok sayılır (kontrol noktası bu kadar geride kalır)
+RECONCILE_SLACK = timedelta(seconds=int(os.environ.get("RECONCILE_SLACK_SECONDS", "300")))
+RECONCILE_MAX_SUSPECTS = 20
+
+FULL = "FULL"
+INCREMENTAL = "INCREMENTAL"
+
+
+def _decimal(value):
+  return Decimal(str(value or 0))
+
+
+# ==================== TAŞINAN HAREKETLER ====================
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_moved_transactions(session, flush_context):
+  """Hesabı değişen ya da silinen hareketin eski hesaplarını işaretle"""
+  rows = []
+  for obj in session.dirty:
+    if not isinstance(obj, Transaction):
+      continue
+    state = inspect(obj)
+    for attribute in ("account_id", "related_account"):
+      history = state.attrs[attribute].history
+      if history.added:
+        rows.extend({"account_id": old, "transaction_id": obj.id} for old in history.deleted if old is not None)
+  for obj in session.deleted:
+    if isinstance(obj, Transaction):
+      rows.extend(
+        {"account_id": account_id, "transaction_id": obj.id}
+        for account_id in (obj.account_id, obj.related_account) if account_id is not None
+      )
+  if rows:
+    now = datetime.utcnow()
+    session.connection().execute(
+      ReconciliationMark.__table__.insert(), [dict(row, created_at=now) for row in rows]
+    )
+
+
+# ==================== TARAMA ====================
+def _signed_amount(account_id):
+  return case(
+    (Transaction.account_id != account_id, Transaction.amount),  # transfer hedefi
+    (Transaction.type == "INCOME", Transaction.amount),
+    else_=-Transaction.amount,
+  )
+
+
+def _touches(account_id):
+  return or_(
+    and_(Transaction.account_id == account_id, Transaction.type.in_(("INCOME", "EXPENSE", "TRANSFER"))),
+    and_(Transaction.related_account == account_id, Transaction.type == "TRANSFER"),
+  )
+
+
+def _net(session, account_id, *conditions):
+  return _decimal(session.query(func.sum(_signed_amount(account_id))).filter(
+    _touches(account_id), Transaction.is_canceled.isnot(True), *conditions
+  ).scalar())
+
+
+def _settled_through(session, account_id, cutoff, *conditions):
+  """cutoff'tan önce eklenmiş en büyük hareket id'si (kontrol noktası buraya kadar ilerler)"""
+  return session.query(func.max(Transaction.id)).filter(
+    _touches(account_id), Transaction.created_at < cutoff, *conditions
+  ).scalar()
+
+
+def _snapshot(session):
+  # Bakiye ve hareketler aynı anlık görüntüden okunmalı; SQLite'ta BEGIN zaten öyle
+  if session.get_bind().dialect.name == "postgresql":
+    session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+
+
+def _opening_year(session):
+  closed = session.query(func.max(ClosedYear.year)).scalar()
+  return closed + 1 if closed is not None else None
+
+
+def _baseline(session, account, opening_year):
+  if opening_year is not None:
+    opening = session.get(AccountOpeningBalance, (opening_year, account.id))
+    if opening is not None:
+      return _decimal(opening.balance)
+  return _decimal(account.opening_balance)
+
+
+def _suspects(session, account_id, scope, candidates, delta):
+  """Aday hareketlerden tutarı |delta| olanlar önce, sonra en yeniler"""
+  exact = case((func.abs(Transaction.amount) == abs(delta), 0), else_=1)
+  return [tx_id for (tx_id,) in session.query(Transaction.id).filter(
+    _touches(account_id), scope, candidates
+  ).order_by(exact, Transaction.id.desc()).limit(RECONCILE_MAX_SUSPECTS)]
+
+
+def reconcile_account(account_id, full=False, now=None):
+  """Tek hesabı kendi oturumunda mutabakat et; sonuç sözlüğünü döner (yazmaz)"""
+  now = now or datetime.utcnow()
+  cutoff = now - RECONCILE_SLACK
+  session = SessionLocal()
+  try:
+    _snapshot(session)
+    account = session.get(Account, account_id)
+    if account is None:
+      return None
+    checkpoint = session.get(AccountReconciliation, account_id)
+    opening_year = _opening_year(session)
+    scope = Transaction.created_at >= datetime(opening_year, 1, 1) if opening_year else true()
+
+    reason = None
+    if full:
+      reason = "requested"
+    elif checkpoint is None or checkpoint.last_transaction_id is None or checkpoint.checked_at is None:
+      reason = "first_run"
+    elif checkpoint.opening_year != opening_year:
+      reason = "year_closed"
+    else:
+      watermark = checkpoint.checked_at - RECONCILE_SLACK
+      # Yalnızca updated_at ile filtrelenir: id/hesap koşulu eklenirse SQLite hesabın
+      # tüm geçmişini tarayan index'i seçer; son değişen satırlar burada süzülür
+      changed = any(
+        tx_id <= checkpoint.last_transaction_id and account_id in accounts
+        for tx_id, *accounts in session.query(
+          Transaction.id, Transaction.account_id, Transaction.related_account,
+        ).filter(Transaction.updated_at > watermark)
+      )
+      moved = session.query(ReconciliationMark.id).filter(
+        ReconciliationMark.account_id == account_id, ReconciliationMark.created_at > watermark,
+      ).first()
+      if changed or moved:
+        reason = "changed"
+
+    if reason:
+      last_id = _settled_through(session, account_id, cutoff, scope) or 0
+      settled = _net(session, account_id, scope, Transaction.id <= last_id)
+      recent = _net(session, account_id, scope, Transaction.id > last_id)
+    else:
+      previous_id = checkpoint.last_transaction_id
+      last_id = _settled_through(session, account_id, cutoff, scope, Transaction.id > previous_id) or previous_id
+      settled = _decimal(checkpoint.transaction_net) + _net(
+        session, account_id, scope, Transaction.id > previous_id, Transaction.id <= last_id
+      )
+      recent = _net(session, account_id, scope, Transaction.id > last_id)
+
+    expected = _baseline(session, account, opening_year) + settled + recent
+    actual = _decimal(live_balances(session, [account_id]).get(account_id))
+    drift = actual - expected
+
+    # Fark değişmediyse sorumlu satırlar öncekilerdir; değiştiyse bu taramadakiler
+    previous_drift = _decimal(checkpoint.drift) if checkpoint is not None and reason != "requested" else Decimal("0")
+    suspects = []
+    if drift:
+      if checkpoint is not None and drift == previous_drift and checkpoint.suspect_transaction_ids:
+        suspects = json.loads(checkpoint.suspect_transaction_ids)
+      elif reason in ("requested", "first_run", "year_closed"):
+        suspects = _suspects(session, account_id, scope, true(), drift - previous_drift)
+      else:
+        watermark = checkpoint.checked_at - RECONCILE_SLACK
+        candidates = or_(Transaction.id > checkpoint.last_transaction_id, Transaction.updated_at > watermark)
+        moved = [tx_id for (tx_id,) in session.query(ReconciliationMark.transaction_id).filter(
+          ReconciliationMark.account_id == account_id, ReconciliationMark.created_at > watermark,
+          ReconciliationMark.transaction_id.isnot(None),
+        )]
+        suspects = _suspects(session, account_id, scope, candidates, drift - previous_drift) + moved
+        suspects = suspects[:RECONCILE_MAX_SUSPECTS]
+    return {
+      "account_id": account_id,
+      "name": account.name,
+      "is_active": bool(account.is_active),
+      "opening_year": opening_year,
+      "last_transaction_id": last_id,
+      "transaction_net": settled,
+      "expected_balance": expected,
+      "actual_balance": actual,
+      "drift": drift,
+      "suspect_transaction_ids": suspects,
+      "mode": FULL if reason else INCREMENTAL,
+      "reason": reason,
+      "checked_at": now,
+    }
+  finally:
+    session.rollback()
+    session.close()
+
+
+def _save(results):
+  session = SessionLocal()
+  try:
+    if session.get_bind().dialect.name == "sqlite":
+      session.connection(execution_options={"sqlite_immediate": True})
+    for result in results:
+      session.merge(AccountReconciliation(
+        account_id=result["account_id"],
+        opening_year=result["opening_year"],
+        last_transaction_id=result["last_transaction_id"],
+        transaction_net=result["transaction_net"],
+        expected_balance=result["expected_balance"],
+        actual_balance=result["actual_balance"],
+        drift=result["drift"],
+        suspect_transaction_ids=json.dumps(result["suspect_transaction_ids"]),
+        mode=result["mode"],
+        checked_at=result["checked_at"],
+      ))
+    # Tüm hesapların baktığı pencereden eski işaretler artık gerekmez
+    oldest = session.query(func.min(AccountReconciliation.checked_at)).scalar()
+    if oldest is not None and session.query(Account.id).count() == session.query(AccountReconciliation.account_id).count():
+      session.query(ReconciliationMark).filter(
+        ReconciliationMark.created_at < oldest - 2 * RECONCILE_SLACK
+      ).delete(synchronize_session=False)
+    session.commit()
+  except Exception:
+    session.rollback()
+    raise
+  finally:
+    session.close()
+
+
+def run(account_ids=None, full=False, workers=RECONCILE_WORKERS):
+  """Hesapları paralel mutabakat et, kontrol noktalarını yaz; hesap sırasıyla sonuçları döner.
+
+  Yazan isteklerle eşzamanlı çalışabilir. Aynı anda iki çalıştırma da
+  tutarlı kontrol noktası yazar; sonra biten kazanır.
+  """
+  if account_ids is None:
+    session = SessionLocal()
+    try:
+      account_ids = [account_id for (account_id,) in session.query(Account.id).order_by(Account.id)]
+    finally:
+      session.close()
+  now = datetime.utcnow()
+  with ThreadPoolExecutor(max(min(workers, len(account_ids)), 1)) as executor:
+    results = [
+      result for result in executor.map(lambda account_id: reconcile_account(account_id, full, now), account_ids)
+      if result is not None
+    ]
+  if results:
+    _save(results)
+  return results
+
+
+def latest(session, account_ids=None):
+  """Kayıtlı son mutabakat sonuçları (run ile aynı biçim, reason None)"""
+  q = session.query(AccountReconciliation, Account.name, Account.is_active).join(
+    Account, Account.id == AccountReconciliation.account_id
+  )
+  if account_ids:
+    q = q.filter(AccountReconciliation.account_id.in_(account_ids))
+  return [
+    {
+      "account_id": row.account_id,
+      "name": name,
+      "is_active": bool(is_active),
+      "opening_year": row.opening_year,
+      "last_transaction_id": row.last_transaction_id,
+      "transaction_net": _decimal(row.transaction_net),
+      "expected_balance": _decimal(row.expected_balance),
+      "actual_balance": _decimal(row.actual_balance),
+      "drift": _decimal(row.drift),
+      "suspect_transaction_ids": json.loads(row.suspect_transaction_ids or "[]"),
+      "mode": row.mode,
+      "reason": None,
+      "checked_at": row.checked_at,
+    }
+    for row, name, is_active in q.order_by(AccountReconciliation.account_id)
+  ]
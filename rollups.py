@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Aylık rapor özetleri: hesap, kategori ve malik başına (yıl, ay) toplamları
+
+Raporlar (/api/reports/*) transactions/expenses/payments tablolarını taramaz;
+birkaç yüz satırlık özet tablolarını okur:
+  account_monthly_totals   iptal edilmemiş transactions (created_at ayı)
+  category_monthly_totals  expenses (expense_date, yoksa created_at ayı)
+  owner_monthly_totals     rents (dönem) ve iptal edilmemiş payments (payment_date ayı)
+
+Yazan yollar değişikliği record_* ile oturuma kaydeder; farklar commit'ten
+hemen önce birleştirilip anahtar sırasıyla tek upsert ile uygulanır. Aynı
+ayın satırı (sıcak satır) böylece yalnızca commit anında kilitlenir. Geri
+alınan işlemin farkları atılır. rebuild() özetleri ham tablolardan yeniden
+üretir, check() ham tablolarla karşılaştırıp farkları döner. Kapatılmış
+yılların satırları arşivde olduğundan (yearend.py) ikisi de yalnızca açık
+yılları kapsar; kapalı yılların özet satırlarına dokunulmaz.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, case, event, extract, func, true
+
+from database import (
+  AccountMonthlyTotal,
+  CategoryMonthlyTotal,
+  ClosedYear,
+  Expense,
+  OwnerMonthlyTotal,
+  Payment,
+  Rent,
+  SessionLocal,
+  Transaction,
+  upsert_increment_many,
+)
+
+# Uygulama ve kilit sırası: hesap → kategori → malik, her tabloda artan anahtar
+ROLLUPS = {
+  "account": (
+    AccountMonthlyTotal, ("account_id", "year", "month"),
+    ("income", "expense", "transfer_in", "transfer_out", "tx_count"),
+  ),
+  "category": (CategoryMonthlyTotal, ("category_id", "year", "month"), ("amount", "expense_count")),
+  "owner": (OwnerMonthlyTotal, ("owner_id", "year", "month"), ("charged", "paid", "late_fees")),
+}
+
+_PENDING = "rollup_deltas"
+
+
+def _decimal(value):
+  return Decimal(str(value or 0))
+
+
+def _period(value):
+  value = value or datetime.utcnow()
+  return value.year, value.month
+
+
+def _add(session, name, key, **deltas):
+  # Düz sözlük: yazma kuyruğu geri alınan işte session.info'yu sığ kopyasından geri yükler
+  pending = session.info.setdefault(_PENDING, {})
+  for column, value in deltas.items():
+    if value:
+      pending[(name, key, column)] = pending.get((name, key, column), 0) + value
+
+
+def record_transaction(session, tx, sign=1):
+  """Kasa hareketini hesap özetine ekle (sign=-1: iptal / eski hali çıkar); flush'tan sonra çağrılır"""
+  amount = _decimal(tx.amount) * sign
+  year, month = _period(tx.created_at)
+  if tx.type == "INCOME":
+    _add(session, "account", (tx.account_id, year, month), income=amount, tx_count=sign)
+  elif tx.type == "EXPENSE":
+    _add(session, "account", (tx.account_id, year, month), expense=amount, tx_count=sign)
+  elif tx.type == "TRANSFER":
+    _add(session, "account", (tx.account_id, year, month), transfer_out=amount, tx_count=sign)
+    if tx.related_account:
+      _add(session, "account", (tx.related_account, year, month), transfer_in=amount, tx_count=sign)
+
+
+def record_expense(session, expense, sign=1):
+  """Gideri kategori özetine ekle; güncellemede önce eski hali sign=-1 ile çıkarılır"""
+  year, month = _period(expense.expense_date or expense.created_at)
+  _add(
+    session, "category", (expense.category_id, year, month),
+    amount=_decimal(expense.amount) * sign, expense_count=sign,
+  )
+
+
+def record_charge(session, owner_id, year, month, amount):
+  """Aidat tahakkukunu (ya da tutar farkını) malik özetine ekle"""
+  _add(session, "owner", (int(owner_id), int(year), int(month)), charged=_decimal(amount))
+
+
+def record_payment(session, payment, sign=1):
+  year, month = _period(payment.payment_date or payment.created_at)
+  _add(
+    session, "owner", (payment.owner_id, year, month),
+    paid=_decimal(payment.amount) * sign, late_fees=_decimal(payment.late_fee_amount) * sign,
+  )
+
+
+def _apply_pending(session):
+  pending = session.info.pop(_PENDING, None)
+  if not pending:
+    return
+  grouped = defaultdict(lambda: defaultdict(dict))
+  for (name, key, column), value in pending.items():
+    grouped[name][key][column] = value
+  for name, (model, key_names, columns) in ROLLUPS.items():
+    rows = [
+      dict(zip(key_names, key), **{column: deltas.get(column, 0) for column in columns})
+      for key, deltas in sorted(grouped[name].items())
+      if any(deltas.values())
+    ]
+    upsert_increment_many(session, model, key_names, rows)
+
+
+# Tablo sürümü kancasından (database.py) önce çalışmalı: özet tablolarının
+# sürümleri de aynı commit'te artsın
+event.listen(SessionLocal, "before_commit", _apply_pending, insert=True)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _forget_pending(session):
+  session.info.pop(_PENDING, None)
+
+
+# ==================== YENİDEN ÜRETME / TUTARLILIK ====================
+def _month_of(column):
+  return extract("year", column), extract("month", column)
+
+
+def _open_from(session):
+  """İlk açık yıl (kapatılmış yıl yoksa None: tüm yıllar)"""
+  closed = session.query(func.max(ClosedYear.year)).scalar()
+  return closed + 1 if closed is not None else None
+
+
+def _since(column, first_year):
+  return column >= datetime(first_year, 1, 1) if first_year else true()
+
+
+def _expected_account(session, first_year=None):
+  rows = defaultdict(lambda: dict.fromkeys(ROLLUPS["account"][2], 0))
+  year, month = _month_of(Transaction.created_at)
+  active = and_(Transaction.is_canceled.isnot(True), _since(Transaction.created_at, first_year))
+
+  def total(tx_type):
+    return func.coalesce(func.sum(case((Transaction.type == tx_type, Transaction.amount), else_=0)), 0)
+
+  for account_id, y, m, income, expense, transfer_out, count in session.query(
+    Transaction.account_id, year, month, total("INCOME"), total("EXPENSE"), total("TRANSFER"), func.count(Transaction.id),
+  ).filter(active, Transaction.type.in_(("INCOME", "EXPENSE", "TRANSFER"))).group_by(Transaction.account_id, year, month):
+    row = rows[(account_id, int(y), int(m))]
+    row.update(income=_decimal(income), expense=_decimal(expense), transfer_out=_decimal(transfer_out))
+    row["tx_count"] += count
+  for account_id, y, m, transfer_in, count in session.query(
+    Transaction.related_account, year, month, func.sum(Transaction.amount), func.count(Transaction.id),
+  ).filter(active, Transaction.type == "TRANSFER", Transaction.related_account.isnot(None)).group_by(
+    Transaction.related_account, year, month
+  ):
+    row = rows[(account_id, int(y), int(m))]
+    row["transfer_in"] = _decimal(transfer_in)
+    row["tx_count"] += count
+  return rows
+
+
+def _expected_category(session, first_year=None):
+  period = func.coalesce(Expense.expense_date, Expense.created_at)
+  year, month = _month_of(period)
+  return {
+    (category_id, int(y), int(m)): {"amount": _decimal(amount), "expense_count": count}
+    for category_id, y, m, amount, count in session.query(
+      Expense.category_id, year, month, func.sum(Expense.amount), func.count(Expense.id),
+    ).filter(_since(period, first_year)).group_by(Expense.category_id, year, month)
+  }
+
+
+def _expected_owner(session, first_year=None):
+  rows = defaultdict(lambda: dict.fromkeys(ROLLUPS["owner"][2], 0))
+  for owner_id, y, m, charged in session.query(
+    Rent.owner_id, Rent.year, Rent.month, func.sum(Rent.amount),
+  ).filter(Rent.year >= first_year if first_year else true()).group_by(Rent.owner_id, Rent.year, Rent.month):
+    rows[(owner_id, int(y), int(m))]["charged"] = _decimal(charged)
+  period = func.coalesce(Payment.payment_date, Payment.created_at)
+  year, month = _month_of(period)
+  for owner_id, y, m, paid, late_fees in session.query(
+    Payment.owner_id, year, month, func.sum(Payment.amount), func.sum(Payment.late_fee_amount),
+  ).filter(Payment.is_cancelled.isnot(True), _since(period, first_year)).group_by(Payment.owner_id, year, month):
+    rows[(owner_id, int(y), int(m))].update(paid=_decimal(paid), late_fees=_decimal(late_fees))
+  return rows
+
+
+_EXPECTED = {"account": _expected_account, "category": _expected_category, "owner": _expected_owner}
+
+
+def _begin_write(session):
+  # SQLite'ta okuma→yazma yükseltmesi beklemeden "database is locked" verir;
+  # yazma kilidi işlem başında alınır (api.dispatch_write ile aynı)
+  if session.get_bind().dialect.name == "sqlite" and not session.in_transaction():
+    session.connection(execution_options={"sqlite_immediate": True})
+
+
+def _quantize(value):
+  return _decimal(value).quantize(Decimal("0.01"))
+
+
+def rebuild(session, names=None):
+  """Özetleri ham tablolardan yeniden üret (sil + ekle); {özet: satır sayısı} döner.
+
+  Çağıran commit eder. Yazan isteklerle eşzamanlı çalıştırılmamalıdır:
+  yeniden üretme sırasında commit edilen fark ya kaybolur ya iki kez sayılır.
+  """
+  _begin_write(session)
+  now = datetime.utcnow()
+  first_year = _open_from(session)
+  counts = {}
+  for name in names or ROLLUPS:
+    model, key_names, columns = ROLLUPS[name]
+    expected = _EXPECTED[name](session, first_year)
+    session.query(model).filter(model.year >= first_year if first_year else true()).delete(synchronize_session=False)
+    rows = [
+      dict(zip(key_names, key), updated_at=now, **{column: values[column] for column in columns})
+      for key, values in sorted(expected.items())
+    ]
+    if rows:
+      session.execute(model.__table__.insert(), rows)
+    counts[name] = len(rows)
+  return counts
+
+
+def check(session, names=None):
+  """Özetleri ham tablolarla karşılaştır; {özet: [fark satırları]} döner (boş liste = tutarlı)"""
+  drift = {}
+  first_year = _open_from(session)
+  for name in names or ROLLUPS:
+    model, key_names, columns = ROLLUPS[name]
+    expected = _EXPECTED[name](session, first_year)
+    actual = {
+      tuple(getattr(row, key) for key in key_names): {column: getattr(row, column) for column in columns}
+      for row in session.query(model).filter(model.year >= first_year if first_year else true())
+    }
+    zero = dict.fromkeys(columns, 0)
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+      want = expected.get(key, zero)
+      have = actual.get(key, zero)
+      if any(_quantize(want[column]) != _quantize(have[column]) for column in columns):
+        differences.append({
+          **dict(zip(key_names, key)),
+          "expected": {column: str(_quantize(want[column])) for column in columns},
+          "actual": {column: str(_quantize(have[column])) for column in columns},
+        })
+    drift[name] = differences
+  return drift
+
+
+def fill_if_empty(session):
+  """Özet tablosu boş ama ham veri varsa (yeni kurulum/yükseltme) bir kez üret"""
+  _begin_write(session)
+  sources = {"account": Transaction.id, "category": Expense.id, "owner": Rent.id}
+  empty = [
+    name for name, (model, _, _) in ROLLUPS.items()
+    if session.query(model).first() is None and session.query(sources[name]).first() is not None
+  ]
+  return rebuild(session, empty) if empty else {}
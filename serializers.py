@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Model → JSON dönüşümü
+
+Her model için alan listesinden bir kez derlenen serializer fonksiyonları
+üretilir (satır başına tek fonksiyon çağrısı, ara sözlük/döngü yok).
+Kodlama orjson kuruluysa onunla, değilse stdlib json ile yapılır; iki yol da
+aynı baytları üretir: sıralı anahtarlar, UTF-8, boşluksuz ayraçlar.
+
+Flask'ın varsayılan jsonify çıktısından tek bayt farkı: ASCII dışı
+karakterler \\uXXXX kaçışı yerine ham UTF-8 yazılır (orjson kaçış
+seçeneği sunmaz). Çözülen JSON aynıdır; application/json UTF-8'dir
+(RFC 8259) ve istemci (Dio) yanıtı UTF-8 olarak çözer.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask.json.provider import JSONProvider
+
+try:
+  import orjson
+except ImportError:  # pragma: no cover - opsiyonel bağımlılık
+  orjson = None
+
+
+def _default(value):
+  if isinstance(value, (datetime, date)):
+    return value.isoformat()
+  if isinstance(value, Decimal):
+    return float(value)
+  raise TypeError(f"{type(value).__name__} JSON'a dönüştürülemez")
+
+
+if orjson is not None:
+  _ORJSON_OPTIONS = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+  def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+  loads = orjson.loads
+else:
+  def dumps(obj) -> bytes:
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+  loads = json.loads
+
+
+def stdlib_dumps(obj) -> bytes:
+  """Kodlayıcıdan bağımsız referans çıktı (karşılaştırma ve benchmark için)"""
+  return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+class FastJSONProvider(JSONProvider):
+  """Flask jsonify/request.json için serializers.dumps/loads kullanan sağlayıcı"""
+
+  def dumps(self, obj, **kwargs):
+    return dumps(obj).decode('utf-8')
+
+  def loads(self, s, **kwargs):
+    return loads(s)
+
+  def response(self, *args, **kwargs):
+    obj = self._prepare_response_obj(args, kwargs)
+    return self._app.response_class(dumps(obj) + b'\n', mimetype='application/json')
+
+
+# ==================== ALAN İFADELERİ ====================
+# Yüklenmiş kolon değerleri instance __dict__'inde durur; ORM descriptor'ı
+# yalnızca expire edilmiş/yüklenmemiş alanlar için çağrılır.
+def attr(name):
+  return f'(_d[{name!r}] if {name!r} in _d else obj.{name})'
+
+
+def iso(name):
+  return f'_v.isoformat() if (_v := {attr(name)}) is not None else None'
+
+
+def money(name):
+  """None/0 → 0.0, her zaman float"""
+  return f'float({attr(name)} or 0)'
+
+
+def money_or_zero(name):
+  """Boşsa tamsayı 0, doluysa float (aidat/ödeme listelerinin mevcut biçimi)"""
+  return f'float(_v) if (_v := {attr(name)}) else 0'
+
+
+def money_or_none(name):
+  """None/0 → None, doluysa float (tekil aidat/ödeme yanıtlarındaki gecikme bedeli)"""
+  return f'float(_v) if (_v := {attr(name)}) else None'
+
+
+def compile_serializer(name, fields, args=()):
+  """[(anahtar, ifade)] listesinden `name(obj, *args) -> dict` fonksiyonu üret.
+
+  İfadeler `obj`, onun __dict__'i `_d` ve args içindeki isimleri kullanan
+  Python ifadeleridir.
+  """
+  params = ', '.join(('obj',) + tuple(args))
+  body = ',\n'.join(f'    {key!r}: {expr}' for key, expr in fields)
+  source = f'def {name}({params}):\n  _d = obj.__dict__\n  return {{\n{body},\n  }}\n'
+  namespace = {}
+  exec(compile(source, f'<serializer {name}>', 'exec'), namespace)
+  fn = namespace[name]
+  fn.__source__ = source
+  return fn
+
+
+serialize_account = compile_serializer('serialize_account', [
+  ('id', attr('id')),
+  ('name', attr('name')),
+  ('type', attr('type')),
+  ('balance', money('balance')),
+  ('is_active', attr('is_active')),
+  ('created_at', iso('created_at')),
+  ('updated_at', iso('updated_at')),
+])
+
+serialize_transaction = compile_serializer('serialize_transaction', [
+  ('id', attr('id')),
+  ('account_id', attr('account_id')),
+  ('related_account', attr('related_account')),
+  ('type', attr('type')),
+  ('source', attr('source')),
+  ('related_id', attr('related_id')),
+  ('amount', money('amount')),
+  ('description', attr('description')),
+  ('is_canceled', attr('is_canceled')),
+  ('created_by', attr('created_by')),
+  ('created_at', iso('created_at')),
+  ('updated_at', iso('updated_at')),
+])
+
+_serialize_expense = compile_serializer('serialize_expense', [
+  ('id', attr('id')),
+  ('name', attr('name')),
+  ('category_id', attr('category_id')),
+  ('category_name', 'category.name if category is not None else None'),
+  ('account_id', attr('account_id')),
+  ('account_name', 'account.name if account is not None else None'),
+  ('account_type', 'account.type if account is not None else None'),
+  ('amount', money('amount')),
+  ('payee', attr('payee')),
+  ('receipt_no', attr('receipt_no')),
+  ('maintenance_agreement_id', attr('maintenance_agreement_id')),
+  ('date', iso('expense_date')),
+  ('created_at', iso('created_at')),
+  ('updated_at', iso('updated_at')),
+], args=('category', 'account'))
+
+
+def serialize_expense(exp, category=None, account=None):
+  if category is None:
+    category = exp.category
+  if account is None:
+    account = exp.account
+  return _serialize_expense(exp, category, account)
+
+
+_RENT_FIELDS = [
+  ('id', attr('id')),
+  ('owner_id', attr('owner_id')),
+  ('owner_name', 'owner_name'),
+  ('month', attr('month')),
+  ('year', attr('year')),
+  ('amount', money_or_zero('amount')),
+  ('due_date', iso('due_date')),
+  ('status', attr('status')),
+  ('late_fee', money_or_zero('late_fee')),
+  ('category_id', attr('category_id')),
+  ('description', attr('description')),
+  ('created_at', iso('created_at')),
+  ('updated_at', iso('updated_at')),
+]
+
+serialize_rent = compile_serializer('serialize_rent', _RENT_FIELDS, args=('owner_name=None',))
+
+# Aidat oluşturma/güncelleme yanıtları: tutar her zaman float, boş durum
+# UNPAID, sıfır gecikme bedeli null (listelerden farklı, mevcut sözleşme)
+_RENT_DETAIL_OVERRIDES = {
+  'amount': money('amount'),
+  'status': f"{attr('status')} or 'UNPAID'",
+  'late_fee': money_or_none('late_fee'),
+}
+serialize_rent_detail = compile_serializer('serialize_rent_detail', [
+  (key, _RENT_DETAIL_OVERRIDES.get(key, expr)) for key, expr in _RENT_FIELDS
+], args=('owner_name',))
+
+# Dashboard ödenmemiş aidat listesi malik adıyla birlikte daireyi de gösterir
+serialize_unpaid_rent = compile_serializer('serialize_unpaid_rent', _RENT_FIELDS + [
+  ('unit_name', 'unit_name'),
+], args=('owner_name', 'unit_name'))
+
+_PAYMENT_FIELDS = [
+  ('id', attr('id')),
+  ('rent_id', attr('rent_id')),
+  ('owner_id', attr('owner_id')),
+  ('account_id', attr('account_id')),
+  ('amount', money_or_zero('amount')),
+  ('late_fee_amount', money_or_zero('late_fee_amount')),
+  ('payment_date', iso('payment_date')),
+  ('reference_number', attr('reference_number')),
+  ('is_cancelled', attr('is_cancelled')),
+  ('cancellation_date', iso('cancellation_date')),
+  ('cancellation_reason', attr('cancellation_reason')),
+  ('created_at', iso('created_at')),
+  ('updated_at', iso('updated_at')),
+]
+
+serialize_payment = compile_serializer('serialize_payment', _PAYMENT_FIELDS)
+
+# Ödeme oluşturma/iptal yanıtları malik ve hesap adıyla toplam tutarı da içerir;
+# tutar her zaman float, sıfır gecikme bedeli null (listelerden farklı)
+_PAYMENT_DETAIL_OVERRIDES = {
+  'amount': money('amount'),
+  'late_fee_amount': money_or_none('late_fee_amount'),
+}
+serialize_payment_detail = compile_serializer('serialize_payment_detail', [
+  (key, _PAYMENT_DETAIL_OVERRIDES.get(key, expr)) for key, expr in _PAYMENT_FIELDS
+] + [
+  ('owner_name', 'owner_name'),
+  ('account_name', 'account_name'),
+  ('total_amount', f'{money("amount")} + {money("late_fee_amount")}'),
+], args=('owner_name', 'account_name'))
+
+_serialize_owner = compile_serializer('serialize_owner', [
+  ('id', attr('id')),
+  ('full_name', attr('full_name')),
+  ('email', attr('email')),
+  ('phone', attr('phone')),
+  ('identity_number', attr('identity_number')),
+  ('unit_name', attr('unit_name')),
+  ('unit_type', attr('unit_type')),
+  ('share_ratio', f'_v * 100 if (_v := {attr("share_ratio")}) else 0'),  # 0-1 aralığını yüzdeye dönüştür
+  ('owner_type', attr('owner_type')),
+  ('role', attr('role')),
+  ('tenant_name', attr('tenant_name')),
+  ('tenant_email', attr('tenant_email')),
+  ('is_active', attr('is_active')),
+  ('total_rent', 'total_rent'),
+  ('total_paid', 'total_paid'),
+  ('remaining_debt', 'max(total_rent - total_paid, 0)'),
+], args=('total_rent', 'total_paid'))
+
+
+def serialize_owner(owner, total_rent, total_paid):
+  return _serialize_owner(owner, float(total_rent or 0), float(total_paid or 0))
+
+
+serialize_category = compile_serializer('serialize_category', [
+  ('id', attr('id')),
+  ('name', attr('name')),
+  ('category_type', attr('category_type')),
+])
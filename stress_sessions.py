@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""İstek oturumlarının bağlantı sızdırmadığını doğrula
+
+Geçici bir SQLite veritabanına karşı eşzamanlı thread'lerle REQUESTS istek
+gönderilir. İsteklerin bir kısmına hata enjekte edilir: işlenmemiş istisna,
+yazdıktan sonra 4xx dönen view ve commit sırasında patlayan yazma. Sonunda:
+  - havuzda açık (checked out) bağlantı kalmamalı,
+  - eşzamanlı açık bağlantı sayısı hiçbir an pool_size + max_overflow'u aşmamalı,
+  - checkout zaman aşımı olmamalı,
+  - yalnızca başarılı isteklerin yazmaları kalıcı olmalı.
+Kullanım: python stress_sessions.py [istek sayısı] [thread sayısı]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+os.environ.setdefault("DB_POOL_SIZE", "4")
+os.environ.setdefault("DB_MAX_OVERFLOW", "4")
+os.environ.setdefault("DB_POOL_TIMEOUT", "10")
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "0.5")
+
+workdir = tempfile.mkdtemp(prefix="ays_stress_")
+os.chdir(workdir)  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event  # noqa: E402
+
+import api  # noqa: E402
+from database import Category, SessionLocal, engine, pool_stats  # noqa: E402
+
+app = api.app
+app.logger.setLevel(logging.CRITICAL)  # enjekte edilen hataların traceback'leri
+limit = engine.pool.size() + engine.pool._max_overflow
+
+state = {"open": 0, "peak": 0}
+state_lock = threading.Lock()
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    with state_lock:
+        state["open"] += 1
+        state["peak"] = max(state["peak"], state["open"])
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    with state_lock:
+        state["open"] -= 1
+
+
+# Hata enjeksiyonu için yalnızca bu betikte kayıtlı uçlar
+def _stress_raise():
+    api.get_session().query(Category).count()
+    raise RuntimeError("enjekte edilen hata")
+
+
+def _stress_write_then_reject():
+    session = api.get_session()
+    session.add(Category(name="reddedilen", category_type="EXPENSE"))
+    session.flush()
+    return api.jsonify({"success": False, "message": "enjekte edilen 4xx"}), 422
+
+
+def _stress_commit_failure():
+    # name NOT NULL: flush edilmeden bırakılır, commit sırasında patlar
+    api.get_session().add(Category(name=None, category_type="EXPENSE"))
+    return api.jsonify({"success": True})
+
+
+app.add_url_rule("/api/_stress/raise", view_func=_stress_raise)
+app.add_url_rule("/api/_stress/reject", view_func=_stress_write_then_reject, methods=["POST"])
+app.add_url_rule("/api/_stress/commit-failure", view_func=_stress_commit_failure, methods=["POST"])
+
+SCENARIOS = [
+    (40, "GET", "/api/categories", None),
+    (10, "GET", "/api/dashboard/stats", None),
+    (15, "POST", "/api/categories", {"name": "kabul", "category_type": "EXPENSE"}),
+    (5, "POST", "/api/categories", {"name": ""}),
+    (10, "GET", "/api/_stress/raise", None),
+    (10, "POST", "/api/_stress/reject", None),
+    (10, "POST", "/api/_stress/commit-failure", None),
+]
+WEIGHTS = [weight for weight, *_ in SCENARIOS]
+
+statuses = Counter()
+statuses_lock = threading.Lock()
+local = threading.local()
+
+
+def run(i):
+    client = getattr(local, "client", None)
+    if client is None:
+        client = local.client = app.test_client()
+    _, method, path, body = random.choices(SCENARIOS, WEIGHTS)[0]
+    response = client.open(path, method=method, json=body)
+    with statuses_lock:
+        statuses[(method, path, response.status_code)] += 1
+
+
+print(f"{REQUESTS:,} istek, {THREADS} thread, havuz sınırı {limit}")
+started = time.perf_counter()
+with ThreadPoolExecutor(THREADS) as executor:
+    list(executor.map(run, range(REQUESTS)))
+elapsed = time.perf_counter() - started
+
+for (method, path, status), count in sorted(statuses.items()):
+    print(f"  {method:<5} {path:<30} {status}  x{count}")
+
+session = SessionLocal()
+persisted = session.query(Category).count()
+session.close()
+accepted = statuses[("POST", "/api/categories", 201)]
+stats = pool_stats()
+
+print(f"\nSüre: {elapsed:.1f} s  ({REQUESTS / elapsed:,.0f} istek/s)")
+print(f"Eşzamanlı en fazla bağlantı: {state['peak']} / {limit}")
+print(f"Havuz: {stats}")
+
+failures = []
+if stats["checked_out"] != 0 or state["open"] != 0:
+    failures.append(f"sızan bağlantı: checked_out={stats['checked_out']} open={state['open']}")
+if state["peak"] > limit:
+    failures.append(f"havuz sınırı aşıldı: {state['peak']} > {limit}")
+if stats["timeouts"]:
+    failures.append(f"{stats['timeouts']} checkout zaman aşımı")
+if persisted != accepted:
+    failures.append(f"kalıcı kategori {persisted} != başarılı istek {accepted}")
+if statuses[("POST", "/api/_stress/commit-failure", 200)]:
+    failures.append("commit hatası 200 ile döndü")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print("✅ Bağlantı sızıntısı yok, yalnızca başarılı yazmalar kalıcı")
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Çapraz transferlerde kilitlenme (deadlock) ve bakiye kaybı olmadığını doğrula
+
+ACCOUNTS hesap arasında eşzamanlı thread'lerle TRANSFERS transfer yapılır;
+yönler rastgeledir, yani A→B ve B→A transferleri aynı anda çalışır. Araya
+transfer iptalleri de karışır; LEDGER_MODE=true ile defter modu sınanır. Veritabanı DATABASE_URL ile seçilir (PostgreSQL
+önerilir), verilmezse geçici bir SQLite dosyası kullanılır. Sonunda:
+  - hiçbir istek STALL_SECONDS'tan uzun sürmemeli (takılma yok),
+  - 5xx yanıt olmamalı; 400 yalnızca yetersiz bakiye olabilir,
+  - toplam bakiye değişmemeli ve hiçbir hesap negatife düşmemeli,
+  - bakiyeler iptal edilmemiş transfer kayıtlarıyla tutarlı olmalı.
+Kullanım: python stress_transfers.py [transfer sayısı] [thread sayısı] [hesap sayısı]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+TRANSFERS = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+ACCOUNTS = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+STALL_SECONDS = 10
+OPENING_BALANCE = Decimal("1000")
+
+os.environ.setdefault("EVENTS_POLL_INTERVAL", "5")
+if not os.environ.get("DATABASE_URL"):
+    os.chdir(tempfile.mkdtemp(prefix="ays_transfers_"))  # database.py lokal modda ./ays.db kullanır
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import func  # noqa: E402
+
+import api  # noqa: E402
+from database import Account, SessionLocal, Transaction, engine  # noqa: E402
+from ledger import live_balances  # noqa: E402
+
+app = api.app
+app.logger.setLevel(logging.CRITICAL)
+
+session = SessionLocal()
+account_ids = []
+for i in range(ACCOUNTS):
+    acc = Account(name=f"Stres {i}", type="BANK", balance=OPENING_BALANCE)
+    session.add(acc)
+    session.flush()
+    account_ids.append(acc.id)
+session.commit()
+session.close()
+
+statuses = Counter()
+messages = Counter()
+created = []
+slowest = [0.0]
+lock = threading.Lock()
+local = threading.local()
+
+
+def run(i):
+    client = getattr(local, "client", None)
+    if client is None:
+        client = local.client = app.test_client()
+    started = time.perf_counter()
+    with lock:
+        cancel_id = created.pop(random.randrange(len(created))) if created and random.random() < 0.1 else None
+    if cancel_id is not None:
+        response = client.delete(f"/api/transactions/{cancel_id}")
+        kind = "iptal"
+    else:
+        src, dst = random.sample(account_ids, 2)
+        response = client.post("/api/transactions/transfer", json={
+            "source_account_id": src,
+            "target_account_id": dst,
+            "amount": random.choice(("1.00", "5.00", "25.00", "100.00")),
+        })
+        kind = "transfer"
+    elapsed = time.perf_counter() - started
+    body = response.get_json() or {}
+    with lock:
+        slowest[0] = max(slowest[0], elapsed)
+        statuses[(kind, response.status_code)] += 1
+        if response.status_code >= 400:
+            messages[body.get("message")] += 1
+        elif kind == "transfer":
+            created.append(body["transaction"]["id"])
+
+
+print(f"{TRANSFERS:,} istek, {THREADS} thread, {ACCOUNTS} hesap, {engine.dialect.name}")
+started = time.perf_counter()
+with ThreadPoolExecutor(THREADS) as executor:
+    list(executor.map(run, range(TRANSFERS)))
+elapsed = time.perf_counter() - started
+
+for (kind, status), count in sorted(statuses.items()):
+    print(f"  {kind:<9} {status}  x{count}")
+for message, count in messages.most_common(5):
+    print(f"    {str(message).splitlines()[0] if message else message}  x{count}")
+
+session = SessionLocal()
+balances = live_balances(session, account_ids)  # LEDGER_MODE'da katlanmamış hareketler dahil
+expected = {acc_id: OPENING_BALANCE for acc_id in account_ids}
+rows = session.query(Transaction.account_id, Transaction.related_account, func.sum(Transaction.amount)).filter(
+    Transaction.type == "TRANSFER", Transaction.is_canceled == False, Transaction.account_id.in_(account_ids)
+).group_by(Transaction.account_id, Transaction.related_account).all()
+session.close()
+for src, dst, amount in rows:
+    expected[src] -= Decimal(amount)
+    expected[dst] += Decimal(amount)
+
+print(f"\nSüre: {elapsed:.1f} s  ({TRANSFERS / elapsed:,.0f} istek/s), en yavaş istek {slowest[0] * 1000:.0f} ms")
+
+failures = []
+if slowest[0] > STALL_SECONDS:
+    failures.append(f"takılan istek: {slowest[0]:.1f} s")
+server_errors = sum(count for (_, status), count in statuses.items() if status >= 500)
+if server_errors:
+    failures.append(f"{server_errors} adet 5xx yanıt")
+unexpected = {m: c for m, c in messages.items() if m not in ("Bakiye negatif olamaz", "İşlem zaten iptal")}
+if unexpected:
+    failures.append(f"beklenmeyen hata mesajları: {unexpected}")
+if sum(balances.values()) != OPENING_BALANCE * ACCOUNTS:
+    failures.append(f"toplam bakiye {sum(balances.values())} != {OPENING_BALANCE * ACCOUNTS}")
+if any(balance < 0 for balance in balances.values()):
+    failures.append(f"negatif bakiye: {balances}")
+if balances != expected:
+    failures.append(f"bakiyeler transfer kayıtlarıyla tutarsız: {balances} != {expected}")
+
+if failures:
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1)
+print("✅ Takılma yok, toplam bakiye korundu")
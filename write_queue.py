@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Tek yazıcı kuyruğu ve grup commit (WRITE_QUEUE=true)
+
+SQLite aynı anda tek yazara izin verir; with_for_update() orada etkisizdir ve
+eşzamanlı yazan istekler "database is locked" hatası alır. Bu modda yazan
+istekler süreç başına tek bir yazıcı thread'inde sırayla çalışır. Kuyrukta
+biriken işler tek bir işlemde toplanır: her iş kendi SAVEPOINT'inde çalışır,
+reddedilen ya da hata veren iş yalnızca kendi savepoint'ini geri alır, parti
+tek commit ile yazılır ve her çağırana kendi sonucu döner. Grup commit
+başarısız olursa işler tek tek, ayrı işlemlerde yeniden çalıştırılır.
+"""
+import copy
+import threading
+import queue
+
+from database import SessionLocal
+
+
+class _Job:
+  __slots__ = ("fn", "result", "error", "done")
+
+  def __init__(self, fn):
+    self.fn = fn
+    self.result = None
+    self.error = None
+    self.done = threading.Event()
+
+
+class WriteQueue:
+  def __init__(self, session_factory=SessionLocal, max_batch=32, accept=lambda result: True):
+    """accept(result) False dönerse işin yazmaları geri alınır (ör. 4xx yanıt)"""
+    self.session_factory = session_factory
+    self.max_batch = max_batch
+    self.accept = accept
+    self._queue = queue.Queue()
+    self._thread = None
+    self._lock = threading.Lock()
+    self.batches = 0
+    self.jobs = 0
+
+  def submit(self, fn):
+    """fn(session) yazıcı thread'inde çalışır; commit edildikten sonra sonucu döner"""
+    self._ensure_started()
+    job = _Job(fn)
+    self._queue.put(job)
+    job.done.wait()
+    if job.error is not None:
+      raise job.error
+    return job.result
+
+  def _ensure_started(self):
+    if self._thread is not None and self._thread.is_alive():
+      return
+    with self._lock:
+      if self._thread is None or not self._thread.is_alive():
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._thread.start()
+
+  def _run(self):
+    while True:
+      batch = [self._queue.get()]
+      while len(batch) < self.max_batch:
+        try:
+          batch.append(self._queue.get_nowait())
+        except queue.Empty:
+          break
+      try:
+        self._execute(batch)
+      except Exception as e:
+        # Parti commit edilemedi: hiçbir iş başarılı sayılmaz
+        for job in batch:
+          job.result, job.error = None, e
+      finally:
+        for job in batch:
+          job.done.set()
+
+  def _begin(self):
+    session = self.session_factory()
+    if session.get_bind().dialect.name == "sqlite":
+      # Yazma kilidini işlem başında al; okuma→yazma yükseltmesinde BUSY olmasın
+      session.connection(execution_options={"sqlite_immediate": True})
+    return session
+
+  def _execute(self, batch):
+    self.batches += 1
+    self.jobs += len(batch)
+    session = self._begin()
+    try:
+      # Tek işlik partide savepoint gereksiz: reddedilirse işlemin tamamı geri alınır
+      for job in batch:
+        self._run_job(session, job, nested=len(batch) > 1)
+      try:
+        session.commit()
+        return
+      except Exception as e:
+        session.rollback()
+        if len(batch) == 1:
+          batch[0].result, batch[0].error = None, e
+          return
+    finally:
+      session.close()
+
+    # Grup commit başarısız: her işi kendi işleminde yeniden dene
+    for job in batch:
+      job.result = job.error = None
+      session = self._begin()
+      try:
+        self._run_job(session, job, nested=False)
+        session.commit()
+      except Exception as e:
+        session.rollback()
+        job.result, job.error = None, e
+      finally:
+        session.close()
+
+  def _run_job(self, session, job, nested):
+    # Geri alınan işin session.info'ya bıraktığı tablo/olay kayıtları da geri alınır
+    info = {key: copy.copy(value) for key, value in session.info.items()}
+    savepoint = session.begin_nested() if nested else None
+    try:
+      job.result = job.fn(session)
+      if self.accept(job.result):
+        # Bekleyen yazmalar burada flush edilir; hata diğer işlere değil bu işe yazılır
+        session.flush()
+        if savepoint is not None:
+          savepoint.commit()
+        return
+    except Exception as e:
+      job.result, job.error = None, e
+    if savepoint is not None:
+      savepoint.rollback()
+    else:
+      session.rollback()
+    session.info.clear()
+    session.info.update(info)
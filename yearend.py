@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""Yıl sonu kapanışı: yıl özeti, arşivleme ve açılış bakiyeleri
+
+close_year(session, year) yılı ve henüz kapatılmamış önceki yılları sırayla kapatır:
+  1. Yılın özeti (gelir/gider, tahakkuk/tahsilat, ödenmemiş aidatlar, yıl sonu
+     bakiye ve borç toplamları) closed_years'a yazılır; kapalı yılın yıl sonu
+     raporu yalnızca bu satırdan okunur.
+  2. Yılın satırları *_archive tablolarına taşınır: transactions (created_at),
+     payments ve expenses (hem tarihi hem kayıt zamanı kapalı yılda olanlar),
+     rents (ödenmiş ve sıcak tabloda ödemesi kalmamış olanlar). Ödenmemiş
+     aidatlar açık kalem olarak sıcak tabloda kalır, sonraki yıl ödenebilir.
+  3. Ertesi yıl için hesap ve malik açılış bakiyeleri yazılır.
+Aylık özet tablolarına (rollups.py) dokunulmaz; raporlar kapalı yılları da okur.
+
+Kapatılmış yıla düşen kayıt eklenemez, değiştirilemez, silinemez: her flush'tan
+sonra kontrol edilir (ClosedPeriodError). Eski yılın ödenmemiş aidatının yalnızca
+durumu (ödeme / ödeme iptali) değişebilir.
+"""
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import and_, event, exists, func, inspect, literal, select, text
+
+from database import (
+  ARCHIVE_TABLES,
+  Account,
+  AccountMonthlyTotal,
+  AccountOpeningBalance,
+  CategoryMonthlyTotal,
+  ClosedYear,
+  DeletedRecord,
+  Expense,
+  OwnerMonthlyTotal,
+  OwnerOpeningBalance,
+  Payment,
+  Rent,
+  SessionLocal,
+  Transaction,
+)
+from ledger import live_balances
+
+
+class ClosedPeriodError(ValueError):
+  """Kapatılmış yıla düşen bir kayıt eklenmek, değiştirilmek ya da silinmek istendi"""
+
+
+class YearAlreadyClosed(Exception):
+  """Kapatılmak istenen yıl (ya da sonraki bir yıl) zaten kapatılmış"""
+
+
+# Kaydın düştüğü yıllar: dönemi ve (bağlı kasa hareketinin yılı olan) kayıt zamanı
+PERIOD_ATTRIBUTES = {
+  Transaction: ("created_at",),
+  Payment: ("payment_date", "created_at"),
+  Expense: ("expense_date", "created_at"),
+  Rent: ("year",),
+}
+
+# Kapalı yıl aidatında değişebilen kolonlar (ödeme ve ödeme iptali)
+RENT_STATUS_COLUMNS = {"status", "updated_at"}
+
+# Taşıma sırası: aidatlar en son, sıcak tabloda ödemesi kalmayanlar taşınır.
+# PostgreSQL'de tablolar api.py'deki kilit sırasıyla kilitlenir.
+ARCHIVE_ORDER = ("transactions", "payments", "expenses", "rents")
+_MODELS = {"transactions": Transaction, "payments": Payment, "expenses": Expense, "rents": Rent}
+
+
+def _decimal(value):
+  return Decimal(str(value or 0))
+
+
+def closed_through(session):
+  """Kapatılmış son yıl; kapatılmış yıl yoksa None"""
+  return session.connection().execute(select(func.max(ClosedYear.year))).scalar()
+
+
+def ensure_open(session, year):
+  """Core ile yazan yollar için: year kapatılmışsa ClosedPeriodError"""
+  year = int(year)
+  if year >= datetime.utcnow().year:
+    return
+  closed = closed_through(session)
+  if closed is not None and year <= closed:
+    raise ClosedPeriodError(f"{year} yılı kapatıldı; bu döneme kayıt eklenemez veya değiştirilemez")
+
+
+# ==================== KAPALI YIL KORUMASI ====================
+def _years(obj, with_old_values):
+  state = inspect(obj)
+  years = set()
+  for name in PERIOD_ATTRIBUTES[type(obj)]:
+    values = [getattr(obj, name)]
+    if with_old_values:
+      values += state.attrs[name].history.deleted
+    for value in values:
+      if value is None:
+        continue
+      years.add(value.year if isinstance(value, datetime) else int(value))
+  return years
+
+
+def _rent_terms_changed(rent):
+  state = inspect(rent)
+  return any(
+    state.attrs[column.key].history.has_changes()
+    for column in state.mapper.column_attrs
+    if column.key not in RENT_STATUS_COLUMNS
+  )
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _guard_closed_years(session, flush_context):
+  # Yazma flush edildikten sonra kontrol edilir: PostgreSQL'de kapanış tabloları
+  # kilitleyip commit ettiyse bu sorgu kapanışı görür, henüz kilitlemediyse
+  # kapanış bu işlemin commit'ini bekler ve satırı o da arşive taşır
+  years = set()
+  for obj in session.new:
+    if type(obj) in PERIOD_ATTRIBUTES:
+      years |= _years(obj, with_old_values=False)
+  for obj in session.deleted:
+    if type(obj) in PERIOD_ATTRIBUTES:
+      years |= _years(obj, with_old_values=True)
+  for obj in session.dirty:
+    if type(obj) not in PERIOD_ATTRIBUTES or not session.is_modified(obj, include_collections=False):
+      continue
+    if isinstance(obj, Rent) and not _rent_terms_changed(obj):
+      continue
+    years |= _years(obj, with_old_values=True)
+  # İçinde bulunulan yıl kapatılamaz; güncel kayıtlar için sorgu yapılmaz
+  past = [year for year in years if year < datetime.utcnow().year]
+  if past:
+    ensure_open(session, min(past))
+
+
+# ==================== ÖZET ====================
+def _year_totals(session, year):
+  income, expense = session.query(
+    func.coalesce(func.sum(AccountMonthlyTotal.income), 0),
+    func.coalesce(func.sum(AccountMonthlyTotal.expense), 0),
+  ).filter(AccountMonthlyTotal.year == year).one()
+  charged, paid, late_fees = session.query(
+    func.coalesce(func.sum(OwnerMonthlyTotal.charged), 0),
+    func.coalesce(func.sum(OwnerMonthlyTotal.paid), 0),
+    func.coalesce(func.sum(OwnerMonthlyTotal.late_fees), 0),
+  ).filter(OwnerMonthlyTotal.year == year).one()
+  # Ödenmemiş aidatlar arşive taşınmaz; sıcak tablodan (ix_rents_unpaid) okunur
+  unpaid, unpaid_count = session.query(
+    func.coalesce(func.sum(Rent.amount), 0), func.count(Rent.id),
+  ).filter(Rent.status == "UNPAID", Rent.year == year).one()
+  return {
+    "total_income": _decimal(income),
+    "total_expense": _decimal(expense),
+    "charged": _decimal(charged),
+    "paid_rents": _decimal(paid),
+    "late_fees": _decimal(late_fees),
+    "unpaid_rents": _decimal(unpaid),
+    "unpaid_count": unpaid_count,
+  }
+
+
+def account_balances_at_end(session, year):
+  """{hesap id: year sonundaki bakiye} = canlı bakiye - sonraki ayların net hareketi"""
+  account_ids = [account_id for (account_id,) in session.query(Account.id)]
+  balances = live_balances(session, account_ids)
+  later = session.query(
+    AccountMonthlyTotal.account_id,
+    func.sum(
+      AccountMonthlyTotal.income - AccountMonthlyTotal.expense
+      + AccountMonthlyTotal.transfer_in - AccountMonthlyTotal.transfer_out
+    ),
+  ).filter(AccountMonthlyTotal.year > year).group_by(AccountMonthlyTotal.account_id)
+  for account_id, net in later:
+    if account_id in balances:
+      balances[account_id] -= _decimal(net)
+  return balances
+
+
+def owner_debts_at_end(session, year):
+  """{malik id: year sonundaki borç} (tahakkuk - tahsilat, aylık özetlerden)"""
+  return {
+    owner_id: _decimal(debt)
+    for owner_id, debt in session.query(
+      OwnerMonthlyTotal.owner_id, func.sum(OwnerMonthlyTotal.charged - OwnerMonthlyTotal.paid),
+    ).filter(OwnerMonthlyTotal.year <= year).group_by(OwnerMonthlyTotal.owner_id)
+  }
+
+
+def year_summary(session, year):
+  """Kapalı yıl için kapanış anındaki özet, açık yıl için aylık özetlerden güncel hali"""
+  closed = session.get(ClosedYear, year)
+  if closed is not None:
+    summary = {column.key: getattr(closed, column.key) for column in ClosedYear.__table__.columns}
+    summary["closed"] = True
+    # Yıl sonu bakiyeleri ertesi yılın açılış bakiyeleridir
+    summary["account_balances"] = dict(session.query(
+      AccountOpeningBalance.account_id, AccountOpeningBalance.balance,
+    ).filter(AccountOpeningBalance.year == year + 1))
+    return summary
+  balances = account_balances_at_end(session, year)
+  summary = _year_totals(session, year)
+  summary.update(
+    year=year,
+    closed=False,
+    total_balance=sum(balances.values(), Decimal("0")),
+    total_debt=sum(owner_debts_at_end(session, year).values(), Decimal("0")),
+    account_balances=balances,
+  )
+  return summary
+
+
+# ==================== KAPANIŞ ====================
+def _lock_for_close(session):
+  dialect = session.get_bind().dialect.name
+  if dialect == "sqlite":
+    # Yazma kilidi işlem başında alınır (api.dispatch_write ile aynı)
+    if not session.in_transaction():
+      session.connection(execution_options={"sqlite_immediate": True})
+  elif dialect == "postgresql":
+    # Yazanlar kapanış bitene kadar bekler; okuyucular etkilenmez
+    session.execute(text(
+      "LOCK TABLE rents, payments, expenses, transactions IN SHARE ROW EXCLUSIVE MODE"
+    ))
+
+
+def _first_data_year(session):
+  years = [
+    session.query(func.min(model.year)).scalar()
+    for model in (AccountMonthlyTotal, CategoryMonthlyTotal, OwnerMonthlyTotal)
+  ]
+  years = [year for year in years if year is not None]
+  return min(years) if years else None
+
+
+def _archive_conditions(year):
+  end = datetime(year + 1, 1, 1)
+  return {
+    "transactions": Transaction.created_at < end,
+    "payments": and_(func.coalesce(Payment.payment_date, Payment.created_at) < end, Payment.created_at < end),
+    "expenses": and_(func.coalesce(Expense.expense_date, Expense.created_at) < end, Expense.created_at < end),
+    # payments.rent_id sıcak tabloya yabancı anahtar: ödemesi kalan aidat taşınmaz
+    "rents": and_(Rent.year <= year, Rent.status != "UNPAID", ~exists().where(Payment.rent_id == Rent.id)),
+  }
+
+
+def _archive(session, year):
+  """year sonuna kadarki satırları arşive taşı; {tablo: taşınan satır} döner.
+
+  Taşınan her satır için deleted_records'a tombstone yazılır: /api/sync ile
+  artımlı eşitlenen istemciler de arşivlenen satırları bırakır.
+  """
+  conditions = _archive_conditions(year)
+  now = datetime.utcnow()
+  counts = {}
+  for name in ARCHIVE_ORDER:
+    table, archive = _MODELS[name].__table__, ARCHIVE_TABLES[name]
+    session.execute(archive.insert().from_select(
+      [column.name for column in table.columns], select(*table.columns).where(conditions[name])
+    ))
+    session.execute(DeletedRecord.__table__.insert().from_select(
+      ["entity", "entity_id", "deleted_at"],
+      select(literal(name), table.c.id, literal(now)).where(conditions[name]),
+    ))
+    counts[name] = session.execute(table.delete().where(conditions[name])).rowcount
+  return counts
+
+
+def _archived_owner_totals(session):
+  # Arşiv tüm kapalı yılları içerir: toplamlar kümülatiftir
+  rents, payments = ARCHIVE_TABLES["rents"], ARCHIVE_TABLES["payments"]
+  totals = defaultdict(lambda: {"charged": Decimal("0"), "paid": Decimal("0"), "late_fees": Decimal("0")})
+  for owner_id, charged in session.execute(
+    select(rents.c.owner_id, func.sum(rents.c.amount)).group_by(rents.c.owner_id)
+  ):
+    totals[owner_id]["charged"] = _decimal(charged)
+  for owner_id, paid, late_fees in session.execute(
+    select(payments.c.owner_id, func.sum(payments.c.amount), func.sum(payments.c.late_fee_amount))
+    .where(payments.c.is_cancelled.isnot(True))
+    .group_by(payments.c.owner_id)
+  ):
+    totals[owner_id].update(paid=_decimal(paid), late_fees=_decimal(late_fees))
+  return totals
+
+
+def _write_opening_balances(session, year, balances, debts):
+  opening_year = year + 1
+  if balances:
+    session.execute(AccountOpeningBalance.__table__.insert(), [
+      {"year": opening_year, "account_id": account_id, "balance": balance}
+      for account_id, balance in sorted(balances.items())
+    ])
+  archived = _archived_owner_totals(session)
+  rows = []
+  for owner_id in sorted(set(debts) | set(archived)):
+    row = {"year": opening_year, "owner_id": owner_id, "debt": debts.get(owner_id, Decimal("0"))}
+    row.update(archived.get(owner_id, {"charged": 0, "paid": 0, "late_fees": 0}))
+    if any(row[column] for column in ("debt", "charged", "paid", "late_fees")):
+      rows.append(row)
+  if rows:
+    session.execute(OwnerOpeningBalance.__table__.insert(), rows)
+
+
+def close_year(session, year):
+  """year'ı ve kapatılmamış önceki yılları kapat; kapatılan ClosedYear satırlarını döner.
+
+  Çağıran commit eder. İçinde bulunulan yıl kapatılamaz (ValueError); year
+  zaten kapatılmışsa YearAlreadyClosed.
+  """
+  year = int(year)
+  if year >= datetime.utcnow().year:
+    raise ValueError(f"{year} yılı henüz bitmedi")
+  _lock_for_close(session)
+  closed = closed_through(session)
+  if closed is not None and year <= closed:
+    raise YearAlreadyClosed(f"{year} yılı zaten kapatılmış")
+  first = closed + 1 if closed is not None else min(_first_data_year(session) or year, year)
+
+  closed_years = []
+  for current in range(first, year + 1):
+    balances = account_balances_at_end(session, current)
+    debts = owner_debts_at_end(session, current)
+    snapshot = ClosedYear(
+      year=current,
+      total_balance=sum(balances.values(), Decimal("0")),
+      total_debt=sum(debts.values(), Decimal("0")),
+      closed_at=datetime.utcnow(),
+      **_year_totals(session, current),
+    )
+    counts = _archive(session, current)
+    for name, count in counts.items():
+      setattr(snapshot, f"archived_{name}", count)
+    _write_opening_balances(session, current, balances, debts)
+    session.add(snapshot)
+    closed_years.append(snapshot)
+  session.flush()
+  return closed_years